@@ -0,0 +1,47 @@
+"""Compare `indexfiles.query_rdr_index` with loading the RDR index and masking it.
+
+Runs on the RDR index in the pyrise data folder (see PYRISE_DATA_DIR), which needs
+`pyarrow` for its parquet cache.
+
+Usage: python benchmarks/bench_query.py [--repeat 3]
+"""
+import argparse
+import timeit
+
+from pyrise import indexfiles
+
+
+def full_load(orbits, ls, lat, kind):
+    df = indexfiles.get_rdr_index()
+    mask = (df.ORBIT_NUMBER.between(*orbits) & df.SOLAR_LONGITUDE.between(*ls) &
+            (df.MAXIMUM_LATITUDE >= lat[0]) & (df.MINIMUM_LATITUDE <= lat[1]) &
+            df.PRODUCT_ID.str.endswith('_' + kind))
+    return df[mask]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    selection = dict(orbits=(30000, 40000), ls=(180, 270), lat=(-90, -80), kind='COLOR')
+    # build or update the cache outside of the timing
+    indexfiles.update_rdr_index()
+    expected = full_load(**selection)
+    cases = [
+        ('full load and mask', lambda: full_load(**selection)),
+        ('query, all columns', lambda: indexfiles.query_rdr_index(**selection)),
+        ('query, 2 columns', lambda: indexfiles.query_rdr_index(
+            columns=['PRODUCT_ID', 'SOLAR_LONGITUDE'], **selection)),
+        ('query, PRODUCT_IDs', lambda: indexfiles.query_rdr_index(as_ids=True, **selection)),
+    ]
+    assert len(indexfiles.query_rdr_index(**selection)) == len(expected)
+    print("{} of {} products selected by {}".format(
+        len(expected), indexfiles.rdr_index_dataset().count_rows(), selection))
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print("{:<24}{:8.3f} s".format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
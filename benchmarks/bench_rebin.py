@@ -0,0 +1,49 @@
+"""Compare the downsampling functions of `pyrise.data` with the previous implementation.
+
+Usage: python benchmarks/bench_rebin.py [--lines 8000] [--samples 5000] [--factor 4]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from pyrise import data
+
+
+def rebin_mgrid(a, newshape):
+    """`data.rebin` before it stopped building a coordinate grid (without the print)."""
+    slices = [slice(0, old, float(old) / new) for old, new in zip(a.shape, newshape)]
+    coordinates = np.mgrid[slices]
+    indices = coordinates.astype('i')
+    return a[tuple(indices)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=8000)
+    parser.add_argument('--samples', type=int, default=5000)
+    parser.add_argument('--factor', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    image = np.random.RandomState(0).randint(0, 1024, (args.lines, args.samples))
+    image = image.astype(np.uint16)
+    newshape = (args.lines // args.factor, args.samples // args.factor)
+    odd_shape = (int(args.lines / (args.factor + 0.5)), int(args.samples / (args.factor + 0.5)))
+    cases = [
+        ('rebin (mgrid, old)', lambda: rebin_mgrid(image, newshape)),
+        ('rebin', lambda: data.rebin(image, newshape)),
+        ('block_reduce mean', lambda: data.block_reduce(image, args.factor)),
+        ('block_reduce sum', lambda: data.block_reduce(image, args.factor, 'sum')),
+        ('block_reduce median', lambda: data.block_reduce(image, args.factor, 'median')),
+        ('resample', lambda: data.resample(image, newshape)),
+        ('resample non-integer', lambda: data.resample(image, odd_shape)),
+    ]
+    print("{} x {} uint16 image, factor {}".format(args.lines, args.samples, args.factor))
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print("{:<24}{:8.3f} s".format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Downloads for asyncio applications.
+
+The coroutines here are the counterparts of the functions of the same name in
+`downloads`. Transfers run with the shared keep-alive `transfers.Session` (and the product
+cache, if configured) in a bounded pool of threads, so the event loop is never blocked and
+at most `max_workers` transfers run at once. Concurrent requests for the same URL are
+coalesced: they wait for the one transfer that is in flight and then get its file, linked
+into their own storage path if that differs.
+
+Failed downloads are logged instead of printed and, like in `downloads`, leave the
+returned path missing (None for labels).
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.client import HTTPException
+from pathlib import Path
+
+from .cache import cached_download
+from .downloads import _browse_target, _label_target, _product_target, _red_target
+from .transfers import link_file
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDownloader(object):
+    """Run downloads in a thread pool and share transfers of the same URL.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Maximum number of simultaneous transfers. Default: 8
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='pyrise-download')
+        # url -> task of the transfer in flight, per event loop
+        self._inflight = {}
+
+    async def run(self, func, *args, **kwargs):
+        """Run the blocking `func` in the pool of this downloader."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _transfer(self, url, savepath, overwrite):
+        savepath.parent.mkdir(parents=True, exist_ok=True)
+        logger.info("Downloading %s to %s", url, savepath)
+        status = await self.run(cached_download, url, savepath, overwrite=overwrite)
+        return status, savepath
+
+    async def fetch(self, url, savepath, overwrite=False):
+        """Store the product of `url` at `savepath` without blocking the event loop.
+
+        Returns
+        -------
+        str
+            'exists', 'cached' or 'downloaded' as for `cache.cached_download`, 'shared' if
+            the file came from a concurrent transfer of the same URL.
+
+        Raises
+        ------
+        OSError, http.client.HTTPException
+            For failed transfers (e.g. `six.moves.urllib.error.HTTPError`,
+            `transfers.IncompleteDownloadError`, a malformed response after the last retry)
+            or a cache that cannot be written, in every request sharing the transfer.
+        """
+        savepath = Path(savepath)
+        if savepath.exists() and not overwrite:
+            return 'exists'
+        key = (id(asyncio.get_running_loop()), url)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._transfer(url, savepath, overwrite))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # a cancelled request must not cancel the transfer others are waiting for
+            return (await asyncio.shield(task))[0]
+        logger.debug("Waiting for the transfer of %s in flight", url)
+        _, path = await asyncio.shield(task)
+        if path != savepath:
+            savepath.parent.mkdir(parents=True, exist_ok=True)
+            await self.run(link_file, path, savepath)
+        return 'shared'
+
+    def close(self):
+        """Shut down the thread pool after the running transfers."""
+        self._executor.shutdown(wait=True)
+
+
+_downloader = None
+
+
+def get_async_downloader():
+    """Return the downloader used by default, created on first use."""
+    global _downloader
+    if _downloader is None:
+        _downloader = AsyncDownloader()
+    return _downloader
+
+
+def configure_async_downloads(max_workers=8):
+    """Replace the default downloader with one allowing `max_workers` transfers."""
+    global _downloader
+    if _downloader is not None:
+        _downloader.close()
+    _downloader = AsyncDownloader(max_workers)
+    return _downloader
+
+
+async def _download(url, savepath, overwrite, downloader):
+    downloader = get_async_downloader() if downloader is None else downloader
+    try:
+        await downloader.fetch(url, savepath, overwrite=overwrite)
+    except (OSError, HTTPException) as e:  # HTTPError is an OSError
+        logger.error("Downloading %s failed: %s", url, e)
+        return False
+    return True
+
+
+async def download_product(prodid_path, saveroot=None, overwrite=False, downloader=None):
+    """Async `downloads.download_product`, returning the storage path."""
+    url, savepath = _product_target(prodid_path, saveroot)
+    await _download(url, savepath, overwrite, downloader)
+    return savepath
+
+
+async def download_RED_product(obsid, ccdno, channel, saveroot=None, overwrite=False,
+                               downloader=None):
+    """Async `downloads.download_RED_product`, returning the storage path."""
+    url, savepath = _red_target(obsid, ccdno, channel, saveroot)
+    await _download(url, savepath, overwrite, downloader)
+    return savepath
+
+
+async def download_browse_product(obsid, kind='RED', annotated=True, saveroot='.',
+                                  overwrite=False, downloader=None):
+    """Async `downloads.download_browse_product`, returning the storage path."""
+    url, savepath = _browse_target(obsid, kind, annotated, saveroot)
+    await _download(url, savepath, overwrite, downloader)
+    return savepath
+
+
+async def get_rdr_some_label(kind, obsid, overwrite=False, downloader=None):
+    """Async `downloads.get_rdr_some_label`.
+
+    Returns
+    -------
+    labels.HiRISE_Label or None
+        The label read in 'keywords' mode through the label cache, None if the download
+        failed.
+    """
+    from .labels import HiRISE_Label
+
+    downloader = get_async_downloader() if downloader is None else downloader
+    url, savepath = _label_target(kind, obsid)
+    if not await _download(url, savepath, overwrite, downloader):
+        return None
+    return await downloader.run(HiRISE_Label, savepath, mode='keywords', cache=True)
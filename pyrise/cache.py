@@ -0,0 +1,314 @@
+"""Product cache shared by all pyrise processes and users of a machine.
+
+Products are stored below the cache root under the SHA1 hash of their PDS path, so the
+same product is fetched once no matter which worker, user or server asks for it. While a
+product is fetched its entry is locked, other processes wait for the download instead of
+starting their own. Downloads land in a `.part` file that is renamed when complete, so a
+product file in the cache always is complete.
+
+Folders of the cache are group-writable with the setgid bit, so all members of the group
+owning the cache root can add and evict products. Cached products are read-only, so
+writing to a file linked into a storage path cannot change the cache for the others.
+
+The cache is used by the functions in `downloads` when configured, either with
+`configure_cache` or the environment variable PYRISE_CACHE_DIR (and optionally
+PYRISE_CACHE_MAX_BYTES). When it grows beyond its size limit, the least recently used
+products are deleted.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from six.moves.urllib.parse import urlsplit
+
+from .transfers import link_file, part_path, stream_download
+
+try:
+    import fcntl
+except ImportError:
+    FCNTL_INSTALLED = False
+else:
+    FCNTL_INSTALLED = True
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENV = 'PYRISE_CACHE_DIR'
+MAX_BYTES_ENV = 'PYRISE_CACHE_MAX_BYTES'
+
+STAT_KEYS = ('hits', 'misses', 'waits', 'downloaded_bytes', 'evicted', 'bytes')
+
+# permissions of folders, of lock and bookkeeping files, and of cached products
+DIR_MODE = 0o2775
+FILE_MODE = 0o664
+OBJECT_MODE = 0o444
+
+
+def _share(path, mode):
+    """Set the permissions of `path` independent of the umask, if it is ours."""
+    try:
+        os.chmod(str(path), mode)
+    except PermissionError:
+        # created by another user of the group, who set them already
+        pass
+
+
+def _mkdirs(root, path):
+    """Create `path` and its missing parents below `root` group-writable."""
+    missing = []
+    while path != root and not path.exists():
+        missing.append(path)
+        path = path.parent
+    for folder in reversed(missing):
+        folder.mkdir(exist_ok=True)
+        _share(folder, DIR_MODE)
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Hold an exclusive lock on `path` (created if needed) across processes.
+
+    Yields False instead of waiting if `blocking` is False and the lock is taken. Without
+    `fcntl` (e.g. on Windows) this only locks between threads of this process.
+    """
+    created = not os.path.exists(str(path))
+    with open(str(path), 'a') as f:
+        if created:
+            _share(path, FILE_MODE)
+        if not FCNTL_INSTALLED:
+            with _thread_lock:
+                yield True
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_thread_lock = threading.RLock()
+
+
+class ProductCache(object):
+    """Shared directory of downloaded products.
+
+    Parameters
+    ----------
+    root : str or pathlib.Path
+        Cache directory, created if needed.
+    max_bytes : int, optional
+        Size limit of the cached products. Default: no limit
+    """
+
+    def __init__(self, root, max_bytes=None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        if not self.root.exists():
+            self.root.mkdir(parents=True)
+            _share(self.root, DIR_MODE)
+        _mkdirs(self.root, self.root / 'objects')
+
+    def entry(self, url):
+        """Return the folder of the cache entry of `url`."""
+        key = hashlib.sha1(urlsplit(str(url)).path.encode()).hexdigest()
+        return self.root / 'objects' / key[:2] / key
+
+    def path(self, url):
+        """Return where the product of `url` is stored in the cache."""
+        return self.entry(url) / Path(urlsplit(str(url)).path).name
+
+    def __contains__(self, url):
+        return self.path(url).exists()
+
+    def fetch(self, url, overwrite=False):
+        """Return the cached product of `url`, downloading it first if needed.
+
+        Raises the errors of `transfers.stream_download`, and PermissionError if the cache
+        cannot be written.
+        """
+        entry = self.entry(url)
+        _mkdirs(self.root, entry)
+        path = self.path(url)
+        if path.exists() and not overwrite:
+            self._touch(entry)
+            self._count(hits=1)
+            return path
+        with file_lock(entry / '.lock'):
+            if path.exists() and not overwrite:
+                # another process downloaded it while we waited
+                self._touch(entry)
+                self._count(hits=1, waits=1)
+                return path
+            old_size = path.stat().st_size if path.exists() else 0
+            logger.info("Caching %s in %s", url, path)
+            try:
+                stream_download(url, path)
+            finally:
+                # other users may resume an interrupted transfer
+                if part_path(path).exists():
+                    _share(part_path(path), FILE_MODE)
+            # read-only before it is linked anywhere, writes to a link would change it
+            _share(path, OBJECT_MODE)
+            size = path.stat().st_size
+            self._touch(entry)
+        total = self._count(misses=1, downloaded_bytes=size, bytes=size - old_size)['bytes']
+        if self.max_bytes is not None and total > self.max_bytes:
+            self.evict()
+        return path
+
+    @staticmethod
+    def _touch(entry):
+        used = entry / '.used'
+        created = not used.exists()
+        used.touch()
+        if created:
+            _share(used, FILE_MODE)
+
+    def _update_stats(self, update):
+        stats_path = self.root / 'stats.json'
+        with file_lock(self.root / 'stats.lock'):
+            try:
+                stats = json.loads(stats_path.read_text())
+            except (IOError, ValueError):
+                stats = dict.fromkeys(STAT_KEYS, 0)
+            update(stats)
+            tmp = stats_path.with_name('stats.json.{}.tmp'.format(os.getpid()))
+            tmp.write_text(json.dumps(stats))
+            _share(tmp, FILE_MODE)
+            os.replace(str(tmp), str(stats_path))
+        return stats
+
+    def _count(self, **counts):
+        def update(stats):
+            for key, value in counts.items():
+                stats[key] = stats.get(key, 0) + value
+        return self._update_stats(update)
+
+    def entries(self):
+        """Return (last use, size, entry folder) of all cached products, oldest first."""
+        entries = []
+        for folder in (self.root / 'objects').glob('*/*'):
+            files = [f for f in folder.iterdir() if not f.name.startswith('.') and
+                     not f.name.endswith('.part')]
+            if not files:
+                continue
+            used = folder / '.used'
+            last_use = used.stat().st_mtime if used.exists() else 0
+            entries.append((last_use, sum(f.stat().st_size for f in files), folder))
+        return sorted(entries, key=lambda entry: entry[0])
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used products until the cache fits `max_bytes`.
+
+        Entries locked by a running download are skipped.
+
+        Returns
+        -------
+        int
+            Number of deleted products.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, folder in entries:
+            if total <= max_bytes:
+                break
+            with file_lock(folder / '.lock', blocking=False) as locked:
+                if not locked:
+                    continue
+                # the lock file stays, waiting processes still hold it open
+                for f in folder.iterdir():
+                    if f.name != '.lock':
+                        f.unlink()
+            total -= size
+            evicted += 1
+        logger.info("Evicted %i products from %s", evicted, self.root)
+
+        def update(stats):
+            stats['bytes'] = total
+            stats['evicted'] = stats.get('evicted', 0) + evicted
+        self._update_stats(update)
+        return evicted
+
+    def clear(self):
+        """Delete all cached products and the statistics."""
+        shutil.rmtree(str(self.root / 'objects'))
+        _mkdirs(self.root, self.root / 'objects')
+        self._update_stats(lambda stats: stats.update(dict.fromkeys(STAT_KEYS, 0)))
+
+    def stats(self):
+        """Return the hit and miss counts of all processes using this cache."""
+        return self._update_stats(lambda stats: None)
+
+    def report(self):
+        """Return a one line summary of hit rate and size of the cache."""
+        stats = self.stats()
+        requests = stats['hits'] + stats['misses']
+        rate = 100 * stats['hits'] / requests if requests else 0
+        limit = '' if self.max_bytes is None else ' of {:.1f} MB'.format(self.max_bytes / 1e6)
+        return ("{} requests, {} hits ({:.1f}%, {} after waiting for another download), "
+                "{} misses, {:.1f} MB cached{}, {} evicted.".format(
+                    requests, stats['hits'], rate, stats['waits'], stats['misses'],
+                    stats['bytes'] / 1e6, limit, stats['evicted']))
+
+
+_cache = None
+_configured = False
+
+
+def configure_cache(root=None, max_bytes=None):
+    """Use a product cache at `root` for all downloads of this process, None disables it."""
+    global _cache, _configured
+    _cache = None if root is None else ProductCache(root, max_bytes)
+    _configured = True
+    return _cache
+
+
+def get_product_cache():
+    """Return the configured product cache, or None if there is none.
+
+    Without a call to `configure_cache`, the environment variable PYRISE_CACHE_DIR is used.
+    """
+    if not _configured:
+        root = os.environ.get(CACHE_ENV)
+        max_bytes = os.environ.get(MAX_BYTES_ENV)
+        configure_cache(root, None if max_bytes is None else int(max_bytes))
+    return _cache
+
+
+def cached_download(url, savepath, overwrite=False):
+    """Store the product of `url` at `savepath`, through the product cache if configured.
+
+    Returns
+    -------
+    str
+        'exists' if `savepath` was there already (and not `overwrite`), 'cached' if it
+        came from the cache or 'downloaded'.
+    """
+    savepath = Path(savepath)
+    if savepath.exists() and not overwrite:
+        return 'exists'
+    savepath.parent.mkdir(parents=True, exist_ok=True)
+    cache = get_product_cache()
+    if cache is None or urlsplit(url).scheme == 'file':
+        # local files, e.g. from a mirror, are linked directly
+        stream_download(url, savepath)
+        return 'downloaded'
+    cached = url in cache and not overwrite
+    try:
+        link_file(cache.fetch(url, overwrite=overwrite), savepath)
+    except FileNotFoundError:
+        # evicted by another process between the hit and the link, fetch it again
+        logger.info("%s was evicted from the cache, fetching it again", url)
+        link_file(cache.fetch(url), savepath)
+        cached = False
+    return 'cached' if cached else 'downloaded'
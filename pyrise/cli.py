@@ -3,12 +3,54 @@
 import click
 
 
-@click.command()
-def main(args=None):
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx, args=None):
     """Console script for pyrise"""
-    click.echo("Replace this message by putting your code into "
-               "pyrise.cli.main")
-    click.echo("See click documentation at http://click.pocoo.org/")
+    if ctx.invoked_subcommand is None:
+        click.echo("Replace this message by putting your code into "
+                   "pyrise.cli.main")
+        click.echo("See click documentation at http://click.pocoo.org/")
+
+
+@main.command()
+@click.argument('product_ids', nargs=-1, required=True)
+@click.option('--all-red', is_flag=True,
+              help='Treat arguments as obsids and fetch all 20 RED CCD/channel EDRs.')
+@click.option('--saveroot', default=None, help='Storage root for the downloads.')
+@click.option('--overwrite', is_flag=True, help='Download again if the file exists.')
+@click.option('--workers', default=8, show_default=True, help='Number of parallel downloads.')
+@click.option('--per-host', default=4, show_default=True,
+              help='Maximum parallel downloads per host.')
+@click.option('--manifest', default=None, type=click.Path(dir_okay=False),
+              help='Write the JSON result manifest to this file.')
+def download(product_ids, all_red, saveroot, overwrite, workers, per_host, manifest):
+    """Download EDR source products like PSP_003092_0985_RED4_0 concurrently."""
+    from .downloads import download_source_products, red_source_products
+
+    if all_red:
+        product_ids = [spid for obsid in product_ids for spid in red_source_products(obsid)]
+    records = download_source_products(product_ids, saveroot=saveroot, overwrite=overwrite,
+                                       max_workers=workers, max_per_host=per_host,
+                                       manifest=manifest)
+    if any(record['status'] == 'failed' for record in records):
+        raise SystemExit(1)
+
+
+@main.command()
+@click.argument('obsid')
+@click.option('--ccd', 'ccds', multiple=True, help='CCD to stitch, like RED5. Default: all.')
+@click.option('--saveroot', default=None, help='Storage root for the EDRs.')
+@click.option('--outroot', default=None, help='Storage root for the stitched .npy files.')
+@click.option('--workers', default=4, show_default=True, help='CCDs stitched in parallel.')
+def stitch(obsid, ccds, saveroot, outroot, workers):
+    """Download the EDRs of OBSID and join both channels of each CCD."""
+    from .stitching import stitch_observation
+
+    result = stitch_observation(obsid, ccds=list(ccds) or None, saveroot=saveroot,
+                                outroot=outroot, max_workers=workers)
+    for ccd, path in sorted(result.items()):
+        click.echo("{}: {}".format(ccd, path))
 
 
 if __name__ == "__main__":
@@ -1,15 +1,35 @@
+"""Downsampling of image arrays.
+
+`block_reduce` combines blocks of pixels for integer factors with reshaped views, without
+any index arrays. `resample` does area-weighted resampling to any shape. Both keep the
+dtype of the input, rounding for integer types.
+
+`rebin_strips` applies them out of core: the input, typically a memory map, is read in
+strips of lines and the result written strip by strip, e.g. into a `.npy` memory map.
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import numpy as np
 
+# default number of input bytes processed per strip
+STRIP_BYTES = 64 * 1024 * 1024
+
+REDUCERS = {
+    'mean': np.mean,
+    'sum': np.sum,
+    'median': np.median,
+}
+
 
 def rebin(a, newshape):
-    """Rebin an array to a new shape."""
+    """Rebin an array to a new shape, picking the nearest smaller pixel."""
     assert len(a.shape) == len(newshape)
 
-    slices = [slice(0, old, float(old) / new) for old, new in zip(a.shape, newshape)]
-    coordinates = np.mgrid[slices]
-    indices = coordinates.astype('i')  # choose the biggest smaller integer index
-    print(len(indices), indices.max())
-    return a[tuple(indices)]
+    indices = [(np.arange(new) * (old / new)).astype(np.intp)
+               for old, new in zip(a.shape, newshape)]
+    return a[np.ix_(*indices)]
 
 
 def rebin_factor(a, newshape):
@@ -17,7 +37,226 @@ def rebin_factor(a, newshape):
     newshape must be a factor of a.shape.
     '''
     assert len(a.shape) == len(newshape)
-    assert not np.sometrue(np.mod(a.shape, newshape))
+    assert not np.any(np.mod(a.shape, newshape))
 
-    slices = [slice(None, None, old / new) for old, new in zip(a.shape, newshape)]
+    slices = tuple(slice(None, None, old // new) for old, new in zip(a.shape, newshape))
     return a[slices]
+
+
+def _cast(result, dtype):
+    """Cast a floating point result back to `dtype`, rounding and clipping for integers."""
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        result = np.clip(np.rint(result), info.min, info.max)
+    return result.astype(dtype, copy=False)
+
+
+def _factors(factor, ndim):
+    factors = (factor,) * ndim if np.isscalar(factor) else tuple(factor)
+    if len(factors) != ndim:
+        raise ValueError("Need one factor per dimension of the array.")
+    if any(int(f) != f or f < 1 for f in factors):
+        raise ValueError("Factors must be positive integers, use `resample` otherwise.")
+    return tuple(int(f) for f in factors)
+
+
+def block_reduce(a, factor, func='mean', dtype=None):
+    """Reduce blocks of `factor` pixels per axis to one pixel.
+
+    Rows and columns that do not fill a complete block at the end of an axis are dropped.
+
+    Parameters
+    ----------
+    a : numpy.ndarray
+        Input array, also a memory map.
+    factor : int or tuple of int
+        Block size, for all axes or per axis.
+    func : {'mean', 'sum', 'median'}, optional
+        How to combine the pixels of a block. Default: 'mean'
+    dtype : numpy.dtype, optional
+        Output dtype. Default: dtype of `a` for mean and median, the numpy default
+        accumulator for sums (avoiding overflows).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape `a.shape // factor`.
+    """
+    if func not in REDUCERS:
+        raise ValueError("func must be one of {}".format(list(REDUCERS)))
+    factors = _factors(factor, a.ndim)
+    shape = tuple(n // f for n, f in zip(a.shape, factors))
+    a = a[tuple(slice(0, n * f) for n, f in zip(shape, factors))]
+    # (n0, f0, n1, f1, ...) view, reduced over the odd axes
+    blocks = a.reshape([size for n, f in zip(shape, factors) for size in (n, f)])
+    axes = tuple(range(1, blocks.ndim, 2))
+    if func == 'sum':
+        return blocks.sum(axis=axes, dtype=dtype)
+    if func == 'mean':
+        result = blocks.mean(axis=axes, dtype=np.float64)
+    else:
+        # median needs the pixels of a block on one axis
+        blocks = np.moveaxis(blocks, axes, range(a.ndim, blocks.ndim))
+        result = np.median(blocks.reshape(shape + (-1,)), axis=-1)
+    return _cast(result, a.dtype if dtype is None else dtype)
+
+
+def _resample_axis(a, new, axis, start=0, stop=None):
+    """Area-weighted resampling of one axis using the cumulative sum of the input.
+
+    The output covers `start` to `stop` (default: the whole axis) in input pixels. The
+    cumulative sum is written into one float64 buffer with a leading row of zeros, the
+    only temporary array the size of the input.
+    """
+    old = a.shape[axis]
+    if stop is None:
+        stop = old
+    if new == old and start == 0 and stop == old:
+        return a
+    shape = [1] * a.ndim
+    shape[axis] = new + 1
+    bufshape = list(a.shape)
+    bufshape[axis] = old + 1
+    cumsum = np.empty(bufshape, dtype=np.float64)
+    before = (slice(None),) * axis
+    cumsum[before + (0,)] = 0
+    np.cumsum(a, axis=axis, dtype=np.float64, out=cumsum[before + (slice(1, None),)])
+    # the integral of the pixel values is linear between pixel edges
+    edges = np.linspace(start, stop, new + 1)
+    index = np.minimum(edges.astype(np.intp), old - 1)
+    frac = (edges - index).reshape(shape)
+    lower = np.take(cumsum, index, axis=axis)
+    integral = np.take(cumsum, index + 1, axis=axis)
+    integral -= lower
+    integral *= frac
+    integral += lower
+    return np.diff(integral, axis=axis) * (new / (stop - start))
+
+
+def resample(a, newshape, dtype=None):
+    """Resample to any shape, averaging the input pixels weighted by their overlap.
+
+    Every output pixel covers `a.shape / newshape` input pixels, partially covered ones
+    count with their covered fraction. This conserves the mean of the image and also
+    works for non-integer factors and upsampling.
+
+    Parameters
+    ----------
+    a : numpy.ndarray
+        Input array.
+    newshape : tuple of int
+        Output shape.
+    dtype : numpy.dtype, optional
+        Output dtype. Default: dtype of `a`
+
+    Returns
+    -------
+    numpy.ndarray
+
+    Notes
+    -----
+    Each axis needs a float64 cumulative sum the size of the input in memory. Use
+    `rebin_strips` with `newshape` for images that are larger than that, e.g. memory maps.
+    """
+    if len(newshape) != a.ndim:
+        raise ValueError("newshape must have as many dimensions as the array.")
+    result = a
+    for axis, new in enumerate(newshape):
+        result = _resample_axis(result, int(new), axis)
+    if result is a:
+        return a.astype(a.dtype if dtype is None else dtype)
+    return _cast(result, a.dtype if dtype is None else dtype)
+
+
+def _output_array(out, shape, dtype):
+    if out is None:
+        return np.empty(shape, dtype)
+    if isinstance(out, (str, Path)):
+        return np.lib.format.open_memmap(str(out), mode='w+', dtype=dtype, shape=shape)
+    if out.shape != shape:
+        raise ValueError("out has shape {}, need {}.".format(out.shape, shape))
+    return out
+
+
+def rebin_strips(a, factor=None, newshape=None, func='mean', out=None, strip_lines=None,
+                 max_workers=1, dtype=None):
+    """Out-of-core `block_reduce` (given `factor`) or `resample` (given `newshape`).
+
+    The input is read in strips of lines and each reduced strip is written to `out`
+    right away, so memory use is bounded by the strip size times `max_workers`, not by the
+    size of the image.
+
+    Parameters
+    ----------
+    a : numpy.ndarray
+        Input image, usually a `numpy.memmap`.
+    factor : int or tuple of int, optional
+        Block size for `block_reduce`.
+    newshape : tuple of int, optional
+        Output shape for `resample`.
+    func : {'mean', 'sum', 'median'}, optional
+        Block reduction, see `block_reduce`. Default: 'mean'
+    out : str, pathlib.Path or numpy.ndarray, optional
+        Where to write the result: a `.npy` file created as memory map, or an existing
+        array of the output shape. Default: a new array in memory
+    strip_lines : int, optional
+        Input lines per strip. Default: about `STRIP_BYTES` of input per strip
+    max_workers : int, optional
+        Number of strips processed in parallel threads. Default: 1
+    dtype : numpy.dtype, optional
+        Output dtype, see `block_reduce` and `resample`.
+
+    Returns
+    -------
+    numpy.ndarray
+        `out`, flushed if it is a memory map.
+    """
+    if (factor is None) == (newshape is None):
+        raise ValueError("Give either factor or newshape.")
+    if strip_lines is None:
+        line_bytes = a.itemsize * int(np.prod(a.shape[1:]))
+        strip_lines = max(1, STRIP_BYTES // max(line_bytes, 1))
+
+    if factor is not None:
+        factors = _factors(factor, a.ndim)
+        shape = tuple(n // f for n, f in zip(a.shape, factors))
+        if dtype is None:
+            dtype = (np.zeros(1, a.dtype).sum().dtype if func == 'sum' else a.dtype)
+        # whole blocks per strip
+        rows = max(1, strip_lines // factors[0])
+
+        def process(start):
+            stop = min(start + rows, shape[0])
+            strip = np.asarray(a[start * factors[0]:stop * factors[0]])
+            output[start:stop] = block_reduce(strip, factors, func, dtype)
+    else:
+        shape = tuple(int(n) for n in newshape)
+        if len(shape) != a.ndim:
+            raise ValueError("newshape must have as many dimensions as the array.")
+        dtype = a.dtype if dtype is None else dtype
+        scale = a.shape[0] / shape[0]
+        rows = max(1, int(strip_lines / scale))
+
+        def process(start):
+            stop = min(start + rows, shape[0])
+            # input lines touched by these output lines, and their position within
+            first = int(math.floor(start * scale))
+            last = min(int(math.ceil(stop * scale)), a.shape[0])
+            strip = np.asarray(a[first:last])
+            result = _resample_axis(strip, stop - start, 0, start * scale - first,
+                                    stop * scale - first)
+            for axis, new in enumerate(shape[1:], 1):
+                result = _resample_axis(result, new, axis)
+            output[start:stop] = _cast(result, dtype)
+
+    output = _output_array(out, shape, dtype)
+    starts = range(0, shape[0], rows)
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(process, starts))
+    else:
+        for start in starts:
+            process(start)
+    if isinstance(output, np.memmap):
+        output.flush()
+    return output
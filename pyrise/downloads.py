@@ -1,12 +1,17 @@
+import json
+import os
+import struct
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.client import HTTPException
 from pathlib import Path
 
 import click
-from imageio import imread
-from six.moves.urllib.error import HTTPError
-from six.moves.urllib.request import urlretrieve
+from six.moves.urllib.parse import urlparse
 
-from .products import PRODUCT_ID, RED_PRODUCT_ID, HiRISE_URL
+from .cache import cached_download
+from .products import PRODUCT_ID, RED_PRODUCT_ID, SOURCE_PRODUCT_ID, HiRISE_URL
 
 try:
     from pptx import Presentation
@@ -16,7 +21,13 @@ else:
     PPTX_INSTALLED = True
 
 
+# environment variable overriding the default data folder of `hirise_dropbox`
+DATA_DIR_ENV = 'PYRISE_DATA_DIR'
+
+
 def hirise_dropbox():
+    if os.environ.get(DATA_DIR_ENV):
+        return Path(os.environ[DATA_DIR_ENV])
     return Path.home() / 'Dropbox' / 'data' / 'hirise'
 
 
@@ -28,7 +39,13 @@ def browse_root():
     return hirise_dropbox() / 'browse'
 
 
-def get_rdr_some_label(kind, obsid):
+def _label_target(kind, obsid):
+    """Return URL and storage path of the label of `get_rdr_some_label`."""
+    pid = PRODUCT_ID(obsid=obsid, kind=kind)
+    return pid.label_url, labels_root() / Path(pid.label_fname)
+
+
+def get_rdr_some_label(kind, obsid, overwrite=False):
     """Download `some` PRODUCT_ID label for `obsid`.
 
     Note, that the RED channel is also called the B&W channel on the HiRISE website.
@@ -39,22 +56,28 @@ def get_rdr_some_label(kind, obsid):
         String that determines the kind of color looking for.
     obsid : str
         HiRISE obsid in the standard form of ESP_012345_1234
+    overwrite : bool, optional
+        Download again if the label already is in the `labels_root` folder.
 
     Returns
     -------
-    None
-        Storing the label file in the `labels_root` folder.
+    labels.HiRISE_Label or None
+        Label stored in the `labels_root` folder, reading its values through the label
+        cache. None if the download failed.
 
     """
-    pid = PRODUCT_ID(obsid)
-    pid.kind = kind
-    savepath = labels_root() / Path(pid.label_fname)
-    savepath.parent.mkdir(exist_ok=True)
-    print("Downloading\n", pid.label_url, 'to\n', savepath)
-    try:
-        urlretrieve(pid.label_url, str(savepath))
-    except HTTPError as e:
-        print(e)
+    from .labels import HiRISE_Label
+
+    url, savepath = _label_target(kind, obsid)
+    savepath.parent.mkdir(parents=True, exist_ok=True)
+    if overwrite or not savepath.exists():
+        print("Downloading\n", url, 'to\n', savepath)
+        try:
+            cached_download(url, savepath, overwrite=overwrite)
+        except (OSError, HTTPException) as e:  # HTTPError is an OSError
+            print(e)
+            return None
+    return HiRISE_Label(savepath, mode='keywords', cache=True)
 
 
 def get_rdr_red_label(obsid):
@@ -71,10 +94,10 @@ def get_rdr_red_label(obsid):
 
     Returns
     -------
-    None
-        Storing the label file in the `labels_root` folder.
+    labels.HiRISE_Label or None
+        See `get_rdr_some_label`.
     """
-    get_rdr_some_label('RED', obsid)
+    return get_rdr_some_label('RED', obsid)
 
 
 def get_rdr_color_label(obsid):
@@ -87,55 +110,171 @@ def get_rdr_color_label(obsid):
 
     Returns
     -------
-    None
-        Storing the label file in the `labels_root` folder.
+    labels.HiRISE_Label or None
+        See `get_rdr_some_label`.
     """
-    get_rdr_some_label('COLOR', obsid)
+    return get_rdr_some_label('COLOR', obsid)
 
 
-def download_product(prodid_path, saveroot=None):
+def _resolve_saveroot(saveroot):
+    """Return `saveroot` as absolute path, relative ones are put below `hirise_dropbox`."""
     if saveroot is None:
-        saveroot = hirise_dropbox()
-    else:
-        saveroot = Path(saveroot)
-        if not saveroot.is_absolute():
-            saveroot = hirise_dropbox() / saveroot
-
-    saveroot.mkdir(exist_ok=True)
-    url = HiRISE_URL(prodid_path)
-    savepath = saveroot / prodid_path.name
-    print("Downloading\n", url.url, 'to\n', savepath)
+        return hirise_dropbox()
+    saveroot = Path(saveroot)
+    if not saveroot.is_absolute():
+        saveroot = hirise_dropbox() / saveroot
+    return saveroot
+
+
+def _product_target(prodid_path, saveroot):
+    """Return URL and storage path of `download_product`."""
+    return HiRISE_URL(prodid_path).url, _resolve_saveroot(saveroot) / Path(prodid_path).name
+
+
+def download_product(prodid_path, saveroot=None, overwrite=False):
+    url, savepath = _product_target(prodid_path, saveroot)
+    savepath.parent.mkdir(parents=True, exist_ok=True)
+    if savepath.exists() and not overwrite:
+        return savepath
+    print("Downloading\n", url, 'to\n', savepath)
     try:
-        urlretrieve(url.url, str(savepath))
-    except HTTPError as e:
+        cached_download(url, savepath, overwrite=overwrite)
+    except (OSError, HTTPException) as e:  # HTTPError is an OSError
         print(e)
     return savepath
 
 
-def download_RED_product(obsid, ccdno, channel, saveroot=None, overwrite=False):
-    if saveroot is None:
-        saveroot = hirise_dropbox()
-    else:
-        saveroot = Path(saveroot)
-        if not saveroot.is_absolute():
-            saveroot = hirise_dropbox() / saveroot
-
+def _red_target(obsid, ccdno, channel, saveroot):
+    """Return URL and storage path of `download_RED_product`."""
     pid = RED_PRODUCT_ID(obsid, ccdno, channel)
-    savepath = saveroot / obsid / pid.fname
+    return pid.furl, _resolve_saveroot(saveroot) / obsid / pid.fname
+
+
+def download_RED_product(obsid, ccdno, channel, saveroot=None, overwrite=False):
+    url, savepath = _red_target(obsid, ccdno, channel, saveroot)
     savepath.parent.mkdir(parents=True, exist_ok=True)
 
     # if file already is there:
     if savepath.exists() and not overwrite:
         return savepath
 
-    print("Downloading\n", pid.furl, '\nto\n', savepath)
+    print("Downloading\n", url, '\nto\n', savepath)
     try:
-        urlretrieve(pid.furl, str(savepath))
-    except HTTPError as e:
+        cached_download(url, savepath, overwrite=overwrite)
+    except (OSError, HTTPException) as e:  # HTTPError is an OSError
         print(e)
     return savepath
 
 
+def red_source_products(obsid):
+    """Return the 20 RED SOURCE_PRODUCT_ID strings (10 CCDs x 2 channels) of `obsid`."""
+    return ['{}_RED{}_{}'.format(obsid, ccdno, channel)
+            for ccdno in range(10) for channel in (0, 1)]
+
+
+class HostLimiter(object):
+    """Limit the number of concurrent requests going to the same host.
+
+    Parameters
+    ----------
+    max_per_host : int
+        Maximum number of simultaneous transfers per network location.
+    """
+
+    def __init__(self, max_per_host=4):
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        """Return the semaphore guarding the host of `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+
+def _download_source_product(spid, saveroot, overwrite, limiter):
+    savepath = saveroot / str(spid.obsid) / spid.fname
+    record = dict(product_id=spid.s, url=spid.furl, path=str(savepath), status=None, error=None)
+    if savepath.exists() and not overwrite:
+        record['status'] = 'exists'
+        return record
+    savepath.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with limiter(record['url']):
+            record['status'] = cached_download(record['url'], savepath, overwrite=overwrite)
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = str(e)
+    return record
+
+
+def download_source_products(spids, saveroot=None, overwrite=False, max_workers=8,
+                             max_per_host=4, progress=True, manifest=None):
+    """Download many EDR source products concurrently.
+
+    Parameters
+    ----------
+    spids : iterable of str or SOURCE_PRODUCT_ID
+        Source product ids like 'PSP_003092_0985_RED4_0'.
+    saveroot : str, pathlib.Path, optional
+        Storage root, relative paths are put below `hirise_dropbox`. Each product is stored
+        in a sub-folder named after its obsid, like in `download_RED_product`.
+    overwrite : bool, optional
+        Download again even if the file exists already. Default: False
+    max_workers : int, optional
+        Size of the thread pool. Default: 8
+    max_per_host : int, optional
+        Maximum number of simultaneous transfers to the same host. Default: 4
+    progress : bool, optional
+        Print a line per finished product with the overall count. Default: True
+    manifest : str, pathlib.Path, optional
+        If given, store the result manifest as JSON at this path.
+
+    Returns
+    -------
+    list of dict
+        Manifest in input order, one record per product with the keys `product_id`, `url`,
+        `path`, `status` (one of 'downloaded', 'cached', 'exists', 'failed') and `error`.
+        'cached' products came from the shared product cache, see `cache`.
+    """
+    saveroot = _resolve_saveroot(saveroot)
+    spids = [spid if isinstance(spid, SOURCE_PRODUCT_ID) else SOURCE_PRODUCT_ID(str(spid))
+             for spid in spids]
+    limiter = HostLimiter(max_per_host)
+    records = [None] * len(spids)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_download_source_product, spid, saveroot, overwrite,
+                                   limiter): i
+                   for i, spid in enumerate(spids)}
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            records[futures[future]] = record
+            if progress:
+                print("[{}/{}] {}: {}".format(done, len(spids), record['status'],
+                                              record['product_id']))
+    if progress:
+        failed = sum(record['status'] == 'failed' for record in records)
+        print("{} of {} products available, {} failed.".format(len(records) - failed,
+                                                               len(records), failed))
+    if manifest is not None:
+        with open(str(manifest), 'w') as f:
+            json.dump(records, f, indent=2)
+    return records
+
+
+def _browse_target(obsid, kind, annotated, saveroot):
+    """Return URL and storage path of `download_browse_product`."""
+    pid = PRODUCT_ID(f"{obsid}_{kind}")
+    if annotated is True:
+        url = pid.abrowse_url
+    else:
+        url = pid.browse_url
+    return url, Path(saveroot) / Path(url).name
+
+
 def download_browse_product(obsid, kind='RED', annotated=True, saveroot='.', overwrite=False):
     """Download a browse product from HiRISE website.
 
@@ -154,13 +293,7 @@ def download_browse_product(obsid, kind='RED', annotated=True, saveroot='.', ove
     overwrite : bool, optional
         Boolean switch to control if an existing path should be overwritten. Default: False
     """
-    pid = PRODUCT_ID(f"{obsid}_{kind}")
-    if annotated is True:
-        url = pid.abrowse_url
-    else:
-        url = pid.browse_url
-    saveroot = Path(saveroot)
-    savepath = saveroot / Path(url).name
+    url, savepath = _browse_target(obsid, kind, annotated, saveroot)
     savepath.parent.mkdir(parents=True, exist_ok=True)
 
     if savepath.exists() and not overwrite:
@@ -169,8 +302,8 @@ def download_browse_product(obsid, kind='RED', annotated=True, saveroot='.', ove
 
     print("Downloading\n", url, '\nto\n', savepath)
     try:
-        urlretrieve(url, str(savepath))
-    except HTTPError as e:
+        cached_download(url, savepath, overwrite=overwrite)
+    except (OSError, HTTPException) as e:  # HTTPError is an OSError
         print(e)
     return savepath
 
@@ -182,7 +315,62 @@ def get_and_display_browse_product(obsid):
     subprocess.run(["open", "-a", "Preview", path])
 
 
-def create_browse_presentation(obsids, savename='obsid_browse_images', **kwargs):
+# JPEG start of frame markers, they carry the image size
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_size(path):
+    """Return (height, width) of a JPEG or PNG image, reading only its header.
+
+    Raises
+    ------
+    ValueError
+        For other formats or broken headers.
+    """
+    with open(str(path), 'rb') as f:
+        head = f.read(24)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            width, height = struct.unpack('>II', head[16:24])
+            return height, width
+        if not head.startswith(b'\xff\xd8'):
+            raise ValueError("{} is neither JPEG nor PNG.".format(path))
+        f.seek(2)
+        while True:
+            byte = f.read(1)
+            while byte and byte != b'\xff':
+                byte = f.read(1)
+            while byte == b'\xff':  # fill bytes
+                byte = f.read(1)
+            if not byte:
+                raise ValueError("No frame header found in {}.".format(path))
+            marker = byte[0]
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                continue  # markers without a segment
+            length = struct.unpack('>H', f.read(2))[0]
+            if marker in SOF_MARKERS:
+                # precision, height, width
+                _, height, width = struct.unpack('>BHH', f.read(5))
+                return height, width
+            f.seek(length - 2, 1)
+
+
+def create_browse_presentation(obsids, savename='obsid_browse_images', max_workers=8,
+                               **kwargs):
+    """Create a PowerPoint file with one slide per browse image of `obsids`.
+
+    The browse products are downloaded concurrently, only the slides are added one by one.
+
+    Parameters
+    ----------
+    obsids : list of str
+        HiRISE observation IDs, one slide each in this order.
+    savename : str, optional
+        Name of the presentation, without the .pptx suffix.
+    max_workers : int, optional
+        Number of parallel downloads. Default: 8
+    kwargs
+        Passed on to `download_browse_product`.
+    """
     if not PPTX_INSTALLED:
         print("You need to install the `pptx` module for this to work.")
         return
@@ -194,17 +382,22 @@ def create_browse_presentation(obsids, savename='obsid_browse_images', **kwargs)
 
     blank_slide_layout = prs.slide_layouts[6]
 
-    for obsid in obsids[0:]:
-        imgpath = str(download_browse_product(obsid, **kwargs))
-        slide = prs.slides.add_slide(blank_slide_layout)
-        img = imread(imgpath)
-        ratio = img.shape[0] / img.shape[1]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        imgpaths = list(executor.map(lambda obsid: download_browse_product(obsid, **kwargs),
+                                     obsids))
+    for obsid, imgpath in zip(obsids, imgpaths):
+        if not imgpath.exists():
+            print("No browse image for", obsid)
+            continue
+        height, width = image_size(imgpath)
+        ratio = height / width
         if ratio < 1:
             pic_width = int(prs.slide_width)
-            pic_height = int(pic_width * img.shape[0] / img.shape[1])
+            pic_height = int(pic_width * ratio)
         else:
             pic_height = int(prs.slide_height)
             pic_width = int(pic_height / ratio)
-        slide.shapes.add_picture(imgpath, pic_left, pic_top, pic_width, pic_height)
+        slide = prs.slides.add_slide(blank_slide_layout)
+        slide.shapes.add_picture(str(imgpath), pic_left, pic_top, pic_width, pic_height)
 
     prs.save(savepath)
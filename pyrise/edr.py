@@ -0,0 +1,153 @@
+"""Memory-mapped access to HiRISE EDR .IMG files.
+
+The layout of an image object is read from the label attached to the file: the `^IMAGE`
+pointer gives its offset, the IMAGE object its size and sample type. Every image line can
+be framed by LINE_PREFIX_BYTES and LINE_SUFFIX_BYTES of engineering data; the pixels are
+returned as strided view on the file, nothing is copied or read before it is accessed.
+"""
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from pvl.collections import Quantity
+
+from .labels import read_keywords
+
+# numpy type character and byte order per PDS SAMPLE_TYPE
+SAMPLE_TYPES = {
+    'MSB_UNSIGNED_INTEGER': ('u', '>'),
+    'UNSIGNED_INTEGER': ('u', '>'),
+    'MAC_UNSIGNED_INTEGER': ('u', '>'),
+    'SUN_UNSIGNED_INTEGER': ('u', '>'),
+    'LSB_UNSIGNED_INTEGER': ('u', '<'),
+    'PC_UNSIGNED_INTEGER': ('u', '<'),
+    'VAX_UNSIGNED_INTEGER': ('u', '<'),
+    'MSB_INTEGER': ('i', '>'),
+    'INTEGER': ('i', '>'),
+    'MAC_INTEGER': ('i', '>'),
+    'SUN_INTEGER': ('i', '>'),
+    'LSB_INTEGER': ('i', '<'),
+    'PC_INTEGER': ('i', '<'),
+    'VAX_INTEGER': ('i', '<'),
+    'IEEE_REAL': ('f', '>'),
+    'REAL': ('f', '>'),
+    'PC_REAL': ('f', '<'),
+}
+
+ImageLayout = namedtuple('ImageLayout', 'path offset lines line_samples dtype prefix_bytes '
+                                        'suffix_bytes')
+
+
+def _sample_dtype(sample_type, sample_bits):
+    """Return the numpy dtype of PDS samples, None if there is none."""
+    if sample_type not in SAMPLE_TYPES or sample_bits % 8:
+        return None
+    kind, byteorder = SAMPLE_TYPES[sample_type]
+    itemsize = sample_bits // 8
+    try:
+        return np.dtype('{}{}{}'.format('|' if itemsize == 1 else byteorder, kind, itemsize))
+    except TypeError:
+        return None
+
+
+def _pointer(value, record_bytes, label_path):
+    """Return file and byte offset (0-based) of a PDS object pointer value."""
+    path = Path(label_path)
+    if isinstance(value, list):
+        # ("FILE.IMG", 12) points into a detached file
+        path = path.with_name(value[0])
+        value = value[1] if len(value) > 1 else 1
+    elif isinstance(value, str):
+        return path.with_name(value), 0
+    if isinstance(value, Quantity):
+        if value.units.upper() == 'BYTES':
+            return path, value.value - 1
+        value = value.value
+    if record_bytes is None:
+        raise KeyError("RECORD_BYTES missing in {} for a pointer in records.".format(
+            label_path))
+    return path, (value - 1) * record_bytes
+
+
+def image_layout(fname, name='IMAGE'):
+    """Read where and how the `name` object is stored from the label of `fname`.
+
+    Parameters
+    ----------
+    fname : str or pathlib.Path
+        .IMG file with attached label (or a detached label pointing to the data).
+    name : str, optional
+        Image object, e.g. 'CALIBRATION_IMAGE'. Default: 'IMAGE'
+
+    Returns
+    -------
+    ImageLayout
+
+    Raises
+    ------
+    KeyError
+        If the label has no pointer to `name`, or a pointer in records without
+        RECORD_BYTES.
+    ValueError
+        For images with more than one band or samples without a numpy dtype.
+    """
+    keys = ['RECORD_BYTES', '^' + name] + ['{}/{}'.format(name, key) for key in (
+        'LINES', 'LINE_SAMPLES', 'SAMPLE_TYPE', 'SAMPLE_BITS', 'LINE_PREFIX_BYTES',
+        'LINE_SUFFIX_BYTES', 'BANDS')]
+    values = read_keywords(fname, keys)
+    if '^' + name not in values:
+        raise KeyError("No pointer to {} in {}".format(name, fname))
+    if values.get(name + '/BANDS', 1) != 1:
+        raise ValueError("Only single band images are supported, {} of {} has {}.".format(
+            name, fname, values[name + '/BANDS']))
+    dtype = _sample_dtype(values[name + '/SAMPLE_TYPE'], values[name + '/SAMPLE_BITS'])
+    if dtype is None:
+        raise ValueError("Unsupported samples in {}: SAMPLE_TYPE {} with SAMPLE_BITS {}."
+                         .format(fname, values[name + '/SAMPLE_TYPE'],
+                                 values[name + '/SAMPLE_BITS']))
+    path, offset = _pointer(values['^' + name], values.get('RECORD_BYTES'), fname)
+    return ImageLayout(path, offset, values[name + '/LINES'], values[name + '/LINE_SAMPLES'],
+                       dtype, values.get(name + '/LINE_PREFIX_BYTES', 0),
+                       values.get(name + '/LINE_SUFFIX_BYTES', 0))
+
+
+def _records(layout, mode):
+    """Memory map the image object as one record per line."""
+    fields = [('image', layout.dtype, (layout.line_samples,))]
+    if layout.prefix_bytes:
+        fields.insert(0, ('prefix', 'u1', (layout.prefix_bytes,)))
+    if layout.suffix_bytes:
+        fields.append(('suffix', 'u1', (layout.suffix_bytes,)))
+    return np.memmap(str(layout.path), dtype=np.dtype(fields), mode=mode,
+                     offset=layout.offset, shape=(layout.lines,))
+
+
+def memmap_image(fname, name='IMAGE', mode='r'):
+    """Return the pixels of an image object of an EDR as (lines, samples) memory map.
+
+    Line prefix and suffix bytes are skipped by the strides of the returned view.
+
+    Parameters
+    ----------
+    fname : str or pathlib.Path
+        .IMG file with attached label.
+    name : str, optional
+        Image object. Default: 'IMAGE'
+    mode : str, optional
+        `numpy.memmap` mode. Default: 'r'
+
+    Returns
+    -------
+    numpy.memmap
+    """
+    return _records(image_layout(fname, name), mode)['image']
+
+
+def memmap_line_prefix(fname, name='IMAGE'):
+    """Return the LINE_PREFIX_BYTES of each line as (lines, bytes) uint8 memory map."""
+    return _records(image_layout(fname, name), 'r')['prefix']
+
+
+def memmap_line_suffix(fname, name='IMAGE'):
+    """Return the LINE_SUFFIX_BYTES of each line as (lines, bytes) uint8 memory map."""
+    return _records(image_layout(fname, name), 'r')['suffix']
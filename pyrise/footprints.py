@@ -0,0 +1,253 @@
+"""Spatial index of the RDR product footprints.
+
+Each footprint (the 4 corner coordinates of the RDR index) is reduced to a latitude /
+longitude bounding box. Boxes crossing the 0/360 meridian are split in two, footprints
+enclosing a pole get a box reaching the pole and covering all longitudes. The boxes are
+registered in a regular lat/lon grid, so a query only has to look at the boxes of the
+grid cells it touches. `footprint_polygons` turns the corners into outlines for maps.
+
+Longitudes are planetocentric east, 0 to 360, like in the RDR index.
+"""
+import numpy as np
+
+from .downloads import hirise_dropbox
+from .indexfiles import StoredIndex, get_stored_index
+
+CORNER_LATITUDES = ['CORNER{}_LATITUDE'.format(i) for i in range(1, 5)]
+CORNER_LONGITUDES = ['CORNER{}_LONGITUDE'.format(i) for i in range(1, 5)]
+COLUMNS = ['PRODUCT_ID'] + CORNER_LATITUDES + CORNER_LONGITUDES
+
+
+def _longitude_gaps(lons):
+    """Return sorted corner longitudes (0 to 360), the gaps between them and the largest.
+
+    A footprint covers the arc of longitudes opposite to its largest gap, without a gap of
+    half a circle its corners surround a pole.
+    """
+    lons = np.sort(np.mod(np.asarray(lons, dtype=np.float64), 360), axis=1)
+    gaps = np.diff(np.concatenate([lons, lons[:, :1] + 360], axis=1), axis=1)
+    return lons, gaps, gaps.argmax(axis=1)
+
+
+def footprint_boxes(lats, lons):
+    """Turn footprint corners into lat/lon bounding boxes.
+
+    Parameters
+    ----------
+    lats, lons : numpy.ndarray
+        Arrays of shape (n, corners) with the corner coordinates of n footprints.
+
+    Returns
+    -------
+    rows : numpy.ndarray
+        Footprint number of each box, footprints crossing the 0/360 meridian have two.
+    boxes : numpy.ndarray
+        (m, 4) array of lat_min, lat_max, lon_min, lon_max with 0 <= lon < 360.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons, gaps, largest = _longitude_gaps(lons)
+    lat_min = lats.min(axis=1)
+    lat_max = lats.max(axis=1)
+    index = np.arange(len(lons))
+    west = lons[index, (largest + 1) % lons.shape[1]]
+    east = lons[index, largest]
+    polar = gaps[index, largest] < 180
+    north = lats.mean(axis=1) > 0
+    lat_max = np.where(polar & north, 90, lat_max)
+    lat_min = np.where(polar & ~north, -90, lat_min)
+    west = np.where(polar, 0, west)
+    east = np.where(polar, 360, east)
+    wraps = ~polar & (east < west)
+
+    rows = np.concatenate([index, index[wraps]])
+    boxes = np.empty((len(rows), 4))
+    boxes[:, 0] = np.concatenate([lat_min, lat_min[wraps]])
+    boxes[:, 1] = np.concatenate([lat_max, lat_max[wraps]])
+    boxes[:, 2] = np.concatenate([west, np.zeros(wraps.sum())])
+    boxes[:, 3] = np.concatenate([np.where(wraps, 360, east), east[wraps]])
+    return rows, boxes
+
+
+def _clip(vertices, x, keep_west):
+    """Cut a polygon at the meridian `x`, keeping the part west (or east) of it."""
+    inside = vertices[:, 0] <= x if keep_west else vertices[:, 0] >= x
+    clipped = []
+    for i in range(len(vertices)):
+        j = (i + 1) % len(vertices)
+        if inside[i]:
+            clipped.append(vertices[i])
+        if inside[i] != inside[j]:
+            t = (x - vertices[i, 0]) / (vertices[j, 0] - vertices[i, 0])
+            clipped.append(vertices[i] + t * (vertices[j] - vertices[i]))
+    return np.array(clipped)
+
+
+def footprint_polygons(lats, lons, lon_min=0):
+    """Turn footprint corners into outlines for plotting on a lon/lat map.
+
+    The map shows longitudes from `lon_min` to `lon_min + 360`. Outlines crossing its edge
+    are cut there into two pieces, one at each side of the map. Footprints around a pole
+    become a band from their corners to the pole across all longitudes.
+
+    Parameters
+    ----------
+    lats, lons : numpy.ndarray
+        Arrays of shape (n, corners) with the corner coordinates of n footprints.
+    lon_min : float, optional
+        Western edge of the map, e.g. -180 for maps centered on 0. Default: 0
+
+    Returns
+    -------
+    rows : numpy.ndarray
+        Footprint number of each polygon, footprints cut at the map edge have two.
+    polygons : list of numpy.ndarray
+        (vertices, 2) arrays of lon, lat.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    lon_max = lon_min + 360
+    _, gaps, largest = _longitude_gaps(lons)
+    polar = gaps[np.arange(len(lons)), largest] < 180
+    # continuous longitudes around the first corner, which lies on the map
+    first = np.mod(lons[:, :1] - lon_min, 360) + lon_min
+    lons = first + np.mod(lons - first + 180, 360) - 180
+    crosses = ~polar & ((lons.max(axis=1) > lon_max) | (lons.min(axis=1) < lon_min))
+    simple = ~polar & ~crosses
+
+    rows = [np.flatnonzero(simple)]
+    polygons = list(np.stack([lons[simple], lats[simple]], axis=-1))
+    for row in np.flatnonzero(crosses):
+        vertices = np.stack([lons[row], lats[row]], axis=-1)
+        edge, shift = (lon_max, -360) if vertices[:, 0].max() > lon_max else (lon_min, 360)
+        inside = _clip(vertices, edge, keep_west=shift < 0)
+        outside = _clip(vertices, edge, keep_west=shift > 0) + [shift, 0]
+        polygons.extend([inside, outside])
+        rows.append([row, row])
+    for row in np.flatnonzero(polar):
+        pole = 90 if lats[row].mean() > 0 else -90
+        edge = lats[row].min() if pole > 0 else lats[row].max()
+        polygons.append(np.array([[lon_min, edge], [lon_max, edge], [lon_max, pole],
+                                  [lon_min, pole]]))
+        rows.append([row])
+    return np.concatenate(rows).astype(np.intp), polygons
+
+
+def _query_boxes(lat_min, lat_max, lon_min, lon_max):
+    """Split a query box at the 0/360 meridian, `lon_min > lon_max` means it crosses it."""
+    if lon_max - lon_min >= 360:
+        return [(lat_min, lat_max, 0, 360)]
+    lon_min, lon_max = lon_min % 360, lon_max % 360
+    if lon_min <= lon_max:
+        return [(lat_min, lat_max, lon_min, lon_max)]
+    if lon_max == 0:
+        return [(lat_min, lat_max, lon_min, 360)]
+    return [(lat_min, lat_max, lon_min, 360), (lat_min, lat_max, 0, lon_max)]
+
+
+class FootprintIndex(StoredIndex):
+    """Grid index over RDR product footprints.
+
+    Parameters
+    ----------
+    product_ids : array-like of str
+        PRODUCT_ID of every footprint.
+    lats, lons : numpy.ndarray
+        (n, 4) arrays with the corner coordinates of each footprint.
+    cell_size : float, optional
+        Grid cell size in degrees. Default: 1
+    state : dict, optional
+        `indexfiles.rdr_index_state` of the data the index was built from, stored with it.
+    """
+
+    arrays = ('product_ids', 'rows', 'boxes', 'cell_size', 'cell_boxes', 'cell_start')
+
+    def __init__(self, product_ids, lats, lons, cell_size=1.0, state=None):
+        self.product_ids = np.asarray(product_ids, dtype=str)
+        self.state = state
+        self.rows, self.boxes = footprint_boxes(lats, lons)
+        self.cell_size = cell_size
+        self._build_grid()
+
+    @staticmethod
+    def columns_of(df):
+        """Return PRODUCT_IDs and corner coordinates of a frame with the `COLUMNS`."""
+        return (df['PRODUCT_ID'].to_numpy(dtype=str), df[CORNER_LATITUDES].to_numpy(),
+                df[CORNER_LONGITUDES].to_numpy())
+
+    def extend(self, product_ids, lats, lons, state=None):
+        """Add more footprints, numbered after the existing ones."""
+        rows, boxes = footprint_boxes(lats, lons)
+        self.rows = np.concatenate([self.rows, rows + len(self.product_ids)])
+        self.boxes = np.concatenate([self.boxes, boxes])
+        self.product_ids = np.concatenate([self.product_ids, np.asarray(product_ids, dtype=str)])
+        self.state = state
+        self._build_grid()
+
+    @property
+    def shape(self):
+        """Number of grid cells in latitude and longitude."""
+        return int(np.ceil(180 / self.cell_size)), int(np.ceil(360 / self.cell_size))
+
+    def _cells(self, lat_min, lat_max, lon_min, lon_max):
+        """Return first and last grid row and column touched by the given boxes."""
+        nrows, ncols = self.shape
+        r0 = np.clip(np.floor((lat_min + 90) / self.cell_size), 0, nrows - 1).astype(int)
+        r1 = np.clip(np.floor((lat_max + 90) / self.cell_size), 0, nrows - 1).astype(int)
+        c0 = np.clip(np.floor(lon_min / self.cell_size), 0, ncols - 1).astype(int)
+        c1 = np.clip(np.floor(lon_max / self.cell_size), 0, ncols - 1).astype(int)
+        return r0, r1, c0, c1
+
+    def _build_grid(self):
+        """Sort the box numbers by grid cell (CSR layout: `cell_start`, `cell_boxes`)."""
+        nrows, ncols = self.shape
+        r0, r1, c0, c1 = self._cells(*self.boxes.T)
+        width = c1 - c0 + 1
+        counts = (r1 - r0 + 1) * width
+        box = np.repeat(np.arange(len(self.boxes)), counts)
+        # position of each entry within the cells of its box
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (r0[box] + k // width[box]) * ncols + c0[box] + k % width[box]
+        order = np.argsort(cells, kind='stable')
+        self.cell_boxes = box[order]
+        self.cell_start = np.concatenate(
+            [[0], np.cumsum(np.bincount(cells, minlength=nrows * ncols))])
+
+    def _candidates(self, lat_min, lat_max, lon_min, lon_max):
+        nrows, ncols = self.shape
+        r0, r1, c0, c1 = self._cells(lat_min, lat_max, lon_min, lon_max)
+        cells = (np.arange(r0, r1 + 1)[:, None] * ncols + np.arange(c0, c1 + 1)).ravel()
+        starts = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - starts
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.cell_boxes[np.repeat(starts, counts) + k]
+
+    def query_rows(self, lat_min, lat_max, lon_min, lon_max):
+        """Return sorted footprint numbers overlapping the given box.
+
+        `lon_min` larger than `lon_max` selects a box crossing the 0/360 meridian.
+        """
+        found = []
+        for query in _query_boxes(lat_min, lat_max, lon_min, lon_max):
+            candidates = np.unique(self._candidates(*query))
+            boxes = self.boxes[candidates]
+            hit = ((boxes[:, 0] <= query[1]) & (boxes[:, 1] >= query[0]) &
+                   (boxes[:, 2] <= query[3]) & (boxes[:, 3] >= query[2]))
+            found.append(self.rows[candidates[hit]])
+        return np.unique(np.concatenate(found))
+
+    def query_box(self, lat_min, lat_max, lon_min, lon_max):
+        """Return the PRODUCT_IDs whose footprints overlap the given box."""
+        return self.product_ids[self.query_rows(lat_min, lat_max, lon_min, lon_max)]
+
+    def query_point(self, lat, lon):
+        """Return the PRODUCT_IDs whose footprints contain the given point."""
+        return self.query_box(lat, lat, lon, lon)
+
+
+def footprint_index_path():
+    return hirise_dropbox() / 'RDRCUMINDEX.footprints.npz'
+
+
+def get_footprint_index(rebuild=False):
+    """Return the footprint index of the RDR index, see `indexfiles.get_stored_index`."""
+    return get_stored_index(FootprintIndex, footprint_index_path(), COLUMNS, rebuild)
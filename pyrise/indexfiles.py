@@ -1,28 +1,591 @@
+"""Access to the HiRISE RDR cumulative index, RDRCUMINDEX.TAB.
+
+The fixed-width table is parsed with the column layout of its label. With `pyarrow`
+installed, it is converted once into a parquet cache next to it, which is extended when
+records are appended to the table and which `query_rdr_index` filters without loading
+all rows. `get_shared_rdr_index` keeps one copy per process, `StoredIndex` is the base of
+the footprint and orbit indexes built from it.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import pvl
 
 from .downloads import hirise_dropbox
+from .products import product_id
 
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    PYARROW_INSTALLED = False
+else:
+    PYARROW_INSTALLED = True
 
-def get_rdr_index_names():
+logger = logging.getLogger(__name__)
+
+# rows per parquet row group, the granularity at which reads can skip data
+ROW_GROUP_SIZE = 10000
+
+# degrees from a pole within which footprints with a longitude range over 180 degrees are
+# taken to enclose the pole, HiRISE footprints are shorter than that
+POLE_MARGIN = 1.0
+
+
+RDRColumn = namedtuple('RDRColumn', 'name data_type start_byte bytes')
+
+# text columns with few distinct values, loaded as pandas categoricals
+CATEGORICAL_COLUMNS = ['VOLUME_ID', 'INSTRUMENT_HOST_ID', 'INSTRUMENT_ID',
+                       'PRODUCT_VERSION_ID', 'TARGET_NAME', 'MISSION_PHASE_NAME',
+                       'MAP_PROJECTION_TYPE', 'STEREO_FLAG']
+
+
+def get_rdr_index_table():
+    """Return the RDR_INDEX_TABLE object of RDRCUMINDEX.LBL."""
     lblfile = hirise_dropbox() / 'RDRCUMINDEX.LBL'
     label = pvl.load(str(lblfile))
-    table = label['RDR_INDEX_TABLE']
-    names = []
+    return label['RDR_INDEX_TABLE']
+
+
+def get_rdr_index_columns(table=None):
+    """Return the column specifications of the RDR index.
+
+    Parameters
+    ----------
+    table : pvl.PVLObject, optional
+        Already loaded result of `get_rdr_index_table`.
+
+    Returns
+    -------
+    list of RDRColumn
+        Named tuples with `name`, `data_type`, `start_byte` (1-based, as in the label)
+        and `bytes`.
+    """
+    if table is None:
+        table = get_rdr_index_table()
+    columns = []
     for item in table:
         second = item[1]
         if isinstance(second, pvl.PVLObject):
-            names.append(second['NAME'])
-    return names
+            columns.append(RDRColumn(second['NAME'], second['DATA_TYPE'],
+                                     second['START_BYTE'], second['BYTES']))
+    return columns
 
 
-def get_rdr_index():
-    names = get_rdr_index_names()
+def get_rdr_index_names():
+    return [column.name for column in get_rdr_index_columns()]
+
+
+def _convert_field(field, column):
+    """Convert the fixed-width byte strings `field` to the dtype fitting `column`."""
+    if column.data_type == 'ASCII_INTEGER':
+        return field.astype(np.int32 if column.bytes < 10 else np.int64)
+    if column.data_type == 'ASCII_REAL':
+        return field.astype(np.float64)
+    field = np.char.strip(field)
+    if column.data_type == 'TIME':
+        try:
+            return field.astype('datetime64[ms]')
+        except ValueError:
+            # blanks or non-ISO values, let pandas turn them into NaT
+            return pd.to_datetime(field.astype(str), format='ISO8601', errors='coerce')
+    if column.name in CATEGORICAL_COLUMNS:
+        # decode only the few distinct values instead of every row
+        values = pd.Categorical(field)
+        return values.rename_categories([c.decode('ascii') for c in values.categories])
+    return field.astype(str).astype(object)
+
+
+def parse_rdr_index(columns=None, start_row=0):
+    """Parse RDRCUMINDEX.TAB with the column layout and data types from its label.
+
+    The table is memory-mapped and every requested column is cut out of the fixed-width
+    records and converted with its exact dtype, so no type inference is needed.
+
+    Parameters
+    ----------
+    columns : list of str, optional
+        Only parse these columns. Default: all.
+    start_row : int, optional
+        Skip the rows before this one, e.g. to only read rows appended since a previous
+        parse. The index of the returned frame starts at `start_row`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Text is stripped of its padding, `CATEGORICAL_COLUMNS` are categoricals and
+        TIME columns are datetimes.
+    """
+    table = get_rdr_index_table()
+    specs = get_rdr_index_columns(table)
+    if columns is not None:
+        lookup = {spec.name: spec for spec in specs}
+        specs = [lookup[name] for name in columns]
+    row_bytes = table['ROW_BYTES']
     indexfile = hirise_dropbox() / 'RDRCUMINDEX.TAB'
-    df = pd.read_csv(indexfile, names=names)
-    return df
+    nrows = max(indexfile.stat().st_size // row_bytes - start_row, 0)
+    if nrows:
+        records = np.memmap(str(indexfile), dtype=np.uint8, mode='r',
+                            offset=start_row * row_bytes, shape=(nrows, row_bytes))
+    else:
+        records = np.empty((0, row_bytes), dtype=np.uint8)
+    data = {}
+    for spec in specs:
+        start = spec.start_byte - 1
+        field = np.ascontiguousarray(records[:, start:start + spec.bytes])
+        data[spec.name] = _convert_field(field.view('S{}'.format(spec.bytes)).ravel(), spec)
+    return pd.DataFrame(data, columns=[spec.name for spec in specs],
+                        index=pd.RangeIndex(start_row, start_row + nrows))
+
+
+def rdr_index_cache_path():
+    """Folder of the columnar (parquet) cache of the RDR cumulative index."""
+    return hirise_dropbox() / 'RDRCUMINDEX.parquet'
+
+
+def _cache_meta_path(cachepath):
+    # leading underscore makes pyarrow ignore this file when reading the folder
+    return cachepath / '_pyrise_cache.json'
+
+
+def _tab_fingerprint():
+    stat = (hirise_dropbox() / 'RDRCUMINDEX.TAB').stat()
+    return dict(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+def _record_hash(row, row_bytes):
+    with open(str(hirise_dropbox() / 'RDRCUMINDEX.TAB'), 'rb') as f:
+        f.seek(row * row_bytes)
+        return hashlib.sha1(f.read(row_bytes)).hexdigest()
+
+
+def rdr_index_state(row_bytes=None):
+    """Describe the current RDRCUMINDEX.TAB for later incremental updates.
+
+    Returns
+    -------
+    dict
+        `source` (mtime and size of the TAB file), `row_bytes`, `rows` and `tail`, a hash
+        of the last record.
+    """
+    if row_bytes is None:
+        row_bytes = get_rdr_index_table()['ROW_BYTES']
+    source = _tab_fingerprint()
+    rows = source['size'] // row_bytes
+    tail = _record_hash(rows - 1, row_bytes) if rows else None
+    return dict(source=source, row_bytes=row_bytes, rows=rows, tail=tail)
+
+
+def appended_rows(state):
+    """Check if RDRCUMINDEX.TAB only grew by appended records since `state`.
+
+    Parameters
+    ----------
+    state : dict
+        Result of an earlier `rdr_index_state`.
+
+    Returns
+    -------
+    int or None
+        First row that is new since `state` (equal to the number of rows in the TAB file if
+        there's none) or None if the file changed otherwise and needs a full parse.
+    """
+    size = _tab_fingerprint()['size']
+    row_bytes, rows = state['row_bytes'], state['rows']
+    if size % row_bytes or size < rows * row_bytes:
+        return None
+    if rows and _record_hash(rows - 1, row_bytes) != state['tail']:
+        return None
+    return rows
+
+
+class StoredIndex(object):
+    """Base of the indexes derived from the RDR index and stored next to it as npz file.
+
+    Subclasses list the attributes to store in `arrays` and implement `columns_of`,
+    which turns a frame of RDR index columns into the arguments of `__init__` and
+    `extend`. Both take the `state` of the data as keyword. See `get_stored_index`.
+    """
+
+    arrays = ()
+
+    @staticmethod
+    def columns_of(df):
+        """Return the constructor arguments for the rows of `df`."""
+        raise NotImplementedError
+
+    @classmethod
+    def from_dataframe(cls, df, **kwargs):
+        """Create the index from a frame with the RDR index columns it needs."""
+        return cls(*cls.columns_of(df), **kwargs)
+
+    def save(self, path):
+        """Store the index as uncompressed npz file."""
+        arrays = {name: getattr(self, name) for name in self.arrays}
+        np.savez(str(path), state=json.dumps(self.state), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index stored with `save`."""
+        with np.load(str(path)) as data:
+            index = cls.__new__(cls)
+            for name in cls.arrays:
+                value = data[name]
+                setattr(index, name, value[()] if value.ndim == 0 else value)
+            index.state = json.loads(str(data['state']))
+        return index
+
+
+def get_stored_index(cls, path, columns, rebuild=False):
+    """Return the `StoredIndex` subclass `cls` stored at `path`, building it if outdated.
+
+    When records were appended to RDRCUMINDEX.TAB since the index was stored, only those
+    are parsed and added to it, other changes rebuild it from the `columns` of the shared
+    RDR index.
+    """
+    path = Path(path)
+    if not rebuild and path.exists():
+        index = cls.load(path)
+        if index.state['source'] == _tab_fingerprint():
+            return index
+        start = appended_rows(index.state)
+        if start is not None:
+            state = rdr_index_state(index.state['row_bytes'])
+            df = parse_rdr_index(columns, start_row=start)
+            logger.info("Adding %i rows to %s", len(df), path)
+            index.extend(*cls.columns_of(df), state=state)
+            index.save(path)
+            return index
+    logger.info("Building %s", path)
+    state = rdr_index_state()
+    index = cls.from_dataframe(get_shared_rdr_index(columns), state=state)
+    index.save(path)
+    return index
+
+
+def read_cache_meta():
+    """Return the bookkeeping data of the RDR index cache or None if there's no cache."""
+    try:
+        with open(str(_cache_meta_path(rdr_index_cache_path()))) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache_meta(cachepath, meta):
+    tmppath = cachepath / '_pyrise_cache.json.tmp'
+    with open(str(tmppath), 'w') as f:
+        json.dump(meta, f)
+    os.replace(str(tmppath), str(_cache_meta_path(cachepath)))
+
+
+def _part_name(start_row):
+    return 'part-{:09d}.parquet'.format(start_row)
+
+
+def _write_part(df, path):
+    df.to_parquet(str(path), index=False, row_group_size=ROW_GROUP_SIZE)
+
+
+def rdr_index_cache_is_current():
+    """Check if the cache was built from the RDRCUMINDEX.TAB that is there now."""
+    meta = read_cache_meta()
+    return meta is not None and meta['source'] == _tab_fingerprint()
+
+
+def convert_rdr_index(force=False):
+    """Convert RDRCUMINDEX.TAB into a parquet cache for fast loading.
+
+    The cache is keyed on modification time and size of the TAB file and is only rebuilt
+    if those changed, or if `force` is set. See `update_rdr_index` to only add new rows.
+
+    Returns
+    -------
+    pathlib.Path
+        Folder of the cache.
+    """
+    if not PYARROW_INSTALLED:
+        raise ImportError("Caching the RDR index requires `pyarrow`.")
+    cachepath = rdr_index_cache_path()
+    if not force and rdr_index_cache_is_current():
+        return cachepath
+    logger.info("Converting RDR index to %s", cachepath)
+    table = get_rdr_index_table()
+    state = rdr_index_state(table['ROW_BYTES'])
+    df = parse_rdr_index()
+    # build the new cache next to the old one and swap it in when complete
+    tmpdir = Path(tempfile.mkdtemp(prefix='.RDRCUMINDEX.', dir=str(cachepath.parent)))
+    _write_part(df, tmpdir / _part_name(0))
+    _write_cache_meta(tmpdir, dict(state, parts=[_part_name(0)]))
+    if cachepath.exists():
+        shutil.rmtree(str(cachepath))
+    os.rename(str(tmpdir), str(cachepath))
+    return cachepath
+
+
+def update_rdr_index():
+    """Bring the parquet cache up to date with RDRCUMINDEX.TAB.
+
+    If records were only appended to the TAB file since the cache was written, just those
+    are parsed and stored as an additional part of the cache. Otherwise the cache is rebuilt
+    with `convert_rdr_index`.
+
+    Returns
+    -------
+    pathlib.Path
+        Folder of the cache.
+    """
+    if not PYARROW_INSTALLED:
+        raise ImportError("Caching the RDR index requires `pyarrow`.")
+    cachepath = rdr_index_cache_path()
+    meta = read_cache_meta()
+    if meta is None or 'parts' not in meta:
+        return convert_rdr_index(force=True)
+    if meta['source'] == _tab_fingerprint():
+        return cachepath
+    # parts written by an interrupted update are not part of the cache
+    for path in cachepath.glob('part-*.parquet'):
+        if path.name not in meta['parts']:
+            path.unlink()
+    start = appended_rows(meta)
+    if start is None:
+        return convert_rdr_index(force=True)
+    state = rdr_index_state(meta['row_bytes'])
+    if state['rows'] > start:
+        logger.info("Adding %i new rows to %s", state['rows'] - start, cachepath)
+        df = parse_rdr_index(start_row=start)
+        _write_part(df, cachepath / _part_name(start))
+        meta['parts'].append(_part_name(start))
+    _write_cache_meta(cachepath, dict(state, parts=meta['parts']))
+    return cachepath
+
+
+def get_rdr_index(columns=None, use_cache=True):
+    """Load the RDR cumulative index.
+
+    With `pyarrow` installed the index is read from a parquet cache, which is brought up
+    to date with `update_rdr_index` when RDRCUMINDEX.TAB changed.
+
+    Parameters
+    ----------
+    columns : list of str, optional
+        Only load these columns. Default: all.
+    use_cache : bool, optional
+        Switch to parse the TAB file directly. Default: True
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if not (use_cache and PYARROW_INSTALLED):
+        return parse_rdr_index(columns)
+    cachepath = update_rdr_index()
+    return pd.read_parquet(str(cachepath), columns=columns, memory_map=True)
+
+
+def _between(column, bounds):
+    """Filter for `bounds[0] <= column <= bounds[1]`."""
+    low, high = bounds
+    return (ds.field(column) >= low) & (ds.field(column) <= high)
+
+
+def _longitude_filter(lon_min, lon_max):
+    """Filter for footprints overlapping the longitudes from `lon_min` to `lon_max`.
+
+    Footprints crossing the 0/360 meridian have a longitude range wider than half a
+    circle in the index, they cover the longitudes outside of it. Footprints around a pole
+    have such a range too, but cover all longitudes. Like in `footprints.footprint_boxes`,
+    a wide range reaching within `POLE_MARGIN` degrees of a pole is taken as one of those.
+    """
+    low, high = ds.field('MINIMUM_LONGITUDE'), ds.field('MAXIMUM_LONGITUDE')
+    wraps = (high - low) > 180
+    polar = wraps & ((ds.field('MAXIMUM_LATITUDE') >= 90 - POLE_MARGIN) |
+                     (ds.field('MINIMUM_LATITUDE') <= POLE_MARGIN - 90))
+    return (polar | (~wraps & (high >= lon_min) & (low <= lon_max)) |
+            (wraps & ((low >= lon_min) | (high <= lon_max))))
+
+
+def rdr_index_filter(obsids=None, orbits=None, ls=None, lat=None, lon=None, kind=None):
+    """Build the `pyarrow.dataset` filter for `query_rdr_index`, None if nothing to filter.
+
+    See `query_rdr_index` for the parameters.
+    """
+    filters = []
+    if obsids is not None:
+        obsids = [obsids] if isinstance(obsids, str) else [str(o) for o in obsids]
+        filters.append(ds.field('OBSERVATION_ID').isin(obsids))
+    if orbits is not None:
+        filters.append(_between('ORBIT_NUMBER', orbits))
+    if ls is not None:
+        ls_min, ls_max = ls
+        if ls_min <= ls_max:
+            filters.append(_between('SOLAR_LONGITUDE', ls))
+        else:
+            # e.g. (300, 30), across the start of the Mars year
+            filters.append((ds.field('SOLAR_LONGITUDE') >= ls_min) |
+                           (ds.field('SOLAR_LONGITUDE') <= ls_max))
+    if lat is not None:
+        filters.append((ds.field('MAXIMUM_LATITUDE') >= lat[0]) &
+                       (ds.field('MINIMUM_LATITUDE') <= lat[1]))
+    if lon is not None:
+        lon_min, lon_max = lon
+        if lon_max - lon_min < 360:
+            lon_min, lon_max = lon_min % 360, lon_max % 360
+            if lon_min <= lon_max:
+                filters.append(_longitude_filter(lon_min, lon_max))
+            else:
+                filters.append(_longitude_filter(lon_min, 360) |
+                               _longitude_filter(0, lon_max))
+    if kind is not None:
+        kinds = [kind] if isinstance(kind, str) else list(kind)
+        match = None
+        for k in kinds:
+            ends = pc.ends_with(ds.field('PRODUCT_ID'), pattern='_' + k.upper())
+            match = ends if match is None else match | ends
+        filters.append(match)
+    result = None
+    for f in filters:
+        result = f if result is None else result & f
+    return result
+
+
+def rdr_index_dataset():
+    """Return the parquet cache of the RDR index, updated if needed, as `pyarrow` dataset."""
+    if not PYARROW_INSTALLED:
+        raise ImportError("Querying the RDR index requires `pyarrow`.")
+    cachepath = update_rdr_index()
+    parts = read_cache_meta()['parts']
+    return ds.dataset([str(cachepath / part) for part in parts], format='parquet')
+
+
+def query_rdr_index(obsids=None, orbits=None, ls=None, lat=None, lon=None, kind=None,
+                    columns=None, as_ids=False):
+    """Select products from the RDR index, reading only what the selection needs.
+
+    The conditions are evaluated by `pyarrow` on the parquet cache: row groups whose
+    column statistics exclude a match are skipped, and only the requested columns and
+    those needed for the conditions are read. All given conditions have to match.
+
+    Parameters
+    ----------
+    obsids : str or list of str, optional
+        Observation ids like 'PSP_003092_0985'.
+    orbits : (int, int), optional
+        First and last orbit number.
+    ls : (float, float), optional
+        Solar longitude range in degrees, (300, 30) wraps around the start of the year.
+    lat : (float, float), optional
+        Latitude range overlapping the footprint, e.g. (-90, -80) for south of -80.
+    lon : (float, float), optional
+        Longitude range (east, 0 to 360) overlapping the footprint, `lon[0] > lon[1]`
+        crosses the 0/360 meridian. Uses the minimum and maximum longitude of each
+        footprint, footprints around a pole match all longitudes.
+        `footprints.FootprintIndex` checks the footprint corners.
+    kind : str or list of str, optional
+        Product kinds like 'RED' or 'COLOR'.
+    columns : list of str, optional
+        Columns of the result. Default: all
+    as_ids : bool, optional
+        Return `PRODUCT_ID` objects instead of a DataFrame. Default: False
+
+    Returns
+    -------
+    pandas.DataFrame or list of PRODUCT_ID
+    """
+    dataset = rdr_index_dataset()
+    if as_ids:
+        columns = ['PRODUCT_ID']
+    table = dataset.to_table(columns=columns,
+                             filter=rdr_index_filter(obsids, orbits, ls, lat, lon, kind))
+    if as_ids:
+        return [product_id(pid) for pid in table.column('PRODUCT_ID').to_pylist()]
+    return table.to_pandas()
+
+
+class SharedRDRIndex(object):
+    """RDR index loaded once per process and shared by all users.
+
+    Columns are loaded on first request, only those not loaded yet, and kept for later
+    requests. When RDRCUMINDEX.TAB changed, the loaded columns are dropped and loaded again.
+
+    A request for the loaded columns, in their order, gets a shallow copy of the shared
+    frame, which holds no copy of the data. With pandas copy-on-write (the default from
+    pandas 3.0) this is true for every request and changing the frames handed out does not
+    change the shared index. With older pandas, frames of other columns are copies and the
+    values of the shallow copies must not be changed.
+    """
+
+    def __init__(self):
+        self._df = None
+        self._source = None
+        # all column names from the label, read once per source
+        self._names = None
+        self._lock = threading.Lock()
+
+    def _current_source(self):
+        return str(hirise_dropbox()), _tab_fingerprint()
+
+    def get(self, columns=None):
+        """Return the index with `columns` (default: all), loading missing ones.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        with self._lock:
+            source = self._current_source()
+            if source != self._source:
+                self._df, self._source, self._names = None, source, None
+            if columns is None:
+                if self._names is None:
+                    self._names = get_rdr_index_names()
+                columns = self._names
+            loaded = [] if self._df is None else list(self._df.columns)
+            missing = [name for name in columns if name not in loaded]
+            if missing:
+                logger.info("Loading RDR index columns %s", missing)
+                df = get_rdr_index(columns=missing)
+                self._df = df if self._df is None else pd.concat([self._df, df], axis=1)
+            if list(columns) == list(self._df.columns):
+                return self._df.copy(deep=False)
+            return self._df[list(columns)]
+
+    def preload(self, columns=None):
+        """Load `columns` (default: all) now, e.g. when a service starts."""
+        self.get(columns)
+
+    def clear(self):
+        """Drop the loaded data."""
+        with self._lock:
+            self._df, self._source, self._names = None, None, None
+
+    @property
+    def columns(self):
+        """Names of the loaded columns."""
+        return [] if self._df is None else list(self._df.columns)
+
+
+shared_rdr_index = SharedRDRIndex()
+
+
+def get_shared_rdr_index(columns=None):
+    """Return `columns` of the process-wide RDR index, see `SharedRDRIndex`."""
+    return shared_rdr_index.get(columns)
+
+
+def preload_rdr_index(columns=None):
+    """Load `columns` (default: all) of the process-wide RDR index ahead of use."""
+    shared_rdr_index.preload(columns)
 
 
 class PolyPlotter(object):
@@ -41,13 +604,59 @@ class PolyPlotter(object):
                    'CORNER1_LONGITUDE']
 
     def __init__(self):
-        self.df = get_rdr_index()
-        self.df.set_index('PRODUCT_ID', inplace=True)
-
-        print("Loaded RDR index file.")
+        # the shared index, only the columns needed for plotting
+        columns = ['PRODUCT_ID'] + self.lat_indices[:4] + self.lon_indices[:4]
+        self.df = get_shared_rdr_index(columns).set_index('PRODUCT_ID')
 
     def plot_prodid(self, product_id, ax=None, **kwargs):
         if ax is None:
             _, ax = plt.subplots()
         ax.plot(self.df.loc[product_id][self.lon_indices],
                 self.df.loc[product_id][self.lat_indices], **kwargs)
+
+    def plot_prodids(self, product_ids=None, ax=None, fill=False, rasterized=False,
+                     lon_min=0, **kwargs):
+        """Plot the outlines of many products at once as one `PolyCollection`.
+
+        Parameters
+        ----------
+        product_ids : list of str, optional
+            Products to plot, unknown ones are skipped. Default: all in the index
+        ax : matplotlib.axes.Axes, optional
+            Axes to plot into. Default: a new figure
+        fill : bool, optional
+            Fill the footprints instead of drawing their outlines. Default: False
+        rasterized : bool, optional
+            Draw the collection as image in vector output, keeping large plots small.
+            Default: False
+        lon_min : float, optional
+            Western edge of the map, see `footprints.footprint_polygons`. Default: 0
+        **kwargs
+            Passed on to `matplotlib.collections.PolyCollection`.
+
+        Returns
+        -------
+        matplotlib.collections.PolyCollection
+        """
+        from matplotlib.collections import PolyCollection
+
+        from .footprints import footprint_polygons
+
+        corners = self.df[self.lat_indices[:4] + self.lon_indices[:4]]
+        if product_ids is not None:
+            corners = corners.reindex(product_ids)
+            missing = corners.isna().any(axis=1)
+            if missing.any():
+                logger.warning("Skipping %i products not in the RDR index.", missing.sum())
+                corners = corners[~missing.to_numpy()]
+        values = corners.to_numpy(dtype=np.float64)
+        _, polygons = footprint_polygons(values[:, :4], values[:, 4:], lon_min=lon_min)
+        if ax is None:
+            _, ax = plt.subplots()
+        if not fill:
+            kwargs.setdefault('edgecolors', kwargs.pop('color', 'C0'))
+            kwargs['facecolors'] = 'none'
+        collection = PolyCollection(polygons, rasterized=rasterized, **kwargs)
+        ax.add_collection(collection)
+        ax.autoscale_view()
+        return collection
@@ -0,0 +1,142 @@
+"""Persistent cache of values read from label files.
+
+Values are stored in an SQLite database per label path together with the modification
+time and size of the file. A changed file is read again, an unchanged one never. The
+least recently used entries are dropped when the cache grows beyond `max_entries`.
+
+The default database is in the local cache folder `~/.cache/pyrise`, not next to the
+labels, so no file synchronisation (e.g. of the Dropbox data folder) works on it while
+it is written. The environment variable PYRISE_LABEL_CACHE points it elsewhere.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# environment variable with the path of the default database
+LABEL_CACHE_ENV = 'PYRISE_LABEL_CACHE'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    data BLOB NOT NULL
+)
+"""
+
+
+class LabelCache(object):
+    """SQLite store of label values keyed by path, modification time and size.
+
+    Each entry holds a dict of key path to value and the set of key paths known to be
+    missing in the label.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Database file, created if needed.
+    max_entries : int, optional
+        Number of labels kept. When exceeded, the least recently used tenth is dropped.
+        Default: 200000
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(_SCHEMA)
+        self._db.execute('CREATE INDEX IF NOT EXISTS labels_last_used ON labels(last_used)')
+        self._db.commit()
+
+    @staticmethod
+    def _key(fname):
+        fname = Path(fname).resolve()
+        stat = fname.stat()
+        return str(fname), stat.st_mtime_ns, stat.st_size
+
+    def get(self, fname):
+        """Return (values, missing) stored for `fname`, or None if unknown or outdated."""
+        path, mtime_ns, size = self._key(fname)
+        with self._lock:
+            row = self._db.execute('SELECT mtime_ns, size, data FROM labels WHERE path = ?',
+                                   (path,)).fetchone()
+            if row is None or row[:2] != (mtime_ns, size):
+                self.misses += 1
+                if row is not None:
+                    self._db.execute('DELETE FROM labels WHERE path = ?', (path,))
+                    self._db.commit()
+                return None
+            self.hits += 1
+            self._db.execute('UPDATE labels SET last_used = ? WHERE path = ?',
+                             (time.time(), path))
+            self._db.commit()
+        return pickle.loads(row[2])
+
+    def put(self, fname, values, missing=()):
+        """Store the `values` dict and the `missing` key paths read from `fname`."""
+        path, mtime_ns, size = self._key(fname)
+        data = pickle.dumps((dict(values), set(missing)), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?, ?)',
+                             (path, mtime_ns, size, time.time(), data))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        count = self._db.execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # drop a batch at once, so not every further insert has to evict
+        drop = count - int(self.max_entries * 0.9)
+        logger.debug("Evicting %i labels from %s", drop, self.path)
+        self._db.execute('DELETE FROM labels WHERE path IN '
+                         '(SELECT path FROM labels ORDER BY last_used LIMIT ?)', (drop,))
+
+    def invalidate(self, fname=None):
+        """Forget the entry of `fname`, or all entries if not given."""
+        with self._lock:
+            if fname is None:
+                self._db.execute('DELETE FROM labels')
+            else:
+                self._db.execute('DELETE FROM labels WHERE path = ?',
+                                 (str(Path(fname).resolve()),))
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+_caches = {}
+
+
+def label_cache_path():
+    """Path of the default database, see PYRISE_LABEL_CACHE."""
+    if os.environ.get(LABEL_CACHE_ENV):
+        return Path(os.environ[LABEL_CACHE_ENV])
+    return Path.home() / '.cache' / 'pyrise' / 'labelcache.sqlite'
+
+
+def get_label_cache(path=None):
+    """Return the cache stored at `path` (default: `label_cache_path()`), opened once per
+    process."""
+    path = str(label_cache_path() if path is None else path)
+    key = (os.getpid(), path)
+    if key not in _caches:
+        _caches[key] = LabelCache(path)
+    return _caches[key]
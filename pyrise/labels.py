@@ -1,27 +1,385 @@
+"""Reading HiRISE PDS labels.
+
+Full parsing with `pvl` is slow, so besides loading the complete label there are two
+cheaper ways to read one:
+
+* `LazyLabel` splits the label into its top level GROUP/OBJECT blocks and parses a block
+  with `pvl` only when it is first accessed.
+* `read_keywords` scans the label for a few keywords and decodes only their values, with
+  the same results as `pvl`. Reading stops as soon as all keywords were found.
+"""
+import os
+import re
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pvl
+from pvl.collections import Quantity
 
+from .labelcache import LabelCache, get_label_cache
 
-class HiRISE_Label(object):
+BLOCK_KEYS = ('GROUP', 'BEGIN_GROUP', 'OBJECT', 'BEGIN_OBJECT')
+END_BLOCK_KEYS = ('END_GROUP', 'END_OBJECT')
+
+_STATEMENT = re.compile(r'\s*(\^?[A-Za-z][A-Za-z0-9_:]*)\s*=\s*(.*)$')
+_END = re.compile(r'\s*END\s*(/\*.*)?$')
+_INTEGER = re.compile(r'[+-]?\d+$')
+_REAL = re.compile(r'[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$')
+_SYMBOL = re.compile(r'[A-Za-z][A-Za-z0-9_]*$')
+_UNITS = re.compile(r'(.*?)\s*<([^<>]*)>$')
+# unquoted symbols with a special meaning in PVL
+_RESERVED = {'NULL', 'TRUE', 'FALSE', 'N/A', 'UNK', 'NA', 'END'}
+
+
+def _label_lines(fname):
+    """Yield the lines of a label, stopping at its END statement.
+
+    Works for detached labels as well as labels attached to binary data.
+    """
+    with open(str(fname), 'rb') as f:
+        for line in f:
+            line = line.decode('latin-1').rstrip('\r\n')
+            yield line
+            if _END.match(line):
+                return
+
+
+def _is_open(value):
+    """Whether a quote or parenthesis in `value` continues on the next line."""
+    depth = 0
+    quoted = False
+    for char in value:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in '({':
+            depth += 1
+        elif not quoted and char in ')}':
+            depth -= 1
+    return quoted or depth > 0
+
+
+def _statements(lines):
+    """Yield (key, raw value, first line number, last line number) of each statement.
+
+    Comment lines and lines without a statement are skipped, values spanning several
+    lines are joined with newlines.
+    """
+    number = -1
+    lines = iter(lines)
+    for line in lines:
+        number += 1
+        if _END.match(line):
+            return
+        match = _STATEMENT.match(line)
+        if match is None:
+            continue
+        key, value = match.groups()
+        first = number
+        while _is_open(value):
+            try:
+                value += '\n' + next(lines)
+            except StopIteration:
+                break
+            number += 1
+        yield key, value.strip(), first, number
+
+
+def _decode_simple(raw):
+    if _INTEGER.match(raw):
+        return int(raw)
+    if _REAL.match(raw):
+        return float(raw)
+    if len(raw) > 1 and raw[0] == raw[-1] == '"' and '"' not in raw[1:-1] and \
+            '\n' not in raw:
+        return raw[1:-1]
+    if _SYMBOL.match(raw) and raw.upper() not in _RESERVED:
+        return raw
+    raise ValueError(raw)
+
+
+def _decode_value(raw):
+    """Decode a PVL value like `pvl` does, without running the full parser if possible."""
+    try:
+        if '/*' in raw:
+            raise ValueError(raw)
+        match = _UNITS.match(raw)
+        if match is not None:
+            value = _decode_simple(match.group(1))
+            if isinstance(value, str):
+                raise ValueError(raw)
+            return Quantity(value, match.group(2).strip())
+        if raw.startswith('(') and raw.endswith(')'):
+            # items with commas, units or nesting fail to decode and go to pvl
+            inner = raw[1:-1].strip()
+            if not inner:
+                return []
+            return [_decode_simple(item.strip()) for item in inner.split(',')]
+        return _decode_simple(raw)
+    except ValueError:
+        return pvl.loads('VALUE = ' + raw)['VALUE']
+
+
+def read_keywords(fname, paths):
+    """Read some keywords of a label without parsing it completely.
+
+    Parameters
+    ----------
+    fname : str or pathlib.Path
+        Label file, can also be an attached label.
+    paths : iterable of str
+        Key paths like 'VIEWING_PARAMETERS/SOLAR_LONGITUDE' or 'ORBIT_NUMBER', with the
+        names of the enclosing GROUPs/OBJECTs separated by slashes.
+
+    Returns
+    -------
+    dict
+        Value for each path found, decoded to the same objects `pvl.load` returns.
+    """
+    wanted = set(paths)
+    found = {}
+    stack = []
+    for key, raw, _, _ in _statements(_label_lines(fname)):
+        if key in BLOCK_KEYS:
+            stack.append(_decode_value(raw))
+        elif key in END_BLOCK_KEYS:
+            stack.pop()
+        else:
+            path = '/'.join(stack + [key])
+            if path in wanted:
+                found[path] = _decode_value(raw)
+                if len(found) == len(wanted):
+                    break
+    return found
+
+
+def _read_cached_keywords(fname, paths, cache):
+    """`read_keywords` that only reads key paths not stored in `cache` yet."""
+    if cache is True:
+        cache = get_label_cache()
+    elif not isinstance(cache, LabelCache):
+        cache = get_label_cache(cache)
+    entry = cache.get(fname)
+    values, missing = entry if entry is not None else ({}, set())
+    todo = [path for path in paths if path not in values and path not in missing]
+    if todo:
+        found = read_keywords(fname, todo)
+        values.update(found)
+        missing.update(set(todo) - set(found))
+        cache.put(fname, values, missing)
+    return values
+
+
+class LazyLabel(Mapping):
+    """PDS label whose top level GROUPs and OBJECTs are parsed on first access.
+
+    The label is split into blocks with a cheap line scan, each block is parsed with
+    `pvl` when it is accessed the first time and then cached. Keywords outside of blocks
+    are parsed together on first access of one of them.
+
+    Parameters
+    ----------
+    fname : str or pathlib.Path
+        Label file, can also be an attached label.
+    """
 
     def __init__(self, fname):
-        self.label = pvl.load(str(fname))
+        self.fname = fname
+        lines = list(_label_lines(fname))
+        self._blocks = {}
+        self._keys = []
+        root = []
+        depth = 0
+        for key, raw, first, last in _statements(lines):
+            if key in BLOCK_KEYS:
+                if depth == 0:
+                    name = _decode_value(raw)
+                    start = first
+                depth += 1
+            elif key in END_BLOCK_KEYS:
+                depth -= 1
+                if depth == 0:
+                    self._blocks[name] = '\n'.join(lines[start:last + 1])
+                    self._keys.append(name)
+            elif depth == 0:
+                root.append('\n'.join(lines[first:last + 1]))
+                self._keys.append(key)
+        self._root_text = '\n'.join(root)
+        self._root = None
+        self._parsed = {}
+
+    def __getitem__(self, key):
+        if key in self._blocks:
+            if key not in self._parsed:
+                self._parsed[key] = pvl.loads(self._blocks[key])[key]
+            return self._parsed[key]
+        if self._root is None:
+            self._root = pvl.loads(self._root_text)
+        return self._root[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.fname)
+
+
+class HiRISE_Label(object):
+    """Access to the commonly used values of a HiRISE RDR label.
+
+    Parameters
+    ----------
+    fname : str or pathlib.Path
+        Label file.
+    mode : {'full', 'lazy', 'keywords'}, optional
+        'full' parses the whole label with `pvl`, 'lazy' uses a `LazyLabel` and
+        'keywords' only reads the values of `keywords` with `read_keywords`, in which
+        case `label` is None. Default: 'full'
+    extra_keywords : list of str, optional
+        More key paths to read in 'keywords' mode, to be used with `get`.
+    cache : bool, str, pathlib.Path or labelcache.LabelCache, optional
+        Store the values read in this cache, or in the default one from
+        `labelcache.get_label_cache` if True. Unchanged labels are not read again. Only
+        for 'keywords' mode.
+
+    Raises
+    ------
+    ValueError
+        For an unknown `mode`, or a `cache` in another mode than 'keywords'.
+    """
+    # key paths of the values offered as properties
+    keywords = {
+        'binning': 'INSTRUMENT_SETTING_PARAMETERS/MRO:BINNING',
+        'lines': 'UNCOMPRESSED_FILE/IMAGE/LINES',
+        'line_samples': 'UNCOMPRESSED_FILE/IMAGE/LINE_SAMPLES',
+        'l_s': 'VIEWING_PARAMETERS/SOLAR_LONGITUDE',
+        'map_scale': 'IMAGE_MAP_PROJECTION/MAP_SCALE',
+    }
+
+    def __init__(self, fname, mode='full', extra_keywords=(), cache=None):
+        if cache is not None and cache is not False and mode != 'keywords':
+            raise ValueError("A label cache can only be used in 'keywords' mode.")
+        self._values = None
+        if mode == 'full':
+            self.label = pvl.load(str(fname))
+        elif mode == 'lazy':
+            self.label = LazyLabel(fname)
+        elif mode == 'keywords':
+            self.label = None
+            paths = list(self.keywords.values()) + list(extra_keywords)
+            if cache is None or cache is False:
+                self._values = read_keywords(fname, paths)
+            else:
+                self._values = _read_cached_keywords(fname, paths, cache)
+        else:
+            raise ValueError("mode must be one of 'full', 'lazy' or 'keywords'.")
+
+    def get(self, path):
+        """Return the value at a key path like 'VIEWING_PARAMETERS/SOLAR_LONGITUDE'."""
+        if self.label is None:
+            return self._values[path]
+        value = self.label
+        for key in path.split('/'):
+            value = value[key]
+        return value
 
     @property
     def binning(self):
-        return self.label['INSTRUMENT_SETTING_PARAMETERS']['MRO:BINNING']
+        return self.get(self.keywords['binning'])
 
     @property
     def lines(self):
-        return self.label['UNCOMPRESSED_FILE']['IMAGE']['LINES']
+        return self.get(self.keywords['lines'])
 
     @property
     def line_samples(self):
-        return self.label['UNCOMPRESSED_FILE']['IMAGE']['LINE_SAMPLES']
+        return self.get(self.keywords['line_samples'])
 
     @property
     def l_s(self):
-        return self.label['VIEWING_PARAMETERS']['SOLAR_LONGITUDE'].value
+        return self.get(self.keywords['l_s']).value
 
     @property
     def map_scale(self):
-        return self.label['IMAGE_MAP_PROJECTION']['MAP_SCALE'].value
+        return self.get(self.keywords['map_scale']).value
+
+
+def _harvest_label(job):
+    """Read `fields` and `keys` of one label, for `harvest_labels`."""
+    fname, fields, keys, mode, cache = job
+    record = {'path': str(fname)}
+    try:
+        label = HiRISE_Label(fname, mode=mode, extra_keywords=keys, cache=cache)
+    except Exception as e:
+        record['error'] = '{}: {}'.format(e.__class__.__name__, e)
+        return record
+    for field in fields:
+        try:
+            record[field] = getattr(label, field)
+        except KeyError:
+            pass
+    for key in keys:
+        try:
+            value = label.get(key)
+        except KeyError:
+            continue
+        record[key] = value.value if isinstance(value, Quantity) else value
+    return record
+
+
+def harvest_labels(labels, fields=None, keys=None, mode='keywords', processes=None,
+                   chunksize=None, cache=None):
+    """Collect values of many labels into a DataFrame, parsing them in parallel.
+
+    Parameters
+    ----------
+    labels : str, pathlib.Path or iterable of them
+        Label files, or a folder that is searched recursively for `*.LBL` files.
+    fields : list of str, optional
+        `HiRISE_Label` properties to read. Default: all in `HiRISE_Label.keywords`
+    keys : list of str, optional
+        Additional key paths like 'VIEWING_PARAMETERS/INCIDENCE_ANGLE'. Values with
+        units are stored without them.
+    mode : str, optional
+        `HiRISE_Label` mode. Default: 'keywords'
+    processes : int, optional
+        Number of worker processes, 1 parses in this process. Default: number of CPUs
+    chunksize : int, optional
+        Number of labels sent to a worker at once. Default: about 4 chunks per worker
+    cache : bool, str, pathlib.Path or labelcache.LabelCache, optional
+        Label cache to use, only in 'keywords' mode, see `HiRISE_Label`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per label, indexed by the file name stem, with a `path` column and an
+        `error` column for labels that could not be read.
+    """
+    import pandas as pd
+
+    if isinstance(labels, (str, Path)) and Path(labels).is_dir():
+        labels = sorted(Path(labels).rglob('*.LBL'))
+    labels = [Path(label) for label in ([labels] if isinstance(labels, (str, Path))
+                                        else labels)]
+    fields = list(HiRISE_Label.keywords) if fields is None else list(fields)
+    keys = [] if keys is None else list(keys)
+    if cache is not None and cache is not False and mode != 'keywords':
+        raise ValueError("A label cache can only be used in 'keywords' mode.")
+    if isinstance(cache, LabelCache):
+        cache = str(cache.path)
+    jobs = [(label, fields, keys, mode, cache) for label in labels]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(jobs) < 2:
+        records = [_harvest_label(job) for job in jobs]
+    else:
+        if chunksize is None:
+            chunksize = max(1, len(jobs) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            records = list(executor.map(_harvest_label, jobs, chunksize=chunksize))
+    columns = ['path'] + fields + keys + ['error']
+    df = pd.DataFrame.from_records(records, columns=columns,
+                                   index=pd.Index([label.stem for label in labels]))
+    return df
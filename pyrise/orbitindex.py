@@ -0,0 +1,117 @@
+"""Sorted index of the RDR products by orbit number, observation id and target code.
+
+The row numbers of the RDR index are sorted by each key once, so looking up a value or a
+range of values is a binary search (`numpy.searchsorted`) instead of a scan of all rows.
+Orbit ranges like the `ORB_011400_011499` folders of `OBSERVATION_ID` are one contiguous
+slice of the sorted orbits.
+
+The index is stored next to RDRCUMINDEX.TAB and, like the footprint index, extended when
+records were appended to it.
+"""
+import numpy as np
+
+from .downloads import hirise_dropbox
+from .indexfiles import StoredIndex, get_stored_index
+
+COLUMNS = ['PRODUCT_ID', 'OBSERVATION_ID', 'ORBIT_NUMBER']
+
+
+def _split_obsids(obsids):
+    """Return obsids as fixed-width bytes and their target codes, e.g. b'0985'."""
+    obsids = np.asarray(obsids, dtype='S15')
+    chars = obsids.view('S1').reshape(len(obsids), 15)
+    targetcodes = np.ascontiguousarray(chars[:, 11:15]).view('S4').ravel()
+    return obsids, targetcodes
+
+
+class OrbitIndex(StoredIndex):
+    """Row numbers of the RDR index sorted by orbit, obsid and target code.
+
+    Parameters
+    ----------
+    product_ids, obsids : array-like of str
+        PRODUCT_ID and OBSERVATION_ID of every row.
+    orbits : array-like of int
+        ORBIT_NUMBER of every row.
+    state : dict, optional
+        `indexfiles.rdr_index_state` of the data the index was built from, stored with it.
+    """
+
+    keys = ('orbits', 'obsids', 'targetcodes')
+    arrays = ('product_ids',) + tuple(name for key in keys
+                                      for name in (key, key + '_order', 'sorted_' + key))
+
+    def __init__(self, product_ids, obsids, orbits, state=None):
+        # bytes take a quarter of the space of numpy unicode strings
+        self.product_ids = np.char.encode(np.asarray(product_ids, dtype=str))
+        self.obsids, self.targetcodes = _split_obsids(obsids)
+        self.orbits = np.asarray(orbits, dtype=np.int32)
+        self.state = state
+        self._sort()
+
+    @staticmethod
+    def columns_of(df):
+        """Return PRODUCT_IDs, obsids and orbits of a frame with the `COLUMNS`."""
+        return (df['PRODUCT_ID'].to_numpy(dtype=str), df['OBSERVATION_ID'].to_numpy(dtype=str),
+                df['ORBIT_NUMBER'].to_numpy())
+
+    def extend(self, product_ids, obsids, orbits, state=None):
+        """Add more rows, numbered after the existing ones."""
+        obsids, targetcodes = _split_obsids(obsids)
+        self.product_ids = np.concatenate([self.product_ids,
+                                           np.char.encode(np.asarray(product_ids, dtype=str))])
+        self.obsids = np.concatenate([self.obsids, obsids])
+        self.targetcodes = np.concatenate([self.targetcodes, targetcodes])
+        self.orbits = np.concatenate([self.orbits, np.asarray(orbits, dtype=np.int32)])
+        self.state = state
+        self._sort()
+
+    def _sort(self):
+        """Store the row order and the sorted values of every key."""
+        for key in self.keys:
+            values = getattr(self, key)
+            order = np.argsort(values, kind='stable')
+            setattr(self, key + '_order', order)
+            setattr(self, 'sorted_' + key, values[order])
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def _range(self, key, first, last):
+        """Return the sorted row numbers with `first <= value <= last` for `key`."""
+        values = getattr(self, 'sorted_' + key)
+        start = np.searchsorted(values, first, side='left')
+        stop = np.searchsorted(values, last, side='right')
+        return np.sort(getattr(self, key + '_order')[start:stop])
+
+    def orbit_rows(self, first, last=None):
+        """Return the rows of the orbits from `first` to `last` (default: `first`)."""
+        return self._range('orbits', first, first if last is None else last)
+
+    def orbit_folder_rows(self, folder):
+        """Return the rows of an orbit folder like 'ORB_011400_011499'."""
+        _, first, last = folder.split('_')
+        return self.orbit_rows(int(first), int(last))
+
+    def obsid_rows(self, obsid):
+        """Return the rows of the products of an observation like 'PSP_003092_0985'."""
+        obsid = str(obsid).encode()
+        return self._range('obsids', obsid, obsid)
+
+    def targetcode_rows(self, targetcode):
+        """Return the rows of all observations with a target code like '0985'."""
+        targetcode = '{:04d}'.format(int(targetcode)).encode()
+        return self._range('targetcodes', targetcode, targetcode)
+
+    def products(self, rows):
+        """Return the PRODUCT_IDs of `rows`."""
+        return self.product_ids[rows].astype(str)
+
+
+def orbit_index_path():
+    return hirise_dropbox() / 'RDRCUMINDEX.orbits.npz'
+
+
+def get_orbit_index(rebuild=False):
+    """Return the orbit index of the RDR index, see `indexfiles.get_stored_index`."""
+    return get_stored_index(OrbitIndex, orbit_index_path(), COLUMNS, rebuild)
@@ -1,12 +1,22 @@
+from functools import lru_cache, total_ordering
+from http.client import HTTPException
+import os
 from pathlib import Path
-from six.moves.urllib.parse import urlunparse
-from six.moves.urllib.error import HTTPError
-from six.moves.urllib.request import urlretrieve
+from six.moves.urllib.parse import unquote, urlsplit, urlunparse
+from six.moves.urllib.request import url2pathname
 import logging
 
+import numpy as np
+
+from .cache import cached_download
+from .transfers import configure_local_links
+
 
 logger = logging.getLogger(__name__)
 
+# number of parsed OBSERVATION_IDs and PRODUCT_IDs kept by `observation_id` and `product_id`
+ID_CACHE_SIZE = 2 ** 16
+
 
 class HiRISE_URL(object):
     """Manage HiRISE URLs.
@@ -27,6 +37,21 @@ class HiRISE_URL(object):
     scheme = 'https'
     netloc = 'hirise-pds.lpl.arizona.edu'
     pdspath = Path('/PDS')
+    # local folder with the PDS layout used instead of the server, see `configure_mirror`
+    mirror = None
+    mirror_fallback = False
+
+    @classmethod
+    def base_url(cls):
+        """Return the URL all product paths are appended to."""
+        if cls.mirror is not None:
+            return Path(cls.mirror).as_uri()
+        return cls.server_url()
+
+    @classmethod
+    def server_url(cls):
+        """Return the URL of the PDS folder on the server, ignoring a local mirror."""
+        return urlunparse([cls.scheme, cls.netloc, str(cls.pdspath), None, None, None])
 
     def __init__(self, product_path, params=None, query=None, fragment=None):
         self.product_path = product_path
@@ -41,11 +66,122 @@ class HiRISE_URL(object):
 
     @property
     def url(self):
+        if self.mirror is not None:
+            local = Path(self.mirror) / self.product_path
+            if not self.mirror_fallback or local.exists():
+                return local.as_uri()
         return urlunparse([self.scheme, self.netloc, self.path,
                            self.params, self.query, self.fragment])
 
 
-class OBSERVATION_ID(object):
+# environment variable with the mirror to configure on import, see `configure_mirror`
+MIRROR_ENV = 'PYRISE_PDS_MIRROR'
+_SERVER = (HiRISE_URL.scheme, HiRISE_URL.netloc, HiRISE_URL.pdspath)
+
+
+def configure_mirror(base=None, link='hard', fallback=False):
+    """Resolve products against a local mirror of the HiRISE PDS archive.
+
+    Parameters
+    ----------
+    base : str or pathlib.Path, optional
+        A local folder (or `file://` URL) with the same layout as the PDS folder on the
+        HiRISE server, i.e. containing EDR/, RDR/ and EXTRAS/. Products are then linked
+        from there instead of being downloaded. An `http(s)://` URL like
+        'http://localhost:8000/PDS' replaces the server instead. None restores the
+        HiRISE server.
+    link : {'hard', 'symlink', 'copy'}, optional
+        How files from a local mirror are put in place, hard links fall back to copies
+        across file systems. Default: 'hard'
+    fallback : bool, optional
+        Download products missing in a local mirror from the HiRISE server. Default: False
+    """
+    configure_local_links(link)
+    HiRISE_URL.scheme, HiRISE_URL.netloc, HiRISE_URL.pdspath = _SERVER
+    HiRISE_URL.mirror = None
+    HiRISE_URL.mirror_fallback = fallback
+    if base is None:
+        return
+    parts = urlsplit(str(base))
+    if parts.scheme in ('http', 'https'):
+        HiRISE_URL.scheme, HiRISE_URL.netloc = parts.scheme, parts.netloc
+        HiRISE_URL.pdspath = Path(parts.path or '/')
+    elif parts.scheme == 'file':
+        HiRISE_URL.mirror = Path(url2pathname(unquote(parts.path)))
+    else:
+        HiRISE_URL.mirror = Path(base).expanduser().resolve()
+
+
+def _rebuild(cls, kwargs):
+    """Recreate an id object for pickle and copy."""
+    return cls(**kwargs)
+
+
+@total_ordering
+class _ID(object):
+    """Base of the immutable id objects.
+
+    The string form is computed once at creation, it defines equality and the hash, so ids
+    can be set members and dict keys. Ids of the same kind (e.g. a `SOURCE_PRODUCT_ID` and
+    a `RED_PRODUCT_ID`) sort by their `_key`, comparing different kinds raises TypeError.
+    Use `replace` to get a modified copy.
+    """
+    __slots__ = ('_s', '_key')
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable, use `replace` to get a modified copy."
+                             .format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable.".format(self.__class__.__name__))
+
+    def _set(self, **kwargs):
+        for name, value in kwargs.items():
+            object.__setattr__(self, name, value)
+
+    def _kwargs(self):
+        """Keyword arguments recreating this object."""
+        raise NotImplementedError
+
+    def replace(self, **changes):
+        """Return a copy with the given constructor arguments changed."""
+        kwargs = self._kwargs()
+        kwargs.update(changes)
+        return self.__class__(**kwargs)
+
+    def __reduce__(self):
+        return _rebuild, (self.__class__, self._kwargs())
+
+    @property
+    def s(self):
+        return self._s
+
+    def __str__(self):
+        return self._s
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __hash__(self):
+        return hash(self._s)
+
+    def __eq__(self, other):
+        if not isinstance(other, _ID):
+            return NotImplemented
+        return self._s == other._s
+
+    def _id_type(self):
+        """The direct subclass of `_ID` this id is an instance of."""
+        # the mro ends with this subclass, _ID and object
+        return type(self).__mro__[-3]
+
+    def __lt__(self, other):
+        if not isinstance(other, _ID) or self._id_type() is not other._id_type():
+            return NotImplemented
+        return self._key < other._key
+
+
+class OBSERVATION_ID(_ID):
     """Manage HiRISE observation ids.
 
     For example PSP_003092_0985.
@@ -55,70 +191,67 @@ class OBSERVATION_ID(object):
     Parameters
     ----------
     obsid : str, optional
-        One can optionally also create an 'empty' OBSERVATION_ID object and set the
-        properties accordingly to create a new obsid.
+        Observation id to parse. If not given, `orbit` and `targetcode` are required.
+    orbit : int, optional
+        Orbit number, used to create a new obsid.
+    targetcode : str, optional
+        4 character target code, used to create a new obsid.
     """
+    __slots__ = ('_orbit', '_targetcode', '_stem')
 
-    def __init__(self, obsid=None):
+    def __init__(self, obsid=None, orbit=None, targetcode=None):
         if obsid is not None:
-            phase, orbit, targetcode = obsid.split('_')
-            self._orbit = int(orbit)
-            self._targetcode = targetcode
-        else:
-            self._orbit = None
-            self._targetcode = None
+            obsid = str(obsid)
+            if len(obsid) == 15 and obsid[3] == '_' and obsid[10] == '_':
+                orbit, targetcode = obsid[4:10], obsid[11:]
+            else:
+                phase, orbit, targetcode = obsid.split('_')
+        elif orbit is None or targetcode is None:
+            raise TypeError("Need either `obsid` or `orbit` and `targetcode`.")
+        orbit = int(orbit)
+        if orbit > 999999:
+            raise ValueError("Orbit cannot be larger than 999999")
+        if len(str(targetcode)) != 4:
+            raise ValueError('Targetcode must be exactly 4 characters.')
+        targetcode = str(targetcode)
+        self._set(_orbit=orbit, _targetcode=targetcode, _stem=None, _key=(orbit, targetcode),
+                  _s='{}_{:06d}_{}'.format('PSP' if orbit < 11000 else 'ESP', orbit,
+                                           targetcode))
+
+    def _kwargs(self):
+        return dict(orbit=self._orbit, targetcode=self._targetcode)
 
     @property
     def orbit(self):
         return str(self._orbit).zfill(6)
 
-    @orbit.setter
-    def orbit(self, value):
-        if value > 999999:
-            raise ValueError("Orbit cannot be larger than 999999")
-        self._orbit = value
-
     @property
     def targetcode(self):
         return self._targetcode
 
-    @targetcode.setter
-    def targetcode(self, value):
-        if len(str(value)) != 4:
-            raise ValueError('Targetcode must be exactly 4 characters.')
-        self._targetcode = value
-
     @property
     def phase(self):
-        return 'PSP' if int(self.orbit) < 11000 else 'ESP'
-
-    def __str__(self):
-        return '{}_{}_{}'.format(self.phase, self.orbit, self.targetcode)
-
-    def __repr__(self):
-        return self.__str__()
-
-    @property
-    def s(self):
-        return self.__str__()
+        return 'PSP' if self._orbit < 11000 else 'ESP'
 
     def get_upper_orbit_folder(self):
         '''
         get the upper folder name where the given orbit folder is residing on the
         hisync server
         '''
-        lower = int(self.orbit) // 100 * 100
+        lower = self._orbit // 100 * 100
         return "_".join(["ORB", str(lower).zfill(6), str(lower + 99).zfill(6)])
 
     @property
     def storage_path_stem(self):
-        s = "{phase}/{orbitfolder}/{obsid}".format(phase=self.phase,
-                                                   orbitfolder=self.get_upper_orbit_folder(),
-                                                   obsid=self.s)
-        return s
+        if self._stem is None:
+            s = "{phase}/{orbitfolder}/{obsid}".format(phase=self.phase,
+                                                       orbitfolder=self.get_upper_orbit_folder(),
+                                                       obsid=self.s)
+            self._set(_stem=s)
+        return self._stem
 
 
-class PRODUCT_ID(object):
+class PRODUCT_ID(_ID):
     """Manage storage paths for HiRISE RDR products (also EXTRAS.)
 
     Attributes `jp2_path` and `label_path` get you the official RDR product,
@@ -128,12 +261,18 @@ class PRODUCT_ID(object):
     Parameters
     ----------
     initstr : str, optional
+        PRODUCT_ID to parse. If not given, `obsid` is required.
+    obsid : str or OBSERVATION_ID, optional
+        Observation id, used to create a new PRODUCT_ID.
+    kind : str, optional
+        One of `kinds`, used to create a new PRODUCT_ID.
 
     Note
     ----
     The "PDS" part of the path is handled in the HiRISE_URL class.
 
     """
+    __slots__ = ('_obsid', '_kind', '_stem')
     kinds = ['RED', 'BG', 'IR', 'COLOR', 'IRB', 'MIRB', 'MRGB', 'RGB']
 
     @classmethod
@@ -141,48 +280,37 @@ class PRODUCT_ID(object):
         path = Path(path)
         return cls(path.stem)
 
-    def __init__(self, initstr=None):
+    def __init__(self, initstr=None, obsid=None, kind=None):
         if initstr is not None:
-            tokens = initstr.split('_')
-            self._obsid = OBSERVATION_ID('_'.join(tokens[:3]))
-            try:
-                self.kind = tokens[3]
-            except IndexError:
-                self._kind = None
-        else:
-            self._kind = None
+            tokens = str(initstr).split('_')
+            obsid = '_'.join(tokens[:3])
+            kind = tokens[3] if len(tokens) > 3 else None
+        elif obsid is None:
+            raise TypeError("Need either `initstr` or `obsid`.")
+        if not isinstance(obsid, OBSERVATION_ID):
+            obsid = observation_id(str(obsid))
+        if kind is not None and kind not in self.kinds:
+            raise ValueError("kind must be in {}".format(self.kinds))
+        self._set(_obsid=obsid, _kind=kind, _stem=None,
+                  _key=(obsid._key, '' if kind is None else kind),
+                  _s="{}_{}".format(obsid, kind))
+
+    def _kwargs(self):
+        return dict(obsid=self._obsid, kind=self._kind)
 
     @property
     def obsid(self):
         return self._obsid
 
-    @obsid.setter
-    def obsid(self, value):
-        self._obsid = OBSERVATION_ID(value)
-
     @property
     def kind(self):
         return self._kind
 
-    @kind.setter
-    def kind(self, value):
-        if value not in self.kinds:
-            raise ValueError("kind must be in {}".format(self.kinds))
-        self._kind = value
-
-    def __str__(self):
-        return "{}_{}".format(self.obsid, self.kind)
-
-    def __repr__(self):
-        return self.__str__()
-
-    @property
-    def s(self):
-        return self.__str__()
-
     @property
     def storage_stem(self):
-        return '{}/{}'.format(self.obsid.storage_path_stem, self.s)
+        if self._stem is None:
+            self._set(_stem='{}/{}'.format(self.obsid.storage_path_stem, self.s))
+        return self._stem
 
     @property
     def label_fname(self):
@@ -197,12 +325,14 @@ class PRODUCT_ID(object):
         return HiRISE_URL(path).url
 
     def __getattr__(self, item):
-        tokens = item.split('_')
-        try:
-            if tokens[-1] == 'url':
-                return self._make_url('_'.join(tokens[:-1]))
-        except IndexError:
-            raise ValueError(f"No attribute named '{item}' found.")
+        prop = getattr(self.__class__, item, None)
+        if isinstance(prop, property):
+            # the property itself raised the AttributeError, show its message
+            return prop.__get__(self)
+        if item.endswith('_url') and not item.startswith('_'):
+            return self._make_url(item[:-4])
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            self.__class__.__name__, item))
 
     # TODO: implement general self.obj_url for all paths.
 
@@ -277,63 +407,189 @@ class PRODUCT_ID(object):
         return 'EDR/' + self.storage_stem
 
 
-class SOURCE_PRODUCT_ID(object):
+@lru_cache(maxsize=ID_CACHE_SIZE)
+def observation_id(obsid):
+    """Return a shared OBSERVATION_ID for the string `obsid`.
+
+    Ids are immutable, so repeated parsing of the same obsid (e.g. for all CCDs of an
+    observation) can return the same object. The least recently used ids are dropped
+    when more than `ID_CACHE_SIZE` are stored.
+    """
+    return OBSERVATION_ID(obsid)
+
+
+@lru_cache(maxsize=ID_CACHE_SIZE)
+def product_id(pid):
+    """Return a shared PRODUCT_ID for the string `pid`, see `observation_id`."""
+    return PRODUCT_ID(pid)
+
+
+def id_cache_info():
+    """Return hits, misses and size of the `observation_id` and `product_id` caches."""
+    return {'OBSERVATION_ID': observation_id.cache_info(),
+            'PRODUCT_ID': product_id.cache_info()}
+
+
+def clear_id_caches():
+    observation_id.cache_clear()
+    product_id.cache_clear()
+
+
+# product types with a `<type>_path` property on PRODUCT_ID
+PRODUCT_TYPES = ['label', 'jp2', 'nomap_jp2', 'quicklook', 'abrowse', 'browse', 'thumbnail',
+                 'nomap_thumbnail', 'nomap_browse']
+
+
+def _path_templates(product_type):
+    """Return {kind: (prefix, suffix)} that PRODUCT_ID puts around its `storage_stem`."""
+    templates = {}
+    for kind in PRODUCT_ID.kinds:
+        pid = PRODUCT_ID('PSP_000000_0000_' + kind)
+        try:
+            path = getattr(pid, product_type + '_path')
+        except AttributeError:
+            continue
+        if path is not None:
+            prefix, suffix = str(path).split(pid.storage_stem)
+            templates[kind] = (prefix, suffix)
+    return templates
+
+
+def product_paths(ids, product_type, kind=None):
+    """Compute storage paths and URLs of many products at once.
+
+    This gives the same results as `PRODUCT_ID(id).<product_type>_path` and `_url`, but
+    uses vectorized string operations instead of creating an object per product.
+    With a local mirror configured with `fallback`, the existence of every product in the
+    mirror is checked, like `HiRISE_URL.url` does.
+
+    Parameters
+    ----------
+    ids : str or array-like of str
+        PRODUCT_IDs like 'PSP_003092_0985_RED', or obsids if `kind` is given. Can be a
+        list, numpy array or pandas Series. A single id gives arrays of length 1.
+    product_type : str
+        One of `PRODUCT_TYPES`.
+    kind : str, optional
+        Kind to use for all `ids`, which then are observation ids.
+
+    Returns
+    -------
+    paths, urls : numpy.ndarray
+        String arrays with storage paths and URLs, empty where the product type does not
+        exist for the kind of the product.
+    """
+    if product_type not in PRODUCT_TYPES:
+        raise ValueError("product_type must be in {}".format(PRODUCT_TYPES))
+    ids = np.atleast_1d(np.asarray(ids, dtype=str))
+    if not len(ids):
+        return np.array([], dtype=str), np.array([], dtype=str)
+    if kind is not None:
+        ids = np.char.add(ids, '_' + kind)
+    _, _, rest = np.char.partition(ids, '_').T
+    orbit, _, rest = np.char.partition(rest, '_').T
+    targetcode, _, rest = np.char.partition(rest, '_').T
+    kinds = np.char.partition(rest, '_')[..., 0]
+    invalid = ~np.isin(kinds, PRODUCT_ID.kinds)
+    if invalid.any():
+        raise ValueError("kind must be in {}, got {!r}".format(PRODUCT_ID.kinds,
+                                                               kinds[invalid][0]))
+    orbit = orbit.astype(np.int64)
+    phase = np.where(orbit < 11000, 'PSP', 'ESP')
+    lower = orbit // 100 * 100
+    folder = _join('ORB_', _zfill(lower), '_', _zfill(lower + 99))
+    obsid = _join(phase, '_', _zfill(orbit), '_', targetcode)
+    stem = _join(phase, '/', folder, '/', obsid, '/', obsid, '_', kinds)
+
+    templates = _path_templates(product_type)
+    unique_kinds, inverse = np.unique(kinds, return_inverse=True)
+    known = np.isin(unique_kinds, list(templates))[inverse]
+    prefix = np.array([templates.get(k, ('', ''))[0] for k in unique_kinds])[inverse]
+    suffix = np.array([templates.get(k, ('', ''))[1] for k in unique_kinds])[inverse]
+    paths = _join(prefix, stem, suffix)
+    urls = np.char.add(HiRISE_URL.base_url() + '/', paths)
+    if HiRISE_URL.mirror is not None and HiRISE_URL.mirror_fallback:
+        # like `HiRISE_URL.url`, products missing in the mirror come from the server
+        mirrored = np.array([(HiRISE_URL.mirror / path).exists() for path in paths],
+                            dtype=bool)
+        urls = np.where(mirrored, urls, np.char.add(HiRISE_URL.server_url() + '/', paths))
+    paths[~known] = ''
+    urls[~known] = ''
+    return paths, urls
+
+
+def _zfill(numbers):
+    """Format non-negative integers below 10**6 as zero-padded 6 digit strings."""
+    digits = numbers[:, None] // 10 ** np.arange(5, -1, -1) % 10 + ord('0')
+    return digits.astype(np.uint8).view('S6').ravel().astype('U6')
+
+
+def _join(*parts):
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.char.add(result, part)
+    return result
+
+
+class SOURCE_PRODUCT_ID(_ID):
     """Manage SOURCE_PRODUCT_ID.
 
     Example
     -------
     'PSP_003092_0985_RED4_0'
+
+    Parameters
+    ----------
+    spid : str, optional
+        SOURCE_PRODUCT_ID to parse. If not given, `obsid`, `ccd` and `channel` are
+        required.
+    saveroot : pathlib.Path, optional
+        Local storage root, see `local_path`.
+    obsid : str or OBSERVATION_ID, optional
+    ccd : str, optional
+        One of `ccds`, like 'RED4'.
+    channel : int or str, optional
+        0 or 1.
     """
+    __slots__ = ('pid', 'ccd', 'channel', 'saveroot')
 
     red_ccds = ['RED' + str(i) for i in range(10)]
     ir_ccds = ['IR10', 'IR11']
     bg_ccds = ['BG12', 'BG13']
     ccds = red_ccds + ir_ccds + bg_ccds
 
-    def __init__(self, spid=None, saveroot=None):
+    def __init__(self, spid=None, saveroot=None, obsid=None, ccd=None, channel=None):
         if spid is not None:
-            tokens = spid.split('_')
+            tokens = str(spid).split('_')
             obsid = '_'.join(tokens[:3])
             ccd = tokens[3]
-            color, ccdno = self._parse_ccd(ccd)
-            self.pid = PRODUCT_ID('_'.join([obsid, color]))
-            self.ccd = ccd
-            self.channel = tokens[4]
-            self.saveroot = saveroot
-        else:
-            self.pid = None
-            self._channel = None
-            self._ccd = None
+            channel = tokens[4]
+        elif obsid is None or ccd is None or channel is None:
+            raise TypeError("Need either `spid` or `obsid`, `ccd` and `channel`.")
+        if ccd not in self.ccds:
+            raise ValueError("CCD value must be in {}.".format(self.ccds))
+        if int(channel) not in [0, 1]:
+            raise ValueError("channel must be in [0, 1]")
+        color, ccdno = self._parse_ccd(ccd)
+        pid = product_id('{}_{}'.format(obsid, color))
+        self._set(pid=pid, ccd=ccd, channel=str(channel), saveroot=saveroot,
+                  _key=(pid.obsid._key, SOURCE_PRODUCT_ID.ccds.index(ccd), int(channel)),
+                  _s="{}{}_{}".format(pid, ccdno, channel))
+
+    def _kwargs(self):
+        return dict(obsid=self.pid.obsid, ccd=self.ccd, channel=self.channel,
+                    saveroot=self.saveroot)
 
     def __getattr__(self, value):
+        if value.startswith('_') or value in SOURCE_PRODUCT_ID.__slots__:
+            # not initialized yet, don't recurse through `pid`
+            raise AttributeError(value)
         return getattr(self.pid, value)
 
     def _parse_ccd(self, value):
         sep = 2 if value[:2] in PRODUCT_ID.kinds else 3
         return value[:sep], value[sep:]
 
-    @property
-    def channel(self):
-        return self._channel
-
-    @channel.setter
-    def channel(self, value):
-        if int(value) not in [0, 1]:
-            raise ValueError("channel must be in [0, 1]")
-        self._channel = value
-
-    @property
-    def ccd(self):
-        return self._ccd
-
-    @ccd.setter
-    def ccd(self, value):
-        if value not in self.ccds:
-            raise ValueError("CCD value must be in {}.".format(self.ccds))
-        self._ccd = value
-        if self.pid is not None:
-            self.pid.color = self.color
-
     @property
     def color(self):
         return self._parse_ccd(self.ccd)[0]
@@ -344,14 +600,7 @@ class SOURCE_PRODUCT_ID(object):
         return self.ccd[offset:]
 
     def __str__(self):
-        return "{}: {}{}_{}".format(self.__class__.__name__, self.pid, self.ccdno, self.channel)
-
-    def __repr__(self):
-        return self.__str__()
-
-    @property
-    def s(self):
-        return "{}{}_{}".format(self.pid, self.ccdno, self.channel)
+        return "{}: {}".format(self.__class__.__name__, self.s)
 
     @property
     def fname(self):
@@ -379,6 +628,12 @@ class SOURCE_PRODUCT_ID(object):
         savepath = self.saveroot / str(self.obsid) / self.fname
         return savepath
 
+    def memmap(self):
+        """Return the pixels of the downloaded EDR as memory map, see `edr.memmap_image`."""
+        from .edr import memmap_image
+
+        return memmap_image(self.local_path)
+
     def download(self, overwrite=False):
         savepath = self.local_path
         if savepath.exists() and not overwrite:
@@ -388,19 +643,36 @@ class SOURCE_PRODUCT_ID(object):
         savepath.parent.mkdir(parents=True, exist_ok=True)
         logger.info(f"Downloading\n{self.furl}\nto\n{savepath}")
         try:
-            urlretrieve(self.furl, str(savepath))
-        except HTTPError as e:
+            cached_download(self.furl, savepath, overwrite=overwrite)
+        except (OSError, HTTPException) as e:  # HTTPError is an OSError
             logger.error(e.__str__())
 
 
 class RED_PRODUCT_ID(SOURCE_PRODUCT_ID):
+    __slots__ = ()
+    ccds = SOURCE_PRODUCT_ID.red_ccds
+
     def __init__(self, obsid, ccdno, channel, **kwargs):
-        self.ccds = self.red_ccds
         super().__init__('{}_RED{}_{}'.format(obsid, ccdno, channel),
                          **kwargs)
 
+    def _kwargs(self):
+        return dict(obsid=self.pid.obsid, ccdno=self.ccdno, channel=self.channel,
+                    saveroot=self.saveroot)
+
 
 class IR_PRODUCT_ID(SOURCE_PRODUCT_ID):
-    def __init__(self, obsid, ccdno, channel):
-        self.ccds = self.ir_ccds
-        super().__init__('{}_IR{}_{}'.format(obsid, ccdno, channel))
+    __slots__ = ()
+    ccds = SOURCE_PRODUCT_ID.ir_ccds
+
+    def __init__(self, obsid, ccdno, channel, **kwargs):
+        super().__init__('{}_IR{}_{}'.format(obsid, ccdno, channel),
+                         **kwargs)
+
+    def _kwargs(self):
+        return dict(obsid=self.pid.obsid, ccdno=self.ccdno, channel=self.channel,
+                    saveroot=self.saveroot)
+
+
+if os.environ.get(MIRROR_ENV):
+    configure_mirror(os.environ[MIRROR_ENV])
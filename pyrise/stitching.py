@@ -0,0 +1,140 @@
+"""Join the two channels of HiRISE CCDs into one image per CCD.
+
+Every HiRISE CCD is read out through two channels, each delivered as its own EDR. Channel
+1 holds the left, channel 0 the right half of the CCD. `stitch_observation` downloads the
+EDR pairs of an observation, memory maps them and writes each joined CCD to a `.npy`
+file, processing several CCDs in parallel while copying each in strips of lines.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .downloads import _resolve_saveroot, download_source_products
+from .edr import memmap_image
+from .products import SOURCE_PRODUCT_ID
+
+logger = logging.getLogger(__name__)
+
+# lines copied at once per CCD
+STRIP_LINES = 4096
+
+
+def stitch_channels(channel0, channel1, out, reverse=(), strip_lines=STRIP_LINES):
+    """Put channel 1 left of channel 0 and write the result to a `.npy` file.
+
+    Parameters
+    ----------
+    channel0, channel1 : str, pathlib.Path or numpy.ndarray
+        EDR .IMG files or already mapped (lines, samples) arrays.
+    out : str or pathlib.Path
+        `.npy` file to create.
+    reverse : iterable of int, optional
+        Channels whose samples are stored in reversed order and get flipped.
+    strip_lines : int, optional
+        Lines copied at once, bounding the memory use.
+
+    Returns
+    -------
+    numpy.memmap
+        The stitched (lines, samples0 + samples1) image.
+    """
+    channels = [memmap_image(c) if isinstance(c, (str, Path)) else c
+                for c in (channel0, channel1)]
+    lines = min(c.shape[0] for c in channels)
+    if channels[0].shape[0] != channels[1].shape[0]:
+        logger.warning("Channels have %i and %i lines, using %i.", channels[0].shape[0],
+                       channels[1].shape[0], lines)
+    width1 = channels[1].shape[1]
+    dtype = np.result_type(*channels).newbyteorder('=')
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # written under a temporary name, so an existing `out` always is complete
+    tmp = out.with_name('{}.{}.tmp'.format(out.name, os.getpid()))
+    try:
+        stitched = np.lib.format.open_memmap(str(tmp), mode='w+', dtype=dtype,
+                                             shape=(lines, width1 + channels[0].shape[1]))
+        left, right = channels[1], channels[0]
+        if 1 in reverse:
+            left = left[:, ::-1]
+        if 0 in reverse:
+            right = right[:, ::-1]
+        for start in range(0, lines, strip_lines):
+            stop = min(start + strip_lines, lines)
+            stitched[start:stop, :width1] = left[start:stop]
+            stitched[start:stop, width1:] = right[start:stop]
+        stitched.flush()
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+    os.replace(str(tmp), str(out))
+    return stitched
+
+
+def stitched_path(outroot, spid):
+    """Return the `.npy` path of the stitched CCD of `spid` below `outroot`."""
+    return Path(outroot) / str(spid.obsid) / Path(spid.stitched_cube_name).with_suffix('.npy')
+
+
+def stitch_observation(obsid, ccds=None, saveroot=None, outroot=None, overwrite=False,
+                       max_workers=4, download_workers=8, reverse=(), progress=True):
+    """Download the EDRs of an observation and stitch the two channels of each CCD.
+
+    Parameters
+    ----------
+    obsid : str
+        HiRISE obsid like PSP_003092_0985.
+    ccds : list of str, optional
+        CCDs like 'RED5' or 'IR10'. Default: all of `SOURCE_PRODUCT_ID.ccds`, CCDs not
+        available for the observation are skipped.
+    saveroot : str, pathlib.Path, optional
+        Storage root of the EDRs, see `downloads.download_source_products`.
+    outroot : str, pathlib.Path, optional
+        Storage root of the stitched `.npy` files, stored as
+        `<outroot>/<obsid>/<obsid>_<ccd>.npy`. Default: `saveroot`
+    overwrite : bool, optional
+        Download and stitch again even if the files exist. Default: False
+    max_workers : int, optional
+        Number of CCDs stitched in parallel. Default: 4
+    download_workers : int, optional
+        Number of parallel downloads. Default: 8
+    reverse : iterable of int, optional
+        Channels to flip, see `stitch_channels`.
+    progress : bool, optional
+        Print the download progress. Default: True
+
+    Returns
+    -------
+    dict
+        Path of the stitched file for each CCD that had both channels available.
+    """
+    saveroot = _resolve_saveroot(saveroot)
+    outroot = saveroot if outroot is None else Path(outroot)
+    ccds = SOURCE_PRODUCT_ID.ccds if ccds is None else ccds
+    pairs = {ccd: [SOURCE_PRODUCT_ID('{}_{}_{}'.format(obsid, ccd, channel))
+                   for channel in (0, 1)]
+             for ccd in ccds}
+    records = download_source_products([spid for pair in pairs.values() for spid in pair],
+                                       saveroot=saveroot, overwrite=overwrite,
+                                       max_workers=download_workers, progress=progress)
+    available = {record['product_id']: record['path'] for record in records
+                 if record['status'] != 'failed'}
+
+    def stitch(ccd):
+        spid0, spid1 = pairs[ccd]
+        out = stitched_path(outroot, spid0)
+        if out.exists() and not overwrite:
+            return ccd, out
+        logger.info("Stitching %s", out)
+        stitch_channels(available[spid0.s], available[spid1.s], out, reverse=reverse)
+        return ccd, out
+
+    complete = [ccd for ccd, pair in pairs.items()
+                if all(spid.s in available for spid in pair)]
+    for ccd in set(pairs) - set(complete):
+        logger.info("Skipping %s of %s, not all channels available.", ccd, obsid)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(stitch, complete))
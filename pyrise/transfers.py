@@ -0,0 +1,406 @@
+"""Streaming and resumable transfer of HiRISE products.
+
+All requests go through a shared `Session` that keeps connections to the HiRISE server
+alive between transfers and retries failed requests with exponential backoff. Proxies
+set with the http_proxy, https_proxy and no_proxy environment variables are used like by
+`urllib`.
+
+Downloads are written in chunks to a `.part` file next to the target path. An interrupted
+transfer is resumed with an HTTP Range request and the file is only moved into place once
+its size matches what the server announced, so an existing target path always means a
+complete file.
+"""
+import base64
+import logging
+import os
+import shutil
+import threading
+import time
+from http.client import HTTPConnection, HTTPException, HTTPSConnection, IncompleteRead
+from pathlib import Path
+
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.parse import unquote, urljoin, urlsplit
+from six.moves.urllib.request import getproxies, proxy_bypass, url2pathname
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _PooledResponse(object):
+    """HTTP response that hands its connection back to the session when closed."""
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def close(self):
+        if self._release is not None:
+            response = self._response
+            # only a completely consumed response leaves the connection in a usable state
+            reusable = not response.will_close and response.isclosed() and not response.length
+            self._release(reusable)
+            self._release = None
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _proxy_for(scheme, netloc):
+    """Return (proxy netloc, headers) for `netloc` from http(s)_proxy and no_proxy.
+
+    None if no proxy is configured for `scheme` or `netloc` is exempted from it.
+    """
+    proxy = getproxies().get(scheme)
+    if not proxy or proxy_bypass(netloc.rsplit(':', 1)[0]):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    parts = urlsplit(proxy)
+    headers = {}
+    if parts.username is not None:
+        credentials = '{}:{}'.format(unquote(parts.username), unquote(parts.password or ''))
+        headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(
+            credentials.encode()).decode('ascii')
+    proxy_netloc = parts.hostname + (':{}'.format(parts.port) if parts.port else '')
+    return proxy_netloc, headers
+
+
+class Session(object):
+    """Pool of keep-alive HTTP(S) connections with retries and timeouts.
+
+    Connections are kept per scheme and network location and are reused by subsequent
+    requests, saving a TCP and TLS handshake per transfer. A session can be shared between
+    threads, each connection is only used by one request at a time.
+
+    Parameters
+    ----------
+    retries : int, optional
+        How often a request is repeated after a connection error or a status in
+        `retry_statuses`. Default: 3
+    backoff : float, optional
+        Seconds to wait before the first retry, doubled for each further one. Default: 0.5
+    timeout : float, optional
+        Socket timeout in seconds. Default: 60
+    pool_size : int, optional
+        Maximum number of idle connections kept per host. Default: 8
+    """
+    retry_statuses = (429, 500, 502, 503, 504)
+    max_redirects = 5
+
+    def __init__(self, retries=3, backoff=0.5, timeout=60, pool_size=8):
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _new_connection(self, scheme, netloc):
+        """Connect to `netloc`, through the proxy configured in the environment if any.
+
+        HTTPS goes through a CONNECT tunnel, plain HTTP requests are sent to the proxy with
+        the absolute URL as target (`proxied` is set on the connection).
+        """
+        proxy = _proxy_for(scheme, netloc)
+        connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        if proxy is None:
+            connection = connection_class(netloc, timeout=self.timeout)
+            connection.proxied = False
+            return connection
+        proxy_netloc, headers = proxy
+        connection = connection_class(proxy_netloc, timeout=self.timeout)
+        if scheme == 'https':
+            connection.set_tunnel(netloc, headers=headers)
+            connection.proxied = False
+        else:
+            connection.proxy_headers = headers
+            connection.proxied = True
+        return connection
+
+    def _connect(self, scheme, netloc):
+        """Return an idle connection for `netloc` and whether it was used before."""
+        with self._lock:
+            pool = self._pools.get((scheme, netloc))
+            if pool:
+                return pool.pop(), True
+        return self._new_connection(scheme, netloc), False
+
+    def _releaser(self, scheme, netloc, connection):
+        def release(reusable):
+            if reusable:
+                with self._lock:
+                    pool = self._pools.setdefault((scheme, netloc), [])
+                    if len(pool) < self.pool_size:
+                        pool.append(connection)
+                        return
+            connection.close()
+        return release
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            for connection in pool:
+                connection.close()
+
+    def _send(self, url, method, headers):
+        scheme, netloc, path, query, _ = urlsplit(url)
+        target = path + '?' + query if query else path
+
+        def send(connection):
+            if connection.proxied:
+                connection.request(method, '{}://{}{}'.format(scheme, netloc, target or '/'),
+                                   headers=dict(headers, **connection.proxy_headers))
+            else:
+                connection.request(method, target or '/', headers=headers)
+            return connection.getresponse()
+
+        connection, reused = self._connect(scheme, netloc)
+        try:
+            response = send(connection)
+        except (HTTPException, OSError):
+            connection.close()
+            if not reused:
+                raise
+            # the server dropped the idle connection, try once more with a fresh one
+            connection = self._new_connection(scheme, netloc)
+            response = send(connection)
+        return _PooledResponse(response, self._releaser(scheme, netloc, connection))
+
+    def request(self, url, method='GET', headers=None):
+        """Send a request and return the response once its headers arrived.
+
+        Redirects are followed. The response must be closed (or used as context manager)
+        to give its connection back to the pool.
+
+        Raises
+        ------
+        six.moves.urllib.error.HTTPError
+            For a final status of 400 or above.
+        OSError, http.client.HTTPException
+            For connection errors and malformed responses after the last retry.
+        """
+        headers = dict(headers or {})
+        redirects = 0
+        attempt = 0
+        while True:
+            try:
+                response = self._send(url, method, headers)
+            except (HTTPException, OSError) as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning("Request to %s failed (%s), retrying.", url, e)
+            else:
+                if response.status in (301, 302, 303, 307, 308) and \
+                        redirects < self.max_redirects:
+                    location = response.headers['Location']
+                    response.read()
+                    response.close()
+                    url = urljoin(url, location)
+                    redirects += 1
+                    continue
+                if response.status < 400:
+                    return response
+                if response.status not in self.retry_statuses or attempt >= self.retries:
+                    response.read()
+                    response.close()
+                    raise HTTPError(url, response.status, response.reason, response.headers,
+                                    None)
+                logger.warning("Request to %s returned %i, retrying.", url, response.status)
+                response.read()
+                response.close()
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the session shared by all pyrise downloads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = Session()
+        return _session
+
+
+def configure_session(**kwargs):
+    """Replace the shared session by one created with `kwargs`, see `Session`."""
+    global _session
+    with _session_lock:
+        old, _session = _session, Session(**kwargs)
+    if old is not None:
+        old.close()
+    return _session
+
+
+class IncompleteDownloadError(IOError):
+    """The transfer ended before the announced number of bytes arrived.
+
+    The `.part` file is kept, so calling `stream_download` again resumes the transfer.
+    """
+
+
+def part_path(savepath):
+    """Return the path of the partial file used while downloading to `savepath`."""
+    savepath = Path(savepath)
+    return savepath.with_name(savepath.name + '.part')
+
+
+def _expected_size(response, offset):
+    """Return total size of the remote file and the offset this response starts at."""
+    if response.status == 206:
+        # Content-Range: bytes 1000-1999/2000
+        content_range = response.headers['Content-Range']
+        span, total = content_range.split()[-1].split('/')
+        start = int(span.split('-')[0])
+        return (None if total == '*' else int(total)), start
+    length = response.headers.get('Content-Length')
+    return (None if length is None else int(length)), 0
+
+
+LINK_MODES = ('hard', 'symlink', 'copy')
+local_link = 'hard'
+
+
+def configure_local_links(mode):
+    """Set how `stream_download` puts `file://` URLs in place, one of `LINK_MODES`."""
+    global local_link
+    if mode not in LINK_MODES:
+        raise ValueError("mode must be one of {}".format(LINK_MODES))
+    local_link = mode
+
+
+def link_file(source, target, mode='hard'):
+    """Put `source` at `target` as hard link, symbolic link or copy, replacing `target`.
+
+    Hard links fall back to copies where they are not possible, e.g. across file systems.
+    """
+    target = Path(target)
+    # unique per thread, threads of a download pool may link to the same target
+    tmp = target.with_name('{}.{}.{}.tmp'.format(target.name, os.getpid(),
+                                                 threading.get_ident()))
+    if mode == 'symlink':
+        os.symlink(str(Path(source).resolve()), str(tmp))
+    elif mode == 'hard':
+        try:
+            os.link(str(source), str(tmp))
+        except OSError:
+            shutil.copyfile(str(source), str(tmp))
+    else:
+        shutil.copyfile(str(source), str(tmp))
+    os.replace(str(tmp), str(target))
+    if os.path.lexists(str(tmp)):
+        # renaming a hard link onto another link of the same file does nothing
+        os.unlink(str(tmp))
+    return target
+
+
+def _link_local(url, savepath):
+    source = Path(url2pathname(unquote(urlsplit(url).path)))
+    if not source.is_file():
+        raise HTTPError(url, 404, 'Not Found', {}, None)
+    logger.debug("Linking %s to %s", source, savepath)
+    return link_file(source, savepath, local_link)
+
+
+def stream_download(url, savepath, chunk_size=CHUNK_SIZE, resume=True, session=None):
+    """Download `url` to `savepath` in chunks, resuming a previous partial transfer.
+
+    Parameters
+    ----------
+    url : str
+        URL to fetch.
+    savepath : str, pathlib.Path
+        Final storage path. Data goes to `part_path(savepath)` until complete.
+    chunk_size : int, optional
+        Number of bytes read and written per step. Default: 1 MiB
+    resume : bool, optional
+        Continue an existing `.part` file with a Range request. Default: True
+    session : Session, optional
+        Session to send the request with. Default: the shared one from `get_session`.
+
+    Returns
+    -------
+    pathlib.Path
+        The completed `savepath`.
+
+    Raises
+    ------
+    IncompleteDownloadError
+        If fewer bytes than announced by the server were received, or the response
+        ended before its end was sent (without announced size).
+    six.moves.urllib.error.HTTPError
+        For HTTP errors other than a not satisfiable range, 404 for missing local files.
+    OSError, http.client.HTTPException
+        See `Session.request`.
+
+    Note
+    ----
+    `file://` URLs, e.g. into a local mirror, are linked or copied as set with
+    `configure_local_links`.
+    """
+    if urlsplit(url).scheme == 'file':
+        return _link_local(url, Path(savepath))
+    if session is None:
+        session = get_session()
+    savepath = Path(savepath)
+    partpath = part_path(savepath)
+    offset = partpath.stat().st_size if resume and partpath.exists() else 0
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+    try:
+        response = session.request(url, headers=headers)
+    except HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # the part file is not a prefix of the remote file anymore, start over
+        logger.warning("Cannot resume %s, restarting download.", partpath)
+        partpath.unlink()
+        return stream_download(url, savepath, chunk_size, resume=False, session=session)
+
+    with response:
+        total, start = _expected_size(response, offset)
+        if start != offset:
+            # server ignored the Range header and sends the whole file
+            offset = 0
+        logger.debug("Streaming %s to %s from byte %i", url, partpath, offset)
+        truncated = False
+        with open(str(partpath), 'ab' if offset else 'wb') as f:
+            while True:
+                try:
+                    chunk = response.read(chunk_size)
+                except IncompleteRead as e:
+                    # e.g. a chunked response cut off before its last chunk
+                    f.write(e.partial)
+                    truncated = True
+                    break
+                if not chunk:
+                    break
+                f.write(chunk)
+
+    size = partpath.stat().st_size
+    if truncated and total is None:
+        raise IncompleteDownloadError(
+            "Transfer of {} ended early after {} bytes, kept {} for resuming.".format(
+                url, size, partpath))
+    if total is not None and size != total:
+        raise IncompleteDownloadError(
+            "Received {} of {} bytes for {}, kept {} for resuming.".format(
+                size, total, url, partpath))
+    os.replace(str(partpath), str(savepath))
+    return savepath
@@ -0,0 +1,291 @@
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import numpy as np
+import pytest
+
+from pyrise.products import HiRISE_URL
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Serve files with support for `Range: bytes=start-` requests."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self._send_head()
+        if body is not None:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send_head()
+
+    def _send_head(self):
+        options = self.server.options
+        if self.path.startswith('http://'):
+            # acting as proxy, the target is the absolute URL
+            options.proxied.append(self.path)
+            self.path = urlsplit(self.path).path
+        options.log.append((self.command, self.path, self.headers.get('Range')))
+        options.peers.add(self.client_address)
+        if options.fail_next:
+            options.fail_next -= 1
+            self.send_error(503)
+            return None
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return None
+        data = path.read_bytes()
+        start, status = 0, 200
+        byte_range = self.headers.get('Range')
+        if byte_range and options.honour_range:
+            start = int(byte_range.split('=')[1].split('-')[0])
+            if start >= len(data):
+                self.send_error(416)
+                return None
+            status = 206
+        self.send_response(status)
+        if options.chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(data) - start))
+        if status == 206:
+            self.send_header('Content-Range',
+                             'bytes {}-{}/{}'.format(start, len(data) - 1, len(data)))
+        self.end_headers()
+        body = data[start:]
+        if options.chunked:
+            # one chunk announcing all of the body, cut off below when truncating
+            head = '{:x}\r\n'.format(len(body)).encode()
+            if options.truncate_to is not None:
+                self.close_connection = True
+                return head + body[:options.truncate_to - start]
+            return head + body + b'\r\n0\r\n\r\n'
+        if options.truncate_to is not None:
+            self.close_connection = True
+            return data[start:options.truncate_to]
+        return body
+
+
+@pytest.fixture
+def pds_server(tmp_path, monkeypatch):
+    """Local HTTP stand-in for the HiRISE PDS server.
+
+    Files created below `root` are served under the same path as on the real server,
+    i.e. `root / 'PDS' / ...`. `log` collects (method, path, range) of all requests,
+    `peers` the client addresses seen. `honour_range`, `truncate_to` and `fail_next`
+    (number of requests answered with 503) simulate misbehaving servers and broken
+    transfers, `chunked` sends chunked responses without Content-Length. Requests with an
+    absolute URL, as sent to a proxy, are served as well and collected in `proxied`.
+    """
+    root = tmp_path / 'server'
+    root.mkdir()
+    options = SimpleNamespace(root=root, log=[], peers=set(), honour_range=True,
+                              truncate_to=None, fail_next=0, chunked=False,
+                              proxied=[])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(RangeHandler, directory=str(root)))
+    server.daemon_threads = True
+    server.options = options
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    monkeypatch.setattr(HiRISE_URL, 'scheme', 'http')
+    monkeypatch.setattr(HiRISE_URL, 'netloc', '127.0.0.1:{}'.format(server.server_port))
+    options.url = 'http://127.0.0.1:{}'.format(server.server_port)
+    yield options
+    server.shutdown()
+    server.server_close()
+
+
+# subset of the columns of the real RDRCUMINDEX.TAB: name, PDS data type, bytes
+RDR_INDEX_COLUMNS = [
+    ('VOLUME_ID', 'CHARACTER', 10),
+    ('FILE_NAME_SPECIFICATION', 'CHARACTER', 60),
+    ('INSTRUMENT_HOST_ID', 'CHARACTER', 3),
+    ('INSTRUMENT_ID', 'CHARACTER', 6),
+    ('OBSERVATION_ID', 'CHARACTER', 15),
+    ('PRODUCT_ID', 'CHARACTER', 21),
+    ('PRODUCT_VERSION_ID', 'CHARACTER', 4),
+    ('TARGET_NAME', 'CHARACTER', 4),
+    ('ORBIT_NUMBER', 'ASCII_INTEGER', 6),
+    ('MISSION_PHASE_NAME', 'CHARACTER', 25),
+    ('OBSERVATION_START_TIME', 'TIME', 23),
+    ('IMAGE_LINES', 'ASCII_INTEGER', 6),
+    ('LINE_SAMPLES', 'ASCII_INTEGER', 6),
+    ('SOLAR_LONGITUDE', 'ASCII_REAL', 7),
+    ('MINIMUM_LATITUDE', 'ASCII_REAL', 9),
+    ('MAXIMUM_LATITUDE', 'ASCII_REAL', 9),
+    ('MINIMUM_LONGITUDE', 'ASCII_REAL', 9),
+    ('MAXIMUM_LONGITUDE', 'ASCII_REAL', 9),
+    ('MAP_SCALE', 'ASCII_REAL', 7),
+    ('CORNER1_LATITUDE', 'ASCII_REAL', 9),
+    ('CORNER1_LONGITUDE', 'ASCII_REAL', 9),
+    ('CORNER2_LATITUDE', 'ASCII_REAL', 9),
+    ('CORNER2_LONGITUDE', 'ASCII_REAL', 9),
+    ('CORNER3_LATITUDE', 'ASCII_REAL', 9),
+    ('CORNER3_LONGITUDE', 'ASCII_REAL', 9),
+    ('CORNER4_LATITUDE', 'ASCII_REAL', 9),
+    ('CORNER4_LONGITUDE', 'ASCII_REAL', 9),
+]
+
+
+def _rdr_index_layout():
+    """Return (name, type, start_byte, bytes) of all columns and the row length."""
+    layout = []
+    pos = 1
+    for name, data_type, size in RDR_INDEX_COLUMNS:
+        quoted = data_type in ('CHARACTER', 'TIME')
+        start = pos + 1 if quoted else pos
+        layout.append((name, data_type, start, size))
+        pos += size + (2 if quoted else 0) + 1  # quotes and comma
+    return layout, pos  # last comma replaced by CR LF
+
+
+def make_rdr_index_rows(orbits):
+    """Create index rows, a RED and every 3rd orbit a COLOR product per orbit.
+
+    Footprints are small boxes spread over the planet, orbit 1000 crosses the 0/360
+    meridian, orbit 1001 touches the south pole.
+    """
+    rows = []
+    for orbit in orbits:
+        phase = 'PSP' if orbit < 11000 else 'ESP'
+        target = str(1000 + orbit % 8000).zfill(4)
+        obsid = '{}_{:06d}_{}'.format(phase, orbit, target)
+        lat = (orbit * 7.3) % 170 - 85
+        lon = (orbit * 13.7) % 360
+        if orbit == 1000:
+            lon = 359.98
+        if orbit == 1001:
+            lat = -89.97
+        lats = [lat - 0.02, lat - 0.02, lat + 0.02, lat + 0.02]
+        lons = [(lon + dlon) % 360 for dlon in (-0.03, 0.03, 0.03, -0.03)]
+        if orbit == 1001:
+            lats = [-89.99, -89.95, -89.95, -89.95]
+            lons = [0.0, 90.0, 180.0, 270.0]
+        for kind in ['RED', 'COLOR'] if orbit % 3 == 0 else ['RED']:
+            pid = obsid + '_' + kind
+            rows.append(dict(
+                VOLUME_ID='MROHR_0001',
+                FILE_NAME_SPECIFICATION='RDR/{}/ORB/{}/{}.JP2'.format(phase, obsid, pid),
+                INSTRUMENT_HOST_ID='MRO', INSTRUMENT_ID='HIRISE',
+                OBSERVATION_ID=obsid, PRODUCT_ID=pid, PRODUCT_VERSION_ID='1.0',
+                TARGET_NAME='MARS', ORBIT_NUMBER=orbit,
+                MISSION_PHASE_NAME='PRIMARY SCIENCE PHASE' if phase == 'PSP'
+                else 'EXTENDED SCIENCE PHASE',
+                OBSERVATION_START_TIME='2007-03-{:02d}T12:00:00.000'.format(orbit % 28 + 1),
+                IMAGE_LINES=20000 + orbit % 5000, LINE_SAMPLES=10000 if kind == 'RED' else 1200,
+                SOLAR_LONGITUDE=(orbit * 0.47) % 360,
+                MINIMUM_LATITUDE=min(lats), MAXIMUM_LATITUDE=max(lats),
+                MINIMUM_LONGITUDE=min(lons), MAXIMUM_LONGITUDE=max(lons),
+                MAP_SCALE=0.25 if kind == 'RED' else 0.5,
+                **{'CORNER{}_{}'.format(i + 1, coord): value
+                   for i in range(4)
+                   for coord, value in (('LATITUDE', lats[i]), ('LONGITUDE', lons[i]))}))
+    return rows
+
+
+def _format_rdr_index_row(row):
+    fields = []
+    for name, data_type, size in RDR_INDEX_COLUMNS:
+        value = row[name]
+        if data_type in ('CHARACTER', 'TIME'):
+            fields.append('"{}"'.format(str(value).ljust(size)[:size]))
+        elif data_type == 'ASCII_INTEGER':
+            fields.append(str(value).rjust(size))
+        else:
+            fields.append('{:.3f}'.format(value).rjust(size))
+    return ','.join(fields) + '\r\n'
+
+
+def write_rdr_index(folder, rows, append=False):
+    """Write (or extend) RDRCUMINDEX.LBL/TAB in `folder`."""
+    layout, row_bytes = _rdr_index_layout()
+    tab = folder / 'RDRCUMINDEX.TAB'
+    with open(str(tab), 'a' if append else 'w', newline='') as f:
+        for row in rows:
+            f.write(_format_rdr_index_row(row))
+    nrows = tab.stat().st_size // row_bytes
+    lines = ['PDS_VERSION_ID = PDS3',
+             'RECORD_TYPE = FIXED_LENGTH',
+             'RECORD_BYTES = {}'.format(row_bytes),
+             'FILE_RECORDS = {}'.format(nrows),
+             '^RDR_INDEX_TABLE = "RDRCUMINDEX.TAB"',
+             'OBJECT = RDR_INDEX_TABLE',
+             '  INTERCHANGE_FORMAT = ASCII',
+             '  ROWS = {}'.format(nrows),
+             '  COLUMNS = {}'.format(len(layout)),
+             '  ROW_BYTES = {}'.format(row_bytes)]
+    for number, (name, data_type, start, size) in enumerate(layout, 1):
+        lines += ['  OBJECT = COLUMN',
+                  '    COLUMN_NUMBER = {}'.format(number),
+                  '    NAME = {}'.format(name),
+                  '    DATA_TYPE = {}'.format(data_type),
+                  '    START_BYTE = {}'.format(start),
+                  '    BYTES = {}'.format(size),
+                  '    DESCRIPTION = "Column {}."'.format(name),
+                  '  END_OBJECT = COLUMN']
+    lines += ['END_OBJECT = RDR_INDEX_TABLE', 'END']
+    (folder / 'RDRCUMINDEX.LBL').write_text('\r\n'.join(lines) + '\r\n')
+    return tab
+
+
+@pytest.fixture
+def rdr_index(tmp_path, monkeypatch):
+    """Fake home with a small RDRCUMINDEX.LBL/TAB in `hirise_dropbox`.
+
+    Returns the data folder, `write_rdr_index` and `make_rdr_index_rows` can extend it.
+    """
+    monkeypatch.setenv('HOME', str(tmp_path))
+    folder = tmp_path / 'Dropbox' / 'data' / 'hirise'
+    folder.mkdir(parents=True)
+    write_rdr_index(folder, make_rdr_index_rows(range(1000, 1060)))
+    return folder
+
+
+def write_edr(path, image, prefix_bytes=6, suffix_bytes=16):
+    """Write a 16 bit `image` as EDR .IMG with attached label, like HiRISE EDRs.
+
+    Prefix and suffix bytes of each line are filled with the line number modulo 256.
+    """
+    lines, samples = image.shape
+    record_bytes = prefix_bytes + 2 * samples + suffix_bytes
+
+    def label(label_records):
+        text = '\r\n'.join([
+            'PDS_VERSION_ID = PDS3',
+            'RECORD_TYPE = FIXED_LENGTH',
+            'RECORD_BYTES = {}'.format(record_bytes),
+            'FILE_RECORDS = {}'.format(label_records + lines),
+            'LABEL_RECORDS = {}'.format(label_records),
+            '^IMAGE = {}'.format(label_records + 1),
+            'PRODUCT_ID = "{}"'.format(Path(path).stem),
+            'OBJECT = IMAGE',
+            '  LINES = {}'.format(lines),
+            '  LINE_SAMPLES = {}'.format(samples),
+            '  LINE_PREFIX_BYTES = {}'.format(prefix_bytes),
+            '  LINE_SUFFIX_BYTES = {}'.format(suffix_bytes),
+            '  SAMPLE_TYPE = MSB_UNSIGNED_INTEGER',
+            '  SAMPLE_BITS = 16',
+            'END_OBJECT = IMAGE',
+            'END']) + '\r\n'
+        return text.encode()
+
+    label_records = 1
+    while len(label(label_records)) > label_records * record_bytes:
+        label_records += 1
+    header = label(label_records).ljust(label_records * record_bytes, b' ')
+    marks = (np.arange(lines) % 256).astype(np.uint8)
+    records = np.concatenate([np.repeat(marks[:, None], prefix_bytes, axis=1),
+                              image.astype('>u2').view(np.uint8).reshape(lines, -1),
+                              np.repeat(marks[:, None], suffix_bytes, axis=1)], axis=1)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_bytes(header + records.tobytes())
+    return path
@@ -0,0 +1,73 @@
+import asyncio
+import shutil
+from http.client import BadStatusLine
+
+import pytest
+
+from pyrise import aiodownloads
+from pyrise.products import PRODUCT_ID, SOURCE_PRODUCT_ID
+
+from .test_downloads import serve_edr
+from .test_labelcache import LABEL
+
+
+@pytest.fixture
+def downloader():
+    downloader = aiodownloads.AsyncDownloader(max_workers=2)
+    yield downloader
+    downloader.close()
+
+
+def _gets(server):
+    return [entry for entry in server.log if entry[0] == 'GET']
+
+
+def test_concurrent_requests_share_a_transfer(pds_server, tmp_path, downloader):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'x' * 100000)
+    url = SOURCE_PRODUCT_ID('PSP_003092_0985_RED4_0').furl
+
+    async def fetch_all():
+        paths = [tmp_path / 'a.IMG'] * 4 + [tmp_path / 'b' / 'b.IMG']
+        return await asyncio.gather(*[downloader.fetch(url, path) for path in paths])
+
+    statuses = asyncio.run(fetch_all())
+    assert statuses == ['downloaded'] + ['shared'] * 4
+    assert len(_gets(pds_server)) == 1
+    assert (tmp_path / 'b' / 'b.IMG').read_bytes() == b'x' * 100000
+    assert asyncio.run(downloader.fetch(url, tmp_path / 'a.IMG')) == 'exists'
+
+
+def test_download_functions(pds_server, tmp_path, downloader):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'channel 0')
+
+    async def download():
+        return await asyncio.gather(
+            aiodownloads.download_RED_product('PSP_003092_0985', 4, 0, saveroot=tmp_path,
+                                              downloader=downloader),
+            aiodownloads.download_RED_product('PSP_003092_0985', 5, 0, saveroot=tmp_path,
+                                              downloader=downloader))
+
+    found, missing = asyncio.run(download())
+    assert found == tmp_path / 'PSP_003092_0985' / 'PSP_003092_0985_RED4_0.IMG'
+    assert found.read_bytes() == b'channel 0'
+    assert not missing.exists()
+
+
+def test_get_rdr_some_label(pds_server, tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    path = pds_server.root / 'PDS' / PRODUCT_ID('PSP_003092_0985_RED').label_path
+    path.parent.mkdir(parents=True)
+    shutil.copy(str(LABEL), str(path))
+    label = asyncio.run(aiodownloads.get_rdr_some_label('RED', 'PSP_003092_0985'))
+    assert label.l_s == 220.551262
+    assert asyncio.run(aiodownloads.get_rdr_some_label('COLOR', 'PSP_003092_0985')) is None
+
+
+def test_malformed_response_fails_the_download(tmp_path, downloader, monkeypatch):
+    def cached_download(url, savepath, overwrite=False):
+        raise BadStatusLine('garbage')
+    monkeypatch.setattr(aiodownloads, 'cached_download', cached_download)
+    path = asyncio.run(aiodownloads.download_RED_product('PSP_003092_0985', 4, 0,
+                                                         saveroot=tmp_path,
+                                                         downloader=downloader))
+    assert not path.exists()
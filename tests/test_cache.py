@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from pyrise import cache, downloads
+
+from .test_downloads import serve_edr
+
+
+@pytest.fixture
+def product_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, '_cache', None)
+    monkeypatch.setattr(cache, '_configured', False)
+    monkeypatch.setenv(cache.CACHE_ENV, str(tmp_path / 'cache'))
+    return cache.get_product_cache()
+
+
+def _fetch(root, url):
+    return str(cache.ProductCache(root).fetch(url))
+
+
+def _gets(server):
+    return [entry for entry in server.log if entry[0] == 'GET']
+
+
+def test_concurrent_fetches_download_once(pds_server, product_cache):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'x' * 100000)
+    url = downloads.SOURCE_PRODUCT_ID('PSP_003092_0985_RED4_0').furl
+    with ThreadPoolExecutor(8) as executor:
+        paths = set(executor.map(lambda _: product_cache.fetch(url), range(8)))
+    with ProcessPoolExecutor(3) as executor:
+        paths |= {cache.Path(p) for p in executor.map(_fetch, [product_cache.root] * 3,
+                                                      [url] * 3)}
+    assert paths == {product_cache.path(url)}
+    assert len(_gets(pds_server)) == 1
+    stats = product_cache.stats()
+    assert (stats['hits'], stats['misses']) == (10, 1)
+    assert '10 hits (90.9%' in product_cache.report()
+
+
+def test_downloads_share_the_cache(pds_server, product_cache, tmp_path):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'channel 0')
+    first = downloads.download_source_products(['PSP_003092_0985_RED4_0'],
+                                               saveroot=tmp_path / 'a', progress=False)
+    second = downloads.download_source_products(['PSP_003092_0985_RED4_0'],
+                                                saveroot=tmp_path / 'b', progress=False)
+    assert [first[0]['status'], second[0]['status']] == ['downloaded', 'cached']
+    assert len(_gets(pds_server)) == 1
+    assert os.path.samefile(first[0]['path'], second[0]['path'])
+    path = downloads.download_RED_product('PSP_003092_0985', 4, 0, saveroot=tmp_path / 'c')
+    assert path.read_bytes() == b'channel 0'
+    assert len(_gets(pds_server)) == 1
+
+
+def test_eviction(pds_server, product_cache):
+    urls = []
+    for ccd in range(5):
+        spid = 'PSP_003092_0985_RED{}_0'.format(ccd)
+        serve_edr(pds_server.root, spid, b'x' * 1000)
+        urls.append(downloads.SOURCE_PRODUCT_ID(spid).furl)
+    product_cache.max_bytes = 3500
+    for url in urls[:3]:
+        product_cache.fetch(url)
+    product_cache.fetch(urls[0])  # most recently used now
+    for url in urls[3:]:
+        product_cache.fetch(url)
+    assert [url in product_cache for url in urls] == [True, False, False, True, True]
+    stats = product_cache.stats()
+    assert stats['evicted'] == 2 and stats['bytes'] == 3000
+    assert product_cache.evict(max_bytes=0) == 3
+    assert not any(url in product_cache for url in urls)
+
+
+def test_cache_is_shared_and_read_only(pds_server, product_cache, tmp_path):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'channel 0')
+    path = downloads.download_RED_product('PSP_003092_0985', 4, 0, saveroot=tmp_path / 'a')
+    url = downloads.SOURCE_PRODUCT_ID('PSP_003092_0985_RED4_0').furl
+    entry = product_cache.entry(url)
+    for folder in (product_cache.root, product_cache.root / 'objects', entry.parent, entry):
+        assert folder.stat().st_mode & 0o7777 == cache.DIR_MODE
+    assert (entry / '.lock').stat().st_mode & 0o777 == cache.FILE_MODE
+    assert os.path.samefile(path, product_cache.path(url))
+    assert path.stat().st_mode & 0o777 == cache.OBJECT_MODE
+
+
+def test_unwritable_cache_fails_the_download(product_cache, monkeypatch, tmp_path):
+    def fetch(url, overwrite=False):
+        raise PermissionError(13, 'Permission denied', str(product_cache.root))
+    monkeypatch.setattr(product_cache, 'fetch', fetch)
+    path = downloads.download_RED_product('PSP_003092_0985', 4, 0, saveroot=tmp_path)
+    assert not path.exists()
+
+
+def test_product_evicted_before_linking(pds_server, product_cache, monkeypatch, tmp_path):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'channel 0')
+    url = downloads.SOURCE_PRODUCT_ID('PSP_003092_0985_RED4_0').furl
+    product_cache.fetch(url)
+    fetch = product_cache.fetch
+    evicted = []
+
+    def evicting_fetch(url, overwrite=False):
+        path = fetch(url, overwrite=overwrite)
+        if not evicted:
+            # another process evicts the hit before it is linked
+            evicted.append(product_cache.evict(max_bytes=0))
+        return path
+    monkeypatch.setattr(product_cache, 'fetch', evicting_fetch)
+    savepath = tmp_path / 'data' / 'PSP_003092_0985_RED4_0.IMG'
+    assert cache.cached_download(url, savepath) == 'downloaded'
+    assert evicted == [1]
+    assert savepath.read_bytes() == b'channel 0'
+    assert len(_gets(pds_server)) == 2
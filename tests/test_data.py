@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from pyrise import data
+
+
+@pytest.fixture
+def image():
+    return np.random.RandomState(42).randint(0, 1024, size=(60, 45)).astype(np.uint16)
+
+
+def test_rebin(image):
+    rebinned = data.rebin(image, (20, 15))
+    assert rebinned.shape == (20, 15)
+    assert (rebinned == image[::3, ::3]).all()
+    assert (data.rebin_factor(image, (20, 15)) == image[::3, ::3]).all()
+
+
+@pytest.mark.parametrize('func', ['mean', 'sum', 'median'])
+def test_block_reduce(image, func):
+    reduced = data.block_reduce(image, (4, 3), func)
+    blocks = image[:60, :45].reshape(15, 4, 15, 3).swapaxes(1, 2).reshape(15, 15, 12)
+    expected = getattr(np, func)(blocks, axis=-1)
+    assert reduced.shape == (15, 15)
+    if func == 'sum':
+        assert (reduced == expected).all()
+    else:
+        assert reduced.dtype == np.uint16
+        assert (reduced == np.rint(expected)).all()
+
+
+def test_block_reduce_trims_and_validates(image):
+    assert data.block_reduce(image, 7).shape == (8, 6)
+    with pytest.raises(ValueError):
+        data.block_reduce(image, 1.5)
+    with pytest.raises(ValueError):
+        data.block_reduce(image, 2, 'max')
+
+
+def test_resample(image):
+    # integer factors give block means
+    assert (data.resample(image, (20, 15)) == data.block_reduce(image, 3)).all()
+    values = image.astype(float)
+    resampled = data.resample(values, (25, 20))
+    assert resampled.dtype == np.float64
+    assert np.isclose(resampled.mean(), values.mean())
+    # first output pixel covers 2.4 x 2.25 input pixels
+    weights = np.outer([1, 1, 0.4], [1, 1, 0.25])
+    assert np.isclose(resampled[0, 0], (values[:3, :3] * weights).sum() / weights.sum())
+    assert data.resample(image, (120, 90)).shape == (120, 90)
+    assert (data.resample(image, (120, 90))[::2, ::2] == image).all()
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_rebin_strips(tmp_path, image, max_workers):
+    path = tmp_path / 'image.npy'
+    np.save(str(path), image)
+    mapped = np.load(str(path), mmap_mode='r')
+    for func in ['mean', 'sum', 'median']:
+        result = data.rebin_strips(mapped, (4, 3), func=func, strip_lines=9,
+                                   max_workers=max_workers, out=tmp_path / 'small.npy')
+        assert isinstance(result, np.memmap)
+        expected = data.block_reduce(image, (4, 3), func)
+        assert result.dtype == expected.dtype
+        assert (np.load(str(tmp_path / 'small.npy')) == expected).all()
+    values = image.astype(float)
+    for newshape in [(25, 20), (7, 45), (130, 50)]:
+        result = data.rebin_strips(values, newshape=newshape, strip_lines=7,
+                                   max_workers=max_workers)
+        assert np.allclose(result, data.resample(values, newshape))
@@ -0,0 +1,85 @@
+import json
+from http.client import BadStatusLine
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from pyrise import cli, downloads
+from pyrise.products import PRODUCT_ID, SOURCE_PRODUCT_ID
+
+
+def serve_edr(root, spid, content):
+    path = root / 'PDS' / SOURCE_PRODUCT_ID(spid).fpath
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+def test_red_source_products():
+    spids = downloads.red_source_products('PSP_003092_0985')
+    assert len(spids) == 20
+    assert spids[:2] == ['PSP_003092_0985_RED0_0', 'PSP_003092_0985_RED0_1']
+
+
+def test_download_source_products(pds_server, tmp_path):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'channel 0')
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_1', b'channel 1')
+    spids = ['PSP_003092_0985_RED4_0', 'PSP_003092_0985_RED5_0', 'PSP_003092_0985_RED4_1']
+    manifest = tmp_path / 'manifest.json'
+
+    records = downloads.download_source_products(spids, saveroot=tmp_path / 'data',
+                                                 max_per_host=2, manifest=manifest)
+
+    assert [r['product_id'] for r in records] == spids
+    assert [r['status'] for r in records] == ['downloaded', 'failed', 'downloaded']
+    assert (tmp_path / 'data' / 'PSP_003092_0985' / 'PSP_003092_0985_RED4_1.IMG').read_bytes() \
+        == b'channel 1'
+    assert not (tmp_path / 'data' / 'PSP_003092_0985' / 'PSP_003092_0985_RED5_0.IMG').exists()
+    assert json.loads(manifest.read_text()) == records
+
+    records = downloads.download_source_products(spids[:1], saveroot=tmp_path / 'data')
+    assert records[0]['status'] == 'exists'
+
+
+def test_download_cli(pds_server, tmp_path):
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED4_0', b'channel 0')
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['download', '--saveroot', str(tmp_path),
+                                      'PSP_003092_0985_RED4_0'])
+    assert result.exit_code == 0
+    assert '[1/1] downloaded: PSP_003092_0985_RED4_0' in result.output
+
+
+def test_image_size(tmp_path):
+    imageio = pytest.importorskip('imageio')
+    image = np.zeros((37, 53, 3), dtype=np.uint8)
+    for suffix in ['.jpg', '.png']:
+        path = tmp_path / ('image' + suffix)
+        imageio.imwrite(str(path), image)
+        assert downloads.image_size(path) == (37, 53)
+    (tmp_path / 'image.txt').write_text('no image')
+    with pytest.raises(ValueError):
+        downloads.image_size(tmp_path / 'image.txt')
+
+
+def test_create_browse_presentation(pds_server, tmp_path):
+    pytest.importorskip('pptx')
+    imageio = pytest.importorskip('imageio')
+    obsids = ['PSP_003092_0985', 'ESP_011491_0985', 'PSP_003093_0985']
+    for obsid in obsids[:2]:
+        path = pds_server.root / 'PDS' / PRODUCT_ID(obsid + '_RED').abrowse_path
+        path.parent.mkdir(parents=True)
+        imageio.imwrite(str(path), np.zeros((30, 20), dtype=np.uint8))
+    downloads.create_browse_presentation(obsids, savename=tmp_path / 'deck',
+                                         saveroot=tmp_path)
+    assert (tmp_path / 'deck.pptx').exists()
+
+
+def test_malformed_responses_fail_the_download(tmp_path, monkeypatch):
+    def cached_download(url, savepath, overwrite=False):
+        raise BadStatusLine('garbage')
+    monkeypatch.setattr(downloads, 'cached_download', cached_download)
+    path = downloads.download_RED_product('PSP_003092_0985', 4, 0, saveroot=tmp_path)
+    assert not path.exists()
+    path = downloads.download_browse_product('PSP_003092_0985', saveroot=tmp_path)
+    assert not path.exists()
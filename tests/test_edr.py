@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pyrise import data, edr
+from pyrise.products import SOURCE_PRODUCT_ID
+
+from .conftest import write_edr
+
+
+def test_memmap_image(tmp_path):
+    image = np.random.RandomState(1).randint(0, 4096, (50, 64)).astype(np.uint16)
+    fname = write_edr(tmp_path / 'PSP_003092_0985_RED4_0.IMG', image)
+    layout = edr.image_layout(fname)
+    assert layout.offset % (6 + 128 + 16) == 0
+    assert layout.dtype == np.dtype('>u2')
+    mapped = edr.memmap_image(fname)
+    assert isinstance(mapped, np.memmap)
+    assert mapped.shape == (50, 64)
+    assert mapped.strides == (6 + 128 + 16, 2)
+    assert (mapped == image).all()
+    assert (edr.memmap_line_prefix(fname)[:, 0] == np.arange(50)).all()
+    assert edr.memmap_line_suffix(fname).shape == (50, 16)
+    assert (data.rebin_strips(mapped, 2, strip_lines=8) == data.block_reduce(image, 2)).all()
+
+
+def test_source_product_memmap(tmp_path):
+    spid = SOURCE_PRODUCT_ID('PSP_003092_0985_RED4_0', saveroot=tmp_path)
+    image = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    write_edr(spid.local_path, image, prefix_bytes=0, suffix_bytes=0)
+    assert (spid.memmap() == image).all()
+
+
+def test_invalid_layouts(monkeypatch):
+    values = {'^IMAGE': 3, 'IMAGE/LINES': 2, 'IMAGE/LINE_SAMPLES': 4,
+              'IMAGE/SAMPLE_TYPE': 'MSB_UNSIGNED_INTEGER', 'IMAGE/SAMPLE_BITS': 16}
+    monkeypatch.setattr(edr, 'read_keywords', lambda fname, keys: values)
+    with pytest.raises(KeyError, match='RECORD_BYTES'):
+        edr.image_layout('PSP_003092_0985_RED4_0.IMG')
+    values['RECORD_BYTES'] = 100
+    assert edr.image_layout('PSP_003092_0985_RED4_0.IMG').offset == 200
+    values['IMAGE/BANDS'] = 3
+    with pytest.raises(ValueError):
+        edr.image_layout('PSP_003092_0985_RED4_0.IMG')
+    values['IMAGE/BANDS'] = 1
+    for sample_type, bits in [('VAX_REAL', 32), ('MSB_UNSIGNED_INTEGER', 12), ('REAL', 8)]:
+        values['IMAGE/SAMPLE_TYPE'], values['IMAGE/SAMPLE_BITS'] = sample_type, bits
+        message = '{} with SAMPLE_BITS {}'.format(sample_type, bits)
+        with pytest.raises(ValueError, match=message):
+            edr.image_layout('PSP_003092_0985_RED4_0.IMG')
@@ -0,0 +1,95 @@
+import numpy as np
+
+from pyrise import footprints, indexfiles
+
+from .conftest import make_rdr_index_rows, write_rdr_index
+
+
+def test_footprint_boxes():
+    lats = [[10, 10, 11, 11], [-89.99, -89.95, -89.95, -89.95]]
+    lons = [[359.5, 0.5, 0.5, 359.5], [0, 90, 180, 270]]
+    rows, boxes = footprints.footprint_boxes(lats, lons)
+    assert rows.tolist() == [0, 1, 0]
+    # split at the 0/360 meridian
+    assert boxes[0].tolist() == [10, 11, 359.5, 360]
+    assert boxes[2].tolist() == [10, 11, 0, 0.5]
+    # reaching the pole
+    assert boxes[1].tolist() == [-90, -89.95, 0, 360]
+
+
+def test_query(rdr_index):
+    index = footprints.get_footprint_index()
+    assert footprints.footprint_index_path().exists()
+
+    assert index.query_point(75, 0).tolist() == ['PSP_001000_2000_RED']
+    assert index.query_point(75, 359.99).tolist() == ['PSP_001000_2000_RED']
+    assert index.query_box(74, 76, -1, 1).tolist() == ['PSP_001000_2000_RED']
+    assert index.query_point(-89.97, 123).tolist() == ['PSP_001001_2001_RED']
+    assert index.query_point(0, 0).size == 0
+
+
+def test_query_matches_full_scan(rdr_index):
+    index = footprints.get_footprint_index()
+    df = indexfiles.get_shared_rdr_index()
+    lat_min, lat_max, lon_min, lon_max = -30, 30, 100, 250
+    rows, boxes = footprints.footprint_boxes(df[footprints.CORNER_LATITUDES].to_numpy(),
+                                             df[footprints.CORNER_LONGITUDES].to_numpy())
+    hit = ((boxes[:, 0] <= lat_max) & (boxes[:, 1] >= lat_min) &
+           (boxes[:, 2] <= lon_max) & (boxes[:, 3] >= lon_min))
+    expected = df.PRODUCT_ID.to_numpy(dtype=str)[np.unique(rows[hit])]
+    result = index.query_box(lat_min, lat_max, lon_min, lon_max)
+    assert len(result) > 5
+    assert result.tolist() == expected.tolist()
+
+
+def test_index_is_persisted(rdr_index):
+    index = footprints.get_footprint_index()
+    loaded = footprints.FootprintIndex.load(footprints.footprint_index_path())
+    assert loaded.query_box(-90, 90, 0, 360).tolist() == \
+        index.query_box(-90, 90, 0, 360).tolist()
+
+
+def test_index_is_extended(rdr_index):
+    footprints.get_footprint_index()
+    write_rdr_index(rdr_index, make_rdr_index_rows([1000 + 360 * 5]), append=True)
+    index = footprints.get_footprint_index()
+    assert len(index.product_ids) == 81
+    assert index.state['rows'] == 81
+    assert index.query_point(*_center(index, -1)).tolist()[-1] == 'PSP_002800_3800_RED'
+    rebuilt = footprints.get_footprint_index(rebuild=True)
+    assert rebuilt.query_box(-90, 90, 0, 360).tolist() == \
+        index.query_box(-90, 90, 0, 360).tolist()
+
+
+def _center(index, row):
+    box = index.boxes[index.rows == row % len(index.product_ids)][0]
+    return (box[0] + box[1]) / 2, (box[2] + box[3]) / 2
+
+
+def test_footprint_polygons():
+    lats = [[10, 10, 11, 11], [-89.99, -89.95, -89.95, -89.95], [5, 5, 6, 6]]
+    lons = [[359.5, 0.5, 0.5, 359.5], [0, 90, 180, 270], [100, 101, 101, 100]]
+    rows, polygons = footprints.footprint_polygons(lats, lons)
+    assert rows.tolist() == [2, 0, 0, 1]
+    assert polygons[0].tolist() == [[100, 5], [101, 5], [101, 6], [100, 6]]
+    # cut at the map edge
+    assert sorted(polygons[1][:, 0]) == [359.5, 359.5, 360, 360]
+    assert sorted(polygons[2][:, 0]) == [0, 0, 0.5, 0.5]
+    assert polygons[3][:, 1].min() == -90 and np.ptp(polygons[3][:, 0]) == 360
+    # a map centered on 0 does not cut it
+    rows, polygons = footprints.footprint_polygons(lats[:1], lons[:1], lon_min=-180)
+    assert rows.tolist() == [0]
+    assert polygons[0][:, 0].tolist() == [-0.5, 0.5, 0.5, -0.5]
+
+
+def test_plot_prodids(rdr_index):
+    import matplotlib
+    matplotlib.use('Agg')
+    from pyrise.indexfiles import PolyPlotter
+
+    plotter = PolyPlotter()
+    collection = plotter.plot_prodids(['PSP_001000_2000_RED', 'PSP_001002_2002_RED',
+                                       'PSP_999999_0000_RED'], rasterized=True)
+    assert len(collection.get_paths()) == 3
+    assert collection.get_rasterized()
+    assert len(plotter.plot_prodids(fill=True).get_paths()) == len(plotter.df) + 1
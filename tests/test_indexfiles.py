@@ -0,0 +1,168 @@
+import os
+
+import numpy as np
+
+from pyrise import indexfiles
+
+from .conftest import make_rdr_index_rows, write_rdr_index
+
+
+def test_get_rdr_index_builds_cache(rdr_index):
+    df = indexfiles.get_rdr_index()
+    assert len(df) == 80
+    assert indexfiles.rdr_index_cache_is_current()
+    assert df.equals(indexfiles.get_rdr_index())
+    assert df.equals(indexfiles.get_rdr_index(use_cache=False))
+
+
+def test_get_rdr_index_columns(rdr_index):
+    df = indexfiles.get_rdr_index(columns=['PRODUCT_ID', 'ORBIT_NUMBER'])
+    assert list(df.columns) == ['PRODUCT_ID', 'ORBIT_NUMBER']
+    assert df.ORBIT_NUMBER.min() == 1000
+
+
+def test_cache_is_rebuilt_when_tab_changes(rdr_index):
+    indexfiles.get_rdr_index()
+    tab = rdr_index / 'RDRCUMINDEX.TAB'
+    lines = tab.read_bytes().splitlines(keepends=True)
+    tab.write_bytes(b''.join(lines[:10]))
+    stat = tab.stat()
+    os.utime(str(tab), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not indexfiles.rdr_index_cache_is_current()
+    assert len(indexfiles.get_rdr_index()) == 10
+
+
+def test_get_rdr_index_columns_specs(rdr_index):
+    columns = indexfiles.get_rdr_index_columns()
+    assert columns[0] == indexfiles.RDRColumn('VOLUME_ID', 'CHARACTER', 2, 10)
+    assert indexfiles.get_rdr_index_names() == [column.name for column in columns]
+
+
+def test_parse_rdr_index_dtypes(rdr_index):
+    df = indexfiles.parse_rdr_index()
+    assert df.INSTRUMENT_ID.dtype == 'category'
+    assert df.ORBIT_NUMBER.dtype == 'int32'
+    assert df.SOLAR_LONGITUDE.dtype == 'float64'
+    assert df.OBSERVATION_START_TIME.dtype.kind == 'M'
+    # padding is stripped
+    assert df.PRODUCT_ID.iloc[0] == 'PSP_001000_2000_RED'
+    assert df.MISSION_PHASE_NAME.iloc[0] == 'PRIMARY SCIENCE PHASE'
+
+    subset = indexfiles.parse_rdr_index(columns=['SOLAR_LONGITUDE', 'PRODUCT_ID'])
+    assert list(subset.columns) == ['SOLAR_LONGITUDE', 'PRODUCT_ID']
+    assert subset.PRODUCT_ID.equals(df.PRODUCT_ID)
+
+
+def test_update_appends_new_rows(rdr_index):
+    old = indexfiles.get_rdr_index()
+    write_rdr_index(rdr_index, make_rdr_index_rows(range(1060, 1070)), append=True)
+
+    assert indexfiles.appended_rows(indexfiles.read_cache_meta()) == 80
+    df = indexfiles.get_rdr_index()
+    assert len(df) == 93
+    assert df.iloc[:80].equals(old)
+    assert df.iloc[80:].reset_index(drop=True).equals(
+        indexfiles.parse_rdr_index(start_row=80).reset_index(drop=True))
+    assert df.INSTRUMENT_ID.dtype == 'category'
+    assert indexfiles.read_cache_meta()['parts'] == ['part-000000000.parquet',
+                                                     'part-000000080.parquet']
+
+
+def test_update_rebuilds_after_other_changes(rdr_index):
+    indexfiles.get_rdr_index()
+    tab = rdr_index / 'RDRCUMINDEX.TAB'
+    data = bytearray(tab.read_bytes())
+    data[-50] = ord('9')
+    tab.write_bytes(bytes(data))
+    assert indexfiles.appended_rows(indexfiles.read_cache_meta()) is None
+    indexfiles.get_rdr_index()
+    assert indexfiles.read_cache_meta()['parts'] == ['part-000000000.parquet']
+
+
+def test_shared_index(rdr_index):
+    shared = indexfiles.SharedRDRIndex()
+    df = shared.get(['PRODUCT_ID', 'ORBIT_NUMBER'])
+    assert shared.columns == ['PRODUCT_ID', 'ORBIT_NUMBER']
+    df.loc[0, 'ORBIT_NUMBER'] = -1
+    both = shared.get(['ORBIT_NUMBER', 'CORNER1_LATITUDE'])
+    assert shared.columns == ['PRODUCT_ID', 'ORBIT_NUMBER', 'CORNER1_LATITUDE']
+    assert both.ORBIT_NUMBER.iloc[0] == 1000
+    assert both.equals(indexfiles.get_rdr_index(columns=['ORBIT_NUMBER', 'CORNER1_LATITUDE']))
+    write_rdr_index(rdr_index, make_rdr_index_rows(range(2000, 2010)))
+    assert len(shared.get(['PRODUCT_ID'])) == 13
+    assert shared.columns == ['PRODUCT_ID']
+
+
+def test_preload(rdr_index):
+    indexfiles.shared_rdr_index.clear()
+    indexfiles.preload_rdr_index(['PRODUCT_ID'])
+    assert indexfiles.shared_rdr_index.columns == ['PRODUCT_ID']
+    plotter = indexfiles.PolyPlotter()
+    assert plotter.df.index.name == 'PRODUCT_ID'
+    assert len(indexfiles.shared_rdr_index.columns) == 9
+    assert indexfiles.get_shared_rdr_index().shape == indexfiles.get_rdr_index().shape
+
+
+def test_shared_index_does_not_copy(rdr_index):
+    shared = indexfiles.SharedRDRIndex()
+    df = shared.get(['PRODUCT_ID', 'ORBIT_NUMBER'])
+    again = shared.get(['PRODUCT_ID', 'ORBIT_NUMBER'])
+    assert again is not df
+    assert np.shares_memory(again.ORBIT_NUMBER.to_numpy(), df.ORBIT_NUMBER.to_numpy())
+    again['DOUBLE_ORBIT'] = 2 * again.ORBIT_NUMBER
+    assert shared.columns == ['PRODUCT_ID', 'ORBIT_NUMBER']
+
+
+def test_shared_index_reads_names_once(rdr_index, monkeypatch):
+    shared = indexfiles.SharedRDRIndex()
+    names = list(shared.get().columns)
+    calls = []
+    monkeypatch.setattr(indexfiles, 'get_rdr_index_names',
+                        lambda: calls.append(1) or ['PRODUCT_ID'])
+    assert list(shared.get().columns) == names
+    assert calls == []
+    shared.clear()
+    assert list(shared.get().columns) == ['PRODUCT_ID']
+    assert calls == [1]
+
+
+def _expected(df, mask):
+    return df.PRODUCT_ID[mask].tolist()
+
+
+def test_query_rdr_index(rdr_index):
+    df = indexfiles.get_rdr_index()
+    result = indexfiles.query_rdr_index(orbits=(1010, 1030), kind='COLOR')
+    assert result.PRODUCT_ID.tolist() == _expected(
+        df, df.ORBIT_NUMBER.between(1010, 1030) & df.PRODUCT_ID.str.endswith('_COLOR'))
+    assert result.columns.tolist() == df.columns.tolist()
+
+    result = indexfiles.query_rdr_index(ls=(115, 125), lat=(-90, 0),
+                                        columns=['PRODUCT_ID', 'SOLAR_LONGITUDE'])
+    assert len(result) > 3
+    assert result.columns.tolist() == ['PRODUCT_ID', 'SOLAR_LONGITUDE']
+    assert result.PRODUCT_ID.tolist() == _expected(
+        df, df.SOLAR_LONGITUDE.between(115, 125) & (df.MAXIMUM_LATITUDE >= -90) &
+        (df.MINIMUM_LATITUDE <= 0))
+
+    ids = indexfiles.query_rdr_index(obsids=['PSP_001002_2002', 'PSP_001003_2003'],
+                                     as_ids=True)
+    assert [pid.s for pid in ids] == ['PSP_001002_2002_RED', 'PSP_001002_2002_COLOR',
+                                      'PSP_001003_2003_RED']
+    assert indexfiles.query_rdr_index(obsids='PSP_001001_2001').shape[0] == 1
+
+
+def test_query_wrapping_ranges(rdr_index):
+    # orbit 1000 crosses the 0/360 meridian at latitude 75
+    ids = indexfiles.query_rdr_index(lon=(359, 1), lat=(70, 80), kind='RED', as_ids=True)
+    assert [pid.s for pid in ids] == ['PSP_001000_2000_RED']
+    assert indexfiles.query_rdr_index(lon=(0, 0.01), as_ids=True)[0].s == ids[0].s
+    # orbit 1001 encloses the south pole, with corners at 0, 90, 180 and 270 degrees
+    for lon in [(100, 110), (300, 310), (350, 10)]:
+        ids = indexfiles.query_rdr_index(lon=lon, lat=(-90, -89), as_ids=True)
+        assert [pid.s for pid in ids] == ['PSP_001001_2001_RED']
+    df = indexfiles.get_rdr_index()
+    ls = df.SOLAR_LONGITUDE
+    result = indexfiles.query_rdr_index(ls=(130, 112))
+    assert 0 < len(result) < len(df)
+    assert result.PRODUCT_ID.tolist() == _expected(df, (ls >= 130) | (ls <= 112))
@@ -0,0 +1,98 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pyrise import downloads, labelcache, labels
+from pyrise.labelcache import LabelCache
+from pyrise.products import PRODUCT_ID
+
+LABEL = Path(__file__).parent / 'data' / 'PSP_003092_0985_RED.LBL'
+
+
+def _count_reads(monkeypatch):
+    calls = []
+    read_keywords = labels.read_keywords
+
+    def counting(fname, paths):
+        calls.append(list(paths))
+        return read_keywords(fname, paths)
+    monkeypatch.setattr(labels, 'read_keywords', counting)
+    return calls
+
+
+def test_unchanged_labels_are_not_read_again(tmp_path, monkeypatch):
+    calls = _count_reads(monkeypatch)
+    fname = tmp_path / LABEL.name
+    shutil.copy(str(LABEL), str(fname))
+    cache = LabelCache(tmp_path / 'cache.sqlite')
+    first = labels.HiRISE_Label(fname, mode='keywords', cache=cache)
+    second = labels.HiRISE_Label(fname, mode='keywords', cache=cache)
+    assert second.map_scale == first.map_scale == 0.5
+    assert second.binning == first.binning
+    assert len(calls) == 1 and cache.hits == 1
+    # only the new key path is read, a missing one is remembered as such
+    labels.HiRISE_Label(fname, mode='keywords', cache=cache, extra_keywords=['NOT_THERE'])
+    labels.HiRISE_Label(fname, mode='keywords', cache=cache, extra_keywords=['NOT_THERE'])
+    assert calls[1:] == [['NOT_THERE']]
+
+    fname.write_bytes(LABEL.read_bytes().replace(b'0.50 <METERS', b'0.25 <METERS'))
+    os.utime(str(fname), ns=(0, 10 ** 9))
+    assert labels.HiRISE_Label(fname, mode='keywords', cache=cache).map_scale == 0.25
+    assert len(calls) == 3
+
+    cache.invalidate(fname)
+    assert len(cache) == 0
+
+
+def test_eviction(tmp_path):
+    cache = LabelCache(tmp_path / 'cache.sqlite', max_entries=10)
+    for i in range(25):
+        fname = tmp_path / '{}.LBL'.format(i)
+        fname.write_text('A = {}\nEND\n'.format(i))
+        cache.put(fname, {'A': i})
+    assert len(cache) <= 10
+    assert cache.get(tmp_path / '24.LBL') == ({'A': 24}, set())
+    assert cache.get(tmp_path / '0.LBL') is None
+
+
+def test_harvest_labels_with_cache(tmp_path, monkeypatch):
+    for i in range(3):
+        shutil.copy(str(LABEL), str(tmp_path / 'PSP_00309{}_0985_RED.LBL'.format(i)))
+    cache = LabelCache(tmp_path / 'cache.sqlite')
+    first = labels.harvest_labels(tmp_path, processes=2, cache=cache)
+    calls = _count_reads(monkeypatch)
+    second = labels.harvest_labels(tmp_path, processes=1, cache=cache)
+    assert calls == []
+    assert second.equals(first)
+
+
+def test_get_rdr_some_label(pds_server, tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    pid = PRODUCT_ID('PSP_003092_0985_RED')
+    path = pds_server.root / 'PDS' / pid.label_path
+    path.parent.mkdir(parents=True)
+    shutil.copy(str(LABEL), str(path))
+    label = downloads.get_rdr_red_label('PSP_003092_0985')
+    assert label.l_s == 220.551262
+    assert downloads.get_rdr_red_label('PSP_003092_0985').lines == 24842
+    assert len([entry for entry in pds_server.log if entry[1].endswith('.LBL')]) == 1
+    assert (tmp_path / '.cache' / 'pyrise' / 'labelcache.sqlite').exists()
+    assert downloads.get_rdr_color_label('PSP_003092_0985') is None
+
+
+def test_label_cache_location(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.delenv(labelcache.LABEL_CACHE_ENV, raising=False)
+    assert labelcache.label_cache_path() == tmp_path / '.cache' / 'pyrise' / 'labelcache.sqlite'
+    monkeypatch.setenv(labelcache.LABEL_CACHE_ENV, str(tmp_path / 'labels.sqlite'))
+    assert labelcache.label_cache_path() == tmp_path / 'labels.sqlite'
+
+
+def test_cache_needs_keywords_mode(tmp_path):
+    for mode in ['full', 'lazy']:
+        with pytest.raises(ValueError):
+            labels.HiRISE_Label(LABEL, mode=mode, cache=True)
+        with pytest.raises(ValueError):
+            labels.harvest_labels([LABEL], mode=mode, cache=tmp_path / 'cache.sqlite')
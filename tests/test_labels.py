@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pvl
+import pytest
+
+from pyrise import labels
+
+LABEL = Path(__file__).parent / 'data' / 'PSP_003092_0985_RED.LBL'
+
+
+def _key_paths(node, prefix=''):
+    for key, value in node.items():
+        if isinstance(value, (pvl.collections.PVLGroup, pvl.collections.PVLObject)):
+            yield from _key_paths(value, prefix + key + '/')
+        else:
+            yield prefix + key, value
+
+
+def test_read_keywords_matches_pvl():
+    expected = dict(_key_paths(pvl.load(str(LABEL))))
+    found = labels.read_keywords(LABEL, expected)
+    assert found == expected
+    assert {path: type(value) for path, value in found.items()} == \
+        {path: type(value) for path, value in expected.items()}
+
+
+def test_lazy_label_matches_pvl():
+    full = pvl.load(str(LABEL))
+    lazy = labels.LazyLabel(LABEL)
+    assert list(lazy) == list(full.keys())
+    assert lazy['VIEWING_PARAMETERS'] is lazy['VIEWING_PARAMETERS']
+    for key in full.keys():
+        assert lazy[key] == full[key]
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'keywords'])
+def test_label_modes_agree(mode):
+    full = labels.HiRISE_Label(LABEL)
+    label = labels.HiRISE_Label(LABEL, mode=mode)
+    for name in labels.HiRISE_Label.keywords:
+        assert getattr(label, name) == getattr(full, name)
+    assert label.map_scale == 0.5
+
+
+def test_attached_label(tmp_path):
+    fname = tmp_path / 'attached.IMG'
+    fname.write_bytes(LABEL.read_bytes() + b'\x00\xff' * 1000 + b'\nEND_OBJECT = X\n')
+    assert labels.read_keywords(fname, ['ORBIT_NUMBER', 'NOT_THERE']) == {'ORBIT_NUMBER': 3092}
+    assert labels.LazyLabel(fname)['IMAGE_MAP_PROJECTION']['LINE_LAST_PIXEL'] == 24842
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_harvest_labels(tmp_path, processes):
+    for i in range(5):
+        (tmp_path / 'PSP_00309{}_0985_RED.LBL'.format(i)).write_bytes(LABEL.read_bytes())
+    fnames = sorted(tmp_path.glob('*.LBL')) + [tmp_path / 'missing.LBL']
+    df = labels.harvest_labels(fnames, keys=['VIEWING_PARAMETERS/INCIDENCE_ANGLE',
+                                             'ORBIT_NUMBER', 'NOT/THERE'],
+                               processes=processes, chunksize=2)
+    assert len(df) == 6
+    assert len(labels.harvest_labels(tmp_path, fields=['lines'], processes=1)) == 5
+    ok = df.drop('missing')
+    assert ok.error.isnull().all()
+    assert (ok.map_scale == 0.5).all()
+    assert (ok['VIEWING_PARAMETERS/INCIDENCE_ANGLE'] == 86.27722).all()
+    assert (ok.ORBIT_NUMBER == 3092).all()
+    assert ok['NOT/THERE'].isnull().all()
+    assert ok.binning.iloc[0][:2] == [2, 2]
+    assert df.loc['missing', 'error'].startswith('FileNotFoundError')
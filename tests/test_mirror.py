@@ -0,0 +1,77 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from pyrise import downloads, products, transfers
+from pyrise.products import HiRISE_URL, SOURCE_PRODUCT_ID
+
+from .test_downloads import serve_edr
+
+SPID = 'PSP_003092_0985_RED4_0'
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    """Local folder with the PDS layout, configured as mirror for the test."""
+    for name in ('scheme', 'netloc', 'pdspath', 'mirror', 'mirror_fallback'):
+        monkeypatch.setattr(HiRISE_URL, name, getattr(HiRISE_URL, name))
+    monkeypatch.setattr(transfers, 'local_link', transfers.local_link)
+    root = tmp_path / 'mirror'
+    serve_edr(tmp_path, SPID, b'channel 0')
+    (tmp_path / 'PDS').rename(root)
+    return root
+
+
+def test_mirror_links_products(mirror, tmp_path):
+    products.configure_mirror(mirror)
+    spid = SOURCE_PRODUCT_ID(SPID, saveroot=tmp_path / 'data')
+    assert spid.furl == (mirror / spid.fpath).as_uri()
+    spid.download()
+    assert os.path.samefile(spid.local_path, mirror / spid.fpath)
+
+
+def test_mirror_symlinks(mirror, tmp_path):
+    products.configure_mirror(mirror.as_uri(), link='symlink')
+    records = downloads.download_source_products([SPID], saveroot=tmp_path / 'data',
+                                                 progress=False)
+    path = Path(records[0]['path'])
+    assert path.is_symlink() and path.read_bytes() == b'channel 0'
+
+
+def test_mirror_missing_product(mirror, tmp_path):
+    products.configure_mirror(mirror)
+    records = downloads.download_source_products(['PSP_003092_0985_RED5_0'],
+                                                 saveroot=tmp_path / 'data', progress=False)
+    assert records[0]['status'] == 'failed'
+
+
+def test_mirror_fallback(mirror, pds_server, tmp_path):
+    server = (HiRISE_URL.scheme, HiRISE_URL.netloc)
+    products.configure_mirror(mirror, fallback=True)
+    # tests serve from a local server instead of the HiRISE one
+    HiRISE_URL.scheme, HiRISE_URL.netloc = server
+    serve_edr(pds_server.root, 'PSP_003092_0985_RED5_0', b'channel 5')
+    records = downloads.download_source_products([SPID, 'PSP_003092_0985_RED5_0'],
+                                                 saveroot=tmp_path / 'data', progress=False)
+    assert [Path(r['path']).read_bytes() for r in records] == [b'channel 0', b'channel 5']
+    assert [entry[1] for entry in pds_server.log if entry[0] == 'GET'] == [
+        '/PDS/' + SOURCE_PRODUCT_ID('PSP_003092_0985_RED5_0').fpath.as_posix()]
+
+
+def test_http_mirror(mirror):
+    products.configure_mirror('http://localhost:8000/hirise/PDS')
+    assert SOURCE_PRODUCT_ID(SPID).furl.startswith('http://localhost:8000/hirise/PDS/EDR/')
+    products.configure_mirror()
+    assert HiRISE_URL('EDR').url == 'https://hirise-pds.lpl.arizona.edu/PDS/EDR'
+
+
+def test_product_paths_use_mirror(mirror):
+    products.configure_mirror(mirror)
+    paths, urls = products.product_paths(['PSP_003092_0985'], 'label', 'RED')
+    assert urls[0] == mirror.as_uri() + '/' + paths[0]
+
+
+def test_invalid_link_mode(mirror):
+    with pytest.raises(ValueError):
+        products.configure_mirror(mirror, link='move')
@@ -0,0 +1,35 @@
+import numpy as np
+
+from pyrise import indexfiles, orbitindex
+
+from .conftest import make_rdr_index_rows, write_rdr_index
+
+
+def test_lookups(rdr_index):
+    index = orbitindex.get_orbit_index()
+    assert orbitindex.orbit_index_path().exists()
+    df = indexfiles.get_rdr_index()
+    rows = index.orbit_rows(1010, 1019)
+    assert rows.tolist() == np.flatnonzero(df.ORBIT_NUMBER.between(1010, 1019)).tolist()
+    assert index.orbit_folder_rows('ORB_001000_001099').tolist() == list(range(len(df)))
+    assert index.products(index.orbit_rows(1002)).tolist() == ['PSP_001002_2002_RED',
+                                                               'PSP_001002_2002_COLOR']
+    assert index.products(index.obsid_rows('PSP_001003_2003')).tolist() == [
+        'PSP_001003_2003_RED']
+    assert index.products(index.targetcode_rows(2004)).tolist() == ['PSP_001004_2004_RED']
+    assert index.orbit_rows(5000).size == 0
+
+
+def test_index_is_persisted_and_extended(rdr_index):
+    index = orbitindex.get_orbit_index()
+    loaded = orbitindex.get_orbit_index()
+    assert loaded.state == index.state
+    assert loaded.obsid_rows('PSP_001005_2005').tolist() == [6, 7]
+    assert loaded.orbit_rows(1005).tolist() == index.orbit_rows(1005).tolist()
+    write_rdr_index(rdr_index, make_rdr_index_rows(range(900, 903)), append=True)
+    index = orbitindex.get_orbit_index()
+    assert len(index) == len(indexfiles.get_rdr_index())
+    assert index.products(index.orbit_rows(900, 902)).tolist() == [
+        'PSP_000900_1900_RED', 'PSP_000900_1900_COLOR', 'PSP_000901_1901_RED',
+        'PSP_000902_1902_RED']
+    assert index.state['source'] == indexfiles._tab_fingerprint()
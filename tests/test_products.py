@@ -0,0 +1,139 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyrise import products, transfers
+from pyrise.products import OBSERVATION_ID, PRODUCT_ID, RED_PRODUCT_ID, SOURCE_PRODUCT_ID
+
+IDS = ['PSP_003092_0985_' + kind for kind in PRODUCT_ID.kinds] + \
+      ['ESP_011491_0985_' + kind for kind in PRODUCT_ID.kinds] + ['ESP_123456_1234_RED']
+
+
+def _per_object(product_id, product_type):
+    pid = PRODUCT_ID(product_id)
+    try:
+        path = getattr(pid, product_type + '_path')
+    except AttributeError:
+        return "", ""
+    if path is None:
+        return "", ""
+    return str(path), getattr(pid, product_type + '_url')
+
+
+@pytest.fixture(params=[None, 'mirror', 'fallback'])
+def mirror_mode(request, tmp_path, monkeypatch):
+    """No mirror, a local mirror, or one falling back to the server for missing files."""
+    for name in ('scheme', 'netloc', 'pdspath', 'mirror', 'mirror_fallback'):
+        monkeypatch.setattr(products.HiRISE_URL, name, getattr(products.HiRISE_URL, name))
+    monkeypatch.setattr(transfers, 'local_link', transfers.local_link)
+    if request.param is not None:
+        # only the products of the first observation are mirrored
+        for product_id in IDS[:len(PRODUCT_ID.kinds)]:
+            for product_type in products.PRODUCT_TYPES:
+                path, _ = _per_object(product_id, product_type)
+                if path:
+                    (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+                    (tmp_path / path).touch()
+        products.configure_mirror(tmp_path, fallback=request.param == 'fallback')
+    return request.param
+
+
+@pytest.mark.parametrize('product_type', products.PRODUCT_TYPES)
+def test_product_paths_match_product_id(product_type, mirror_mode):
+    paths, urls = products.product_paths(pd.Series(IDS), product_type)
+    expected = [_per_object(product_id, product_type) for product_id in IDS]
+    assert list(zip(paths, urls)) == expected
+    if mirror_mode == 'fallback':
+        assert {url.split(':')[0] for _, url in expected if url} == {'file', 'https'}
+
+
+def test_product_paths_with_kind():
+    paths, urls = products.product_paths(np.array(['PSP_003092_0985']), 'jp2', kind='COLOR')
+    assert paths.tolist() == [PRODUCT_ID('PSP_003092_0985_COLOR').jp2_path]
+
+
+def test_product_paths_empty_and_single():
+    paths, urls = products.product_paths([], 'jp2')
+    assert paths.shape == urls.shape == (0,)
+    paths, urls = products.product_paths(pd.Series([], dtype=str), 'jp2', kind='RED')
+    assert paths.shape == urls.shape == (0,)
+    paths, urls = products.product_paths('PSP_003092_0985_RED', 'jp2')
+    assert paths.tolist() == [PRODUCT_ID('PSP_003092_0985_RED').jp2_path]
+    assert urls.tolist() == [PRODUCT_ID('PSP_003092_0985_RED').jp2_url]
+
+
+def test_product_paths_invalid():
+    with pytest.raises(ValueError):
+        products.product_paths(['PSP_003092_0985_FOO'], 'jp2')
+    with pytest.raises(ValueError):
+        products.product_paths(['PSP_003092_0985_RED'], 'foo')
+
+
+def test_ids_are_hashable_and_ordered():
+    pids = [PRODUCT_ID(s) for s in ['ESP_011491_0985_RED', 'PSP_003092_0985_RED',
+                                    'PSP_003092_0985_COLOR', 'PSP_003092_0985_RED']]
+    assert len(set(pids)) == 3
+    assert {pids[1]: 1}[PRODUCT_ID('PSP_003092_0985_RED')] == 1
+    assert [p.s for p in sorted(set(pids))] == [
+        'PSP_003092_0985_COLOR', 'PSP_003092_0985_RED', 'ESP_011491_0985_RED']
+    spids = sorted(SOURCE_PRODUCT_ID('PSP_003092_0985_' + ccd) for ccd in
+                   ['IR10_0', 'RED9_1', 'RED9_0', 'RED0_1'])
+    assert [s.s[16:] for s in spids] == ['RED0_1', 'RED9_0', 'RED9_1', 'IR10_0']
+    assert RED_PRODUCT_ID('PSP_003092_0985', 4, 0) < spids[-1]
+    with pytest.raises(TypeError, match="'OBSERVATION_ID' and 'PRODUCT_ID'"):
+        OBSERVATION_ID('PSP_003092_0985') < PRODUCT_ID('PSP_003092_0985_RED')
+    with pytest.raises(TypeError, match="'SOURCE_PRODUCT_ID' and 'PRODUCT_ID'"):
+        sorted([PRODUCT_ID('PSP_003092_0985_RED'), spids[0]])
+
+
+def test_ids_are_immutable():
+    obsid = OBSERVATION_ID('PSP_003092_0985')
+    with pytest.raises(AttributeError):
+        obsid.orbit = 4080
+    new = obsid.replace(orbit=11000)
+    assert new.s == 'ESP_011000_0985' and obsid.s == 'PSP_003092_0985'
+    pid = PRODUCT_ID(obsid=obsid, kind='RED')
+    with pytest.raises(AttributeError):
+        pid.kind = 'COLOR'
+    assert pid.replace(kind='COLOR') == PRODUCT_ID('PSP_003092_0985_COLOR')
+    with pytest.raises(ValueError):
+        pid.replace(kind='GREEN')
+    spid = RED_PRODUCT_ID('PSP_003092_0985', 4, 0)
+    assert spid.replace(channel=1).s == 'PSP_003092_0985_RED4_1'
+    assert not hasattr(spid, '__dict__')
+
+
+def test_unknown_attributes_raise():
+    pid = PRODUCT_ID('PSP_003092_0985_BG')
+    with pytest.raises(AttributeError, match='no attribute'):
+        pid.not_there
+    with pytest.raises(AttributeError, match='No browse exists'):
+        pid.browse_path
+    assert pid.label_url.endswith('PSP_003092_0985_BG.LBL')
+    with pytest.raises(AttributeError):
+        SOURCE_PRODUCT_ID('PSP_003092_0985_RED4_0').not_there
+
+
+def test_ids_pickle():
+    ids = [OBSERVATION_ID('ESP_011491_0985'), PRODUCT_ID('PSP_003092_0985'),
+           PRODUCT_ID('PSP_003092_0985_IRB'), SOURCE_PRODUCT_ID('PSP_003092_0985_BG12_1'),
+           RED_PRODUCT_ID('PSP_003092_0985', 4, 0, saveroot='/data')]
+    restored = pickle.loads(pickle.dumps(ids))
+    assert restored == ids
+    assert [type(i) for i in restored] == [type(i) for i in ids]
+    assert restored[-1].saveroot == '/data'
+
+
+def test_source_product_ids_share_parsed_ids():
+    products.clear_id_caches()
+    spids = [RED_PRODUCT_ID('PSP_003092_0985', ccdno, channel)
+             for ccdno in range(10) for channel in (0, 1)]
+    assert all(spid.pid is spids[0].pid for spid in spids)
+    assert products.product_id('PSP_003092_0985_RED').obsid is spids[0].obsid
+    info = products.id_cache_info()
+    assert info['PRODUCT_ID'].misses == 1
+    assert info['PRODUCT_ID'].hits == 20
+    assert info['OBSERVATION_ID'].misses == 1
+    assert OBSERVATION_ID('PSP_003092_0985') == OBSERVATION_ID(orbit=3092, targetcode='0985')
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from pyrise import stitching
+from pyrise.products import SOURCE_PRODUCT_ID
+
+from .conftest import write_edr
+
+
+def serve_channel(root, spid, image):
+    spid = SOURCE_PRODUCT_ID(spid)
+    write_edr(root / 'PDS' / spid.fpath, image)
+
+
+def test_stitch_observation(pds_server, tmp_path):
+    rng = np.random.RandomState(3)
+    images = {}
+    for spid in ['PSP_003092_0985_RED4_0', 'PSP_003092_0985_RED4_1',
+                 'PSP_003092_0985_RED5_0', 'PSP_003092_0985_RED5_1', 'PSP_003092_0985_RED6_0']:
+        images[spid] = rng.randint(0, 1024, (30, 16)).astype(np.uint16)
+        serve_channel(pds_server.root, spid, images[spid])
+    result = stitching.stitch_observation('PSP_003092_0985', ccds=['RED4', 'RED5', 'RED6'],
+                                          saveroot=tmp_path / 'edr', outroot=tmp_path / 'out',
+                                          max_workers=2, progress=False)
+    assert sorted(result) == ['RED4', 'RED5']
+    assert result['RED4'] == tmp_path / 'out' / 'PSP_003092_0985' / 'PSP_003092_0985_RED4.npy'
+    stitched = np.load(str(result['RED5']))
+    assert stitched.dtype == np.uint16 and stitched.dtype.isnative
+    assert (stitched[:, :16] == images['PSP_003092_0985_RED5_1']).all()
+    assert (stitched[:, 16:] == images['PSP_003092_0985_RED5_0']).all()
+
+
+def test_stitch_channels_reverse(tmp_path):
+    channel0 = np.arange(20, dtype=np.uint16).reshape(4, 5)
+    channel1 = channel0[:3] + 100
+    stitched = stitching.stitch_channels(channel0, channel1, tmp_path / 'ccd.npy',
+                                         reverse=(0,), strip_lines=2)
+    assert stitched.shape == (3, 10)
+    assert (stitched[:, :5] == channel1).all()
+    assert (stitched[:, 5:] == channel0[:3, ::-1]).all()
+
+
+class Interrupted(np.ndarray):
+    """Channel raising KeyboardInterrupt when its second strip is read."""
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.start:
+            raise KeyboardInterrupt
+        return super().__getitem__(key)
+
+
+def test_interrupted_stitching_leaves_no_output(tmp_path):
+    channel0 = np.arange(20, dtype=np.uint16).reshape(4, 5)
+    out = tmp_path / 'ccd.npy'
+    with pytest.raises(KeyboardInterrupt):
+        stitching.stitch_channels(channel0, channel0.view(Interrupted), out, strip_lines=2)
+    assert list(tmp_path.iterdir()) == []
+    stitching.stitch_channels(channel0, channel0, out, strip_lines=2)
+    assert (np.load(str(out))[:, 5:] == channel0).all()